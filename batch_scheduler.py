@@ -0,0 +1,123 @@
+# batch_scheduler.py
+# ----------------
+# Batches move requests from many concurrent games for one player.
+# Author: Porter Zach
+
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+from game import Game
+from players.player import Player, ask_moves
+
+# Most move requests sent to the player at once.
+MAX_BATCH_SIZE = 32
+
+# Longest a request waits for others to join its batch, in seconds.
+MAX_WAIT = 0.005
+
+# Collects move requests from any number of games and threads and hands them
+# to one player in batches through Player.get_moves, so a player serving
+# many games can share work across them. Players that only implement
+# get_move are asked one position at a time by the default get_moves.
+# Prior states are passed on as ask_move does, to players that use them.
+# ---
+# A batch is sent as soon as it has max_batch_size requests, or max_wait
+# seconds after its first request arrived, whichever comes first. Batches
+# are computed one at a time on a dispatcher thread; requests arriving
+# meanwhile wait for the next batch. Call close() to stop the thread.
+class BatchScheduler:
+    def __init__(self, player: Player, max_batch_size: int = MAX_BATCH_SIZE, max_wait: float = MAX_WAIT):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.player = player
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        # Totals for tracking how full batches are
+        self.requests = 0
+        self.batches = 0
+
+        # (board state, prior state, future, time requested) of each request
+        # not sent yet
+        self._pending = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._dispatch, name="BatchScheduler", daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> "BatchScheduler":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Asks for the player's move for a board state (in the player's
+    # board_format), with the position before the opponent's last move if
+    # known (see Game.get_prior_state). Returns a Future of the move.
+    def request(self, board_state: str | bytes, prior_state: str | bytes | None = None) -> Future:
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("scheduler is closed")
+            self._pending.append((board_state, prior_state, future, time.perf_counter()))
+            self._condition.notify()
+        return future
+
+    # Asks for the player's move in the current position of game.
+    def request_game(self, game: Game) -> Future:
+        board_format = self.player.board_format
+        return self.request(game.get_board(board_format), game.get_prior_state(board_format))
+
+    # Stops the dispatcher thread once the batch being computed is done.
+    # Requests not sent yet are cancelled.
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        while self._pending:
+            self._pending.popleft()[2].cancel()
+
+    # Sends batches to the player until closed.
+    def _dispatch(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            # Requests cancelled while waiting are dropped
+            requests = [request for request in batch if request[2].set_running_or_notify_cancel()]
+            if not requests:
+                continue
+            states = [board_state for board_state, _, _, _ in requests]
+            prior_states = [prior_state for _, prior_state, _, _ in requests]
+            futures = [future for _, _, future, _ in requests]
+            self.requests += len(futures)
+            self.batches += 1
+            try:
+                moves = ask_moves(self.player, states, prior_states)
+                if len(moves) != len(states):
+                    raise ValueError(f"get_moves returned {len(moves)} moves for {len(states)} positions")
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, move in zip(futures, moves):
+                future.set_result(move)
+
+    # Waits for the next batch to be due and takes it off the queue.
+    # Returns None once closed.
+    def _next_batch(self) -> list | None:
+        with self._condition:
+            while True:
+                if self._closed:
+                    return None
+                if self._pending:
+                    wait = self._pending[0][3] + self.max_wait - time.perf_counter()
+                    if len(self._pending) >= self.max_batch_size or wait <= 0:
+                        break
+                    self._condition.wait(wait)
+                else:
+                    self._condition.wait()
+            count = min(len(self._pending), self.max_batch_size)
+            return [self._pending.popleft() for _ in range(count)]
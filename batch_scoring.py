@@ -0,0 +1,118 @@
+# batch_scoring.py
+# ----------------
+# Vectorized area scoring of many final positions at once for Go game.
+# Requires NumPy, unlike the rest of the game.
+# Author: Porter Zach
+
+import re
+import numpy as np
+from game import Stone, PACKED_HEADER_SIZE
+
+# Point values in the boards passed to score_batch. These match the digits
+# of the board state encoding.
+EMPTY_POINT = 0
+BLACK_POINT = 1
+WHITE_POINT = 2
+
+# Base-3 digits of a hex encoding decoded together; 3^40 fits in a uint64.
+_CHUNK_DIGITS = 40
+_CHUNK_BASE = 3 ** _CHUNK_DIGITS
+_DIGIT_POWERS = np.array([3 ** i for i in range(_CHUNK_DIGITS)], dtype=np.uint64)
+
+# Scores N final positions at once under the same area scoring as
+# Game.score(). boards is an (N, size, size) integer array of EMPTY_POINT,
+# BLACK_POINT and WHITE_POINT values indexed [n, x, y].
+# Returns arrays of the winner (Black (0) or White (1)), Black's score and
+# White's score (komi included) for each position.
+def score_batch(boards, komi: float = 6.5) -> (np.ndarray, np.ndarray, np.ndarray):
+    boards = np.asarray(boards)
+    if boards.ndim != 3 or boards.shape[1] != boards.shape[2]:
+        raise ValueError("boards must have shape (N, size, size)")
+
+    black = boards == BLACK_POINT
+    white = boards == WHITE_POINT
+    empty = boards == EMPTY_POINT
+
+    # Empty points connected to each color. An empty region is territory if
+    # it is reached from one color only.
+    reaches_black = _propagate(_dilate(black) & empty, empty)
+    reaches_white = _propagate(_dilate(white) & empty, empty)
+
+    black_scores = black.sum(axis=(1, 2)) + (reaches_black & ~reaches_white).sum(axis=(1, 2))
+    white_scores = white.sum(axis=(1, 2)) + (reaches_white & ~reaches_black).sum(axis=(1, 2)) + komi
+    # Ties go to Black, as with Game.score()
+    winners = np.where(white_scores > black_scores, int(Stone.WHITE), int(Stone.BLACK))
+    return winners, black_scores, white_scores
+
+# Converts board state encodings of one size, in either format, into an
+# array for score_batch. Packed encodings are decoded all at once, and the
+# base-3 digits of hex encodings a few dozen at a time, so no point is
+# decoded on its own.
+def encodings_to_array(encodings: list) -> np.ndarray:
+    if len(encodings) == 0:
+        return np.zeros((0, 0, 0), dtype=np.uint8)
+    packed = [encoding for encoding in encodings if isinstance(encoding, (bytes, bytearray, memoryview))]
+    size = packed[0][0] if packed else int(re.match(r"\d+", encodings[0]).group())
+
+    boards = np.zeros((len(encodings), size * size), dtype=np.uint8)
+    if len(packed) == len(encodings):
+        boards[:] = decode_packed(encodings)[0].reshape(len(encodings), -1)
+    else:
+        for i, encoding in enumerate(encodings):
+            if isinstance(encoding, str):
+                boards[i] = _hex_points(encoding, size)
+            else:
+                boards[i] = decode_packed([encoding])[0].reshape(-1)
+    return boards.reshape(len(encodings), size, size)
+
+# Decodes packed board state encodings (see game.board_to_bytes) of one size
+# all at once. Returns an (N, size, size) array of EMPTY_POINT, BLACK_POINT
+# and WHITE_POINT values indexed [n, x, y], and the N players to move.
+def decode_packed(states: list) -> (np.ndarray, np.ndarray):
+    size = states[0][0]
+    packed = np.frombuffer(b"".join(states), dtype=np.uint8).reshape(len(states), -1)
+    if (packed[:, 0] != size).any():
+        raise ValueError("all encodings must have the same board size")
+    points = (packed[:, PACKED_HEADER_SIZE:, None] >> np.array([0, 2, 4, 6], dtype=np.uint8)) & 3
+    boards = points.reshape(len(states), -1)[:, :size * size].reshape(len(states), size, size)
+    return boards, packed[:, 1].copy()
+
+# The point values of a hex board state encoding (see
+# game.board_to_string), whose points are the base-3 digits of one number,
+# the first point most significant. The number is split into chunks of
+# _CHUNK_DIGITS digits, small enough for uint64, whose digits are then
+# taken out together.
+def _hex_points(encoding: str, size: int) -> np.ndarray:
+    match = re.fullmatch(r"(\d+)[bw]([0-9a-f]+)", encoding)
+    if match is None:
+        raise ValueError(f"bad board state encoding {encoding[:20]!r}")
+    if int(match.group(1)) != size:
+        raise ValueError("all encodings must have the same board size")
+    number = int(match.group(2), 16)
+    chunks = (size * size + _CHUNK_DIGITS - 1) // _CHUNK_DIGITS
+    values = np.zeros(chunks, dtype=np.uint64)
+    for i in range(chunks):
+        number, values[i] = divmod(number, _CHUNK_BASE)
+    # Least significant digit first, then reversed into point order
+    digits = (values[:, None] // _DIGIT_POWERS) % 3
+    return digits.reshape(-1)[:size * size][::-1].astype(np.uint8)
+
+# The points orthogonally adjacent to any point in each mask of a stack of
+# (N, size, size) boolean masks.
+def _dilate(masks: np.ndarray) -> np.ndarray:
+    grown = np.zeros_like(masks)
+    grown[:, 1:, :] |= masks[:, :-1, :]
+    grown[:, :-1, :] |= masks[:, 1:, :]
+    grown[:, :, 1:] |= masks[:, :, :-1]
+    grown[:, :, :-1] |= masks[:, :, 1:]
+    return grown
+
+# Grows each seed mask through the points of the matching within mask until
+# no mask in the stack changes.
+def _propagate(seeds: np.ndarray, within: np.ndarray) -> np.ndarray:
+    reached = seeds & within
+    while True:
+        grown = (reached | _dilate(reached)) & within
+        if np.array_equal(grown, reached):
+            return reached
+        reached = grown
@@ -0,0 +1,204 @@
+# benchmark.py
+# ----------------
+# Benchmarks of the game engine's hot paths on reproducible games.
+# Author: Porter Zach
+
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+from game import Game, MoveStatus, board_to_string, string_to_board, bytes_to_board
+from players.player import BoardFormat
+from players.random_player import is_eye
+
+SIZES = (9, 13, 19)
+CASES = ("random", "capture", "ko")
+
+# Positions along each case's game that the per-position operations run on.
+CHECKPOINTS = 8
+
+# Shortest time a single timed run should take, to keep timer noise down.
+MIN_RUN_SECONDS = 0.05
+
+# Moves of a seeded random game: uniformly random legal moves that don't
+# fill one of the mover's own single-point eyes, until there are none or
+# the game reaches 2 * size^2 moves.
+def random_game(size: int, seed: int) -> list:
+    rng = random.Random(seed)
+    game = Game(None, size)
+    moves = []
+    while len(moves) < 2 * size * size:
+        _, to_play, board = bytes_to_board(game.get_board(BoardFormat.PACKED))
+        candidates = [divmod(i, size) for i, status in enumerate(game.legal_moves())
+                      if status == MoveStatus.LEGAL and not is_eye(board, size, *divmod(i, size), to_play)]
+        if len(candidates) == 0:
+            break
+        move = rng.choice(candidates)
+        game.try_place(*move)
+        moves.append(move)
+    return moves
+
+# Moves of a game in which White captures a block of (size - 1) / 2 full
+# columns of Black stones with its last move. White fills the far columns
+# while Black builds the block, then walls it in.
+def capture_game(size: int) -> list:
+    columns = (size - 1) // 2
+    black = [(x, y) for x in range(columns) for y in range(size)]
+    fillers = [(x, y) for x in range(columns + 2, size) for y in range(size)]
+    wall = [(columns, y) for y in range(size)]
+    white = fillers[:len(black) - len(wall)] + wall
+    return [move for pair in zip(black, white) for move in pair]
+
+# Moves of a game with a long ko fight in the top left corner. Each side
+# captures the ko in turn, and both play a move elsewhere (along rows far
+# from the ko) while the other side is forbidden to retake.
+def ko_game(size: int) -> list:
+    # Black's and White's shapes around the ko points (1, 1) and (2, 1)
+    moves = [(0, 1), (3, 1), (1, 0), (2, 0), (1, 2), (2, 2), (size - 1, size - 1), (1, 1)]
+    black_away = [(x, size - 1) for x in range(size - 2, -1, -1)]
+    white_away = [(x, size - 4) for x in range(size - 1, -1, -1)]
+    for i in range(0, len(black_away) - 1, 2):
+        if i + 2 > len(white_away):
+            break
+        # Black takes, White plays away, Black plays away, White retakes,
+        # Black plays away, White plays away
+        moves += [(2, 1), white_away[i], black_away[i], (1, 1), black_away[i + 1], white_away[i + 1]]
+    return moves
+
+def case_moves(case: str, size: int, seed: int) -> list:
+    if case == "random":
+        return random_game(size, seed)
+    if case == "capture":
+        return capture_game(size)
+    return ko_game(size)
+
+# Plays moves on a new Game, raising ValueError if one is illegal.
+def play_moves(size: int, moves: list) -> Game:
+    game = Game(None, size)
+    for i, move in enumerate(moves):
+        if not game.try_place(*move):
+            raise ValueError(f"move {i} at {move} is illegal")
+    return game
+
+# Times func, which performs ops operations, repeat times, calling it
+# enough times in a row for each run to last at least MIN_RUN_SECONDS.
+# Returns the best time per operation in microseconds.
+def _time(func, ops: int, repeat: int) -> float:
+    start = time.perf_counter()
+    func()
+    loops = max(1, int(MIN_RUN_SECONDS / max(time.perf_counter() - start, 1e-9)) + 1)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best / ops * 1e6
+
+# Benchmarks every operation on one case and size.
+# Returns microseconds per operation by operation name.
+def run_case(case: str, size: int, seed: int, repeat: int) -> dict:
+    moves = case_moves(case, size, seed)
+    play_moves(size, moves)
+    checkpoints = sorted({len(moves) * (i + 1) // CHECKPOINTS for i in range(CHECKPOINTS)})
+    games = [play_moves(size, moves[:n]) for n in checkpoints]
+    encodings = [game.get_board() for game in games]
+    boards = [string_to_board(encoding) for encoding in encodings]
+    points = [(x, y) for x in range(size) for y in range(size)]
+
+    def try_place():
+        game = Game(None, size)
+        for move in moves:
+            game.try_place(*move)
+
+    def can_place():
+        for game in games:
+            for point in points:
+                game.can_place(*point)
+
+    def score():
+        for game in games:
+            game.score()
+
+    def to_string():
+        for board_size, to_play, board in boards:
+            board_to_string(board_size, to_play, board)
+
+    def from_string():
+        for encoding in encodings:
+            string_to_board(encoding)
+
+    return {
+        "try_place": _time(try_place, len(moves), repeat),
+        "can_place": _time(can_place, len(games) * len(points), repeat),
+        "score": _time(score, len(games), repeat),
+        "board_to_string": _time(to_string, len(boards), repeat),
+        "string_to_board": _time(from_string, len(encodings), repeat),
+    }
+
+# Runs every case on every size.
+# Returns the results keyed "case/size/operation", in microseconds per
+# operation, with details of the run.
+def run(sizes: tuple = SIZES, cases: tuple = CASES, seed: int = 0, repeat: int = 5) -> dict:
+    results = {}
+    for size in sizes:
+        for case in cases:
+            for operation, us in run_case(case, size, seed, repeat).items():
+                results[f"{case}/{size}/{operation}"] = us
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "repeat": repeat,
+        "unit": "us/op",
+        "results": results,
+    }
+
+# Compares results with a baseline run of the same benchmarks.
+# Returns (key, baseline, current, ratio) for every benchmark in both, and
+# the keys of those slower than the baseline by more than threshold.
+def compare(baseline: dict, current: dict, threshold: float = 0.1) -> (list, list):
+    rows = []
+    regressions = []
+    for key, us in current["results"].items():
+        if key not in baseline["results"]:
+            continue
+        base = baseline["results"][key]
+        ratio = us / base if base > 0 else float("inf")
+        rows.append((key, base, us, ratio))
+        if ratio > 1 + threshold:
+            regressions.append(key)
+    return rows, regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the game engine's hot paths.")
+    parser.add_argument("-s", "--sizes", type=int, nargs="+", default=list(SIZES), choices=SIZES)
+    parser.add_argument("-c", "--cases", nargs="+", default=list(CASES), choices=CASES)
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="runs of each benchmark; the best is kept")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random games")
+    parser.add_argument("-o", "--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of a baseline run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="slowdown over the baseline counted as a regression (default: 0.1, i.e. 10%%)")
+    args = parser.parse_args()
+
+    report = run(tuple(args.sizes), tuple(args.cases), args.seed, args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare is None:
+        for key, us in report["results"].items():
+            print(f"{key:32} {us:12.3f} us/op")
+    else:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(baseline, report, args.threshold)
+        for key, base, us, ratio in rows:
+            flag = "  REGRESSION" if key in regressions else ""
+            print(f"{key:32} {base:12.3f} -> {us:12.3f} us/op  x{ratio:.2f}{flag}")
+        if regressions:
+            print(f"{len(regressions)} regressions over {args.threshold:.0%}")
+            sys.exit(1)
@@ -0,0 +1,267 @@
+# bitboard.py
+# ----------------
+# Bitboard backend for the Go game engine.
+# Author: Porter Zach
+
+import sys
+import random
+from game import Game, Backend, KoRule, MoveStatus, Stone, _layout, _zobrist_table
+
+_bit_layouts = {}
+
+# A Go board stored as one Python int bitmask per color. Point (x, y) is bit
+# x * (size + 1) + y; the spare bit at the end of each row is never on the
+# board, so shifting by one never carries a point into the next row.
+# ---
+# Groups, liberties and territory are found with shift-and-mask flood fills
+# over whole bitmasks rather than point by point. Implements the same
+# interface Game uses from game.Board.
+class BitBoard:
+    __slots__ = ("size", "width", "on_board", "keys", "zobrist", "stones", "hash")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.width = size + 1
+        self.on_board, self.keys = _bit_layout(size)
+        self.zobrist = _zobrist_table(size)
+        # Bitmask of the stones of each color, indexed by Stone
+        self.stones = [0, 0]
+        # Zobrist hash of the stones on the board, equal to game.Board's hash
+        # for the same position
+        self.hash = 0
+
+    # Builds a board from a list of lists of None / Stone values, such as
+    # the one returned by string_to_board.
+    @classmethod
+    def from_lists(cls, board: list) -> "BitBoard":
+        new_board = cls(len(board))
+        for x in range(new_board.size):
+            for y in range(new_board.size):
+                color = board[x][y]
+                if color is not None:
+                    p = new_board.index(x, y)
+                    new_board.stones[color] |= 1 << p
+                    new_board.hash ^= new_board.keys[p][color]
+        return new_board
+
+    # Returns the board as a list of lists of None / Stone values.
+    def to_lists(self) -> list:
+        return [[self.get(x, y) for y in range(self.size)] for x in range(self.size)]
+
+    # Returns an independent copy of the board.
+    def copy(self) -> "BitBoard":
+        new_board = BitBoard(self.size)
+        new_board.stones = list(self.stones)
+        new_board.hash = self.hash
+        return new_board
+
+    # The bit index of the point x, y.
+    def index(self, x: int, y: int) -> int:
+        return x * self.width + y
+
+    # The color of the stone at x, y, or None if the point is empty.
+    def get(self, x: int, y: int) -> int | None:
+        bit = 1 << self.index(x, y)
+        if self.stones[Stone.BLACK] & bit:
+            return int(Stone.BLACK)
+        if self.stones[Stone.WHITE] & bit:
+            return int(Stone.WHITE)
+        return None
+
+    # Checks a stone of the given color at p for occupation and suicide.
+    # Returns the MoveStatus (LEGAL, OCCUPIED or SUICIDE; ko is up to the
+    # caller) and the board hash the move would produce.
+    def check(self, p: int, color: int) -> (MoveStatus, int):
+        bit = 1 << p
+        own = self.stones[color]
+        if (own | self.stones[1 - color]) & bit:
+            return MoveStatus.OCCUPIED, self.hash
+
+        captured = self._captured_by(bit, color)
+        if not captured:
+            empty = self.on_board & ~(own | self.stones[1 - color] | bit)
+            if not self._dilate(self._flood(bit, own | bit)) & empty:
+                return MoveStatus.SUICIDE, self.hash
+
+        new_hash = self.hash ^ self.keys[p][color]
+        while captured:
+            stone = captured & -captured
+            new_hash ^= self.keys[stone.bit_length() - 1][1 - color]
+            captured ^= stone
+        return MoveStatus.LEGAL, new_hash
+
+    # Computes the MoveStatus of every point for a stone of the given color.
+    # is_repeat(new_hash) says whether a move producing that board hash is
+    # forbidden by ko; only capturing moves are checked unless check_all is
+    # set. Liberties are worked out once per group, not once per point.
+    def legal_moves(self, color: int, is_repeat, check_all: bool) -> bytes:
+        own = self.stones[color]
+        opponent = self.stones[1 - color]
+        empty = self.on_board & ~(own | opponent)
+
+        # Empty points that keep a liberty: next to another empty point, or
+        # joining a friendly group with a liberty elsewhere
+        safe = self._dilate(empty) & empty
+        for group in self._groups(own):
+            liberties = self._dilate(group) & empty
+            if liberties.bit_count() > 1:
+                safe |= liberties
+        # Empty points that capture: the last liberty of an opponent group
+        captures = 0
+        for group in self._groups(opponent):
+            liberties = self._dilate(group) & empty
+            if liberties.bit_count() == 1:
+                captures |= liberties
+        legal = safe | captures
+
+        mask = bytearray([MoveStatus.OCCUPIED]) * (self.size * self.size)
+        i = 0
+        for x in range(self.size):
+            for y in range(self.size):
+                p = x * self.width + y
+                bit = 1 << p
+                if empty & bit:
+                    if not legal & bit:
+                        mask[i] = MoveStatus.SUICIDE
+                    elif captures & bit:
+                        mask[i] = MoveStatus.KO if is_repeat(self.check(p, color)[1]) else MoveStatus.LEGAL
+                    elif check_all and is_repeat(self.hash ^ self.keys[p][color]):
+                        mask[i] = MoveStatus.KO
+                    else:
+                        mask[i] = MoveStatus.LEGAL
+                i += 1
+        return bytes(mask)
+
+    # Places a stone of the given color at the empty point p and removes the
+    # opponent groups it leaves without liberties. Legality is not checked.
+    # Returns a record of the move that can be passed to unplace.
+    def place(self, p: int, color: int) -> tuple:
+        bit = 1 << p
+        captured = self._captured_by(bit, color)
+        move = (self.stones[Stone.BLACK], self.stones[Stone.WHITE], self.hash, p, captured)
+
+        self.stones[color] |= bit
+        self.hash ^= self.keys[p][color]
+        self.stones[1 - color] &= ~captured
+        while captured:
+            stone = captured & -captured
+            self.hash ^= self.keys[stone.bit_length() - 1][1 - color]
+            captured ^= stone
+        return move
+
+    # Takes back a move returned by place.
+    def unplace(self, move: tuple):
+        self.stones[Stone.BLACK], self.stones[Stone.WHITE], self.hash = move[:3]
+
+    # The x, y coordinates of the stone placed by a move returned by place.
+    def placed_point(self, move: tuple) -> (int, int):
+        return divmod(move[3], self.width)
+
+    # The x, y coordinates of the stones captured by a move returned by place.
+    def captured_points(self, move: tuple) -> list:
+        points = []
+        captured = move[4]
+        while captured:
+            stone = captured & -captured
+            points.append(divmod(stone.bit_length() - 1, self.width))
+            captured ^= stone
+        return points
+
+    # Counts each color's stones plus the empty regions bordered only by
+    # that color. Returns Black's and White's area.
+    def area_scores(self) -> (int, int):
+        black, white = self.stones
+        empty = self.on_board & ~(black | white)
+        # Empty points connected to each color
+        reaches_black = self._flood(self._dilate(black) & empty, empty)
+        reaches_white = self._flood(self._dilate(white) & empty, empty)
+        return (black.bit_count() + (reaches_black & ~reaches_white).bit_count(),
+                white.bit_count() + (reaches_white & ~reaches_black).bit_count())
+
+    # The opponent stones that a stone of the given color at bit would
+    # capture, as a bitmask.
+    def _captured_by(self, bit: int, color: int) -> int:
+        opponent = self.stones[1 - color]
+        empty = self.on_board & ~(self.stones[color] | opponent | bit)
+        captured = 0
+        adjacent = self._dilate(bit) & opponent
+        while adjacent:
+            group = self._flood(adjacent & -adjacent, opponent)
+            adjacent &= ~group
+            if not self._dilate(group) & empty:
+                captured |= group
+        return captured
+
+    # Yields each connected group of stones in mask.
+    def _groups(self, mask: int):
+        while mask:
+            group = self._flood(mask & -mask, mask)
+            mask &= ~group
+            yield group
+
+    # The on-board points orthogonally adjacent to any point in mask.
+    def _dilate(self, mask: int) -> int:
+        return ((mask << 1) | (mask >> 1) | (mask << self.width) | (mask >> self.width)) & self.on_board
+
+    # Grows seed through the points of within until it stops changing.
+    def _flood(self, seed: int, within: int) -> int:
+        group = seed & within
+        while True:
+            grown = (group | self._dilate(group)) & within
+            if grown == group:
+                return group
+            group = grown
+
+# Returns the on-board mask for boards of the given size and the Zobrist keys
+# of each bit, shared with the array board's keys for the same point.
+def _bit_layout(size: int) -> (int, list):
+    if size not in _bit_layouts:
+        width = size + 1
+        on_board = 0
+        keys = [None] * (size * width)
+        zobrist = _zobrist_table(size)
+        layout = _layout(size)
+        for x in range(size):
+            on_board |= ((1 << size) - 1) << (x * width)
+            for y in range(size):
+                keys[x * width + y] = zobrist.stones[(x + 1) * layout.stride + y + 1]
+        _bit_layouts[size] = (on_board, keys)
+    return _bit_layouts[size]
+
+# Plays seeded random games on both backends side by side, checking after
+# every move that they agree on the board encoding, position hash, legal
+# move mask and score.
+def compare_backends(games: int, size: int, seed: int = 0) -> int:
+    rng = random.Random(seed)
+    moves = 0
+    for game_num in range(games):
+        ko_rule = KoRule(game_num % len(KoRule))
+        array_game = Game(None, size, ko_rule, Backend.ARRAY)
+        bit_game = Game(None, size, ko_rule, Backend.BITBOARD)
+        for _ in range(size * size * 3):
+            mask = array_game.legal_moves()
+            if mask != bit_game.legal_moves():
+                raise AssertionError(f"legal moves differ in game {game_num} after {moves} moves")
+            legal = [i for i, status in enumerate(mask) if status == MoveStatus.LEGAL]
+            if len(legal) == 0 or rng.random() < 0.02:
+                ended = array_game.pass_turn()
+                if ended != bit_game.pass_turn():
+                    raise AssertionError(f"pass handling differs in game {game_num}")
+                if ended:
+                    break
+                continue
+            x, y = divmod(rng.choice(legal), size)
+            if not (array_game.try_place(x, y) and bit_game.try_place(x, y)):
+                raise AssertionError(f"move {x}, {y} rejected in game {game_num}")
+            moves += 1
+            if array_game.get_board() != bit_game.get_board() or array_game.get_hash() != bit_game.get_hash():
+                raise AssertionError(f"positions differ in game {game_num} after {moves} moves")
+        if array_game.score() != bit_game.score():
+            raise AssertionError(f"scores differ in game {game_num}")
+    return moves
+
+if __name__ == "__main__":
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for size in (9, 13, 19):
+        moves = compare_backends(games, size)
+        print(f"{size}x{size}: backends agree over {games} games, {moves} moves")
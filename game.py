@@ -3,9 +3,10 @@
 # Game logic for Go game.
 # Author: Porter Zach
 
+import random
 from enum import IntEnum
 from dataclasses import dataclass
-from players.player import PlayerType
+from players.player import PlayerType, BoardFormat
 
 @dataclass
 class GameParams:
@@ -17,21 +18,99 @@ class Stone(IntEnum):
     BLACK = 0
     WHITE = 1
 
+# Which earlier positions a move is forbidden to recreate.
+# SIMPLE: only the position before the opponent's last move (basic ko).
+# POSITIONAL: any earlier board arrangement.
+# SITUATIONAL: any earlier board arrangement with the same player to move.
+class KoRule(IntEnum):
+    SIMPLE = 0
+    POSITIONAL = 1
+    SITUATIONAL = 2
+
+# Board implementation used by a Game. ARRAY is the flat array Board with
+# incrementally tracked chains; BITBOARD is bitboard.BitBoard, which keeps
+# one big-integer bitmask per color and works on whole groups with shifts.
+class Backend(IntEnum):
+    ARRAY = 0
+    BITBOARD = 1
+
+# Status of each point in the mask returned by legal_moves.
+class MoveStatus(IntEnum):
+    LEGAL = 0
+    OCCUPIED = 1
+    SUICIDE = 2
+    KO = 3 # would recreate a forbidden earlier position
+
+# The 8 symmetries of the board: turning it a quarter turn clockwise 0 to 3
+# times, after first reflecting it across the x = y diagonal for the
+# REFLECT ones. See transform_point.
+class Symmetry(IntEnum):
+    IDENTITY = 0
+    ROTATE_90 = 1
+    ROTATE_180 = 2
+    ROTATE_270 = 3
+    REFLECT = 4
+    REFLECT_ROTATE_90 = 5
+    REFLECT_ROTATE_180 = 6
+    REFLECT_ROTATE_270 = 7
+
+    # The symmetry that undoes this one.
+    def inverse(self) -> "Symmetry":
+        if self & 4:
+            # Every reflection undoes itself
+            return self
+        return Symmetry(-self & 3)
+
 NEIGHBORHOOD = [(1, 0), (0, 1), (-1, 0), (0, -1)]
 
-# TODO: Optimize redundant searches and extract various BFS implementations into single function
+# Board cell values besides the Stone colors. Boards are surrounded by a
+# one-point border of BORDER cells so neighbor lookups need no bounds checks.
+EMPTY = 2
+BORDER = 3
+
+# Zobrist keys are generated from a fixed seed so that position hashes are
+# stable across runs and processes.
+ZOBRIST_SEED = 0x60
+_zobrist_tables = {}
+_symmetry_tables = {}
+_layouts = {}
 
 class Game:
-    def __init__(self, controller, size: int):
+    def __init__(self, controller, size: int, ko_rule: KoRule = KoRule.SIMPLE,
+                 backend: Backend = Backend.ARRAY):
         self._controller = controller
         self._size = size
+        self._ko_rule = ko_rule
 
-        self._board = [[None for _ in range(size)] for _ in range(size)]
-        self._prior_state = deepcopy(self._board)
+        if backend == Backend.BITBOARD:
+            from bitboard import BitBoard
+            self._board = BitBoard(size)
+        else:
+            self._board = Board(size)
         self._turn = Stone.BLACK
 
-        self._states = [board_to_string(self._size, self._turn, self._board)]
+        # Board hash before the last stone placement, for simple ko checking
+        self._prior_hash = None
+        # Keys of every position reached so far, for superko checking
+        self._seen_positions = {self._position_key()}
+        # Everything needed to take back each move and pass made so far
+        self._undo_stack = []
+        # Moves made with play, at the top of the undo stack, that are not
+        # in the history yet
+        self._unrecorded = 0
+
+        # Record of the moves and passes made with try_place and pass_turn
+        from history import GameHistory
+        self._history = GameHistory(size)
         self._passed_last = False
+        # Packed encoding of the current position, updated point by point
+        self._encoder = BoardEncoder(size)
+        # Empty regions and stone counts for the live score, and the number
+        # of stones each player has captured
+        self._regions = _Regions(size)
+        self._captures = [0, 0]
+        # Hashes of the board under each symmetry, for get_canonical_hash
+        self._symmetry_hashes = _SymmetryHashes(size)
 
         # This implementation chooses to use a constant komi (White compensation)
         # following the argument that as board size decreases, komi should
@@ -39,25 +118,100 @@ class Game:
         # first provides a larger lead).
         self._komi = 6.5
 
-    # Gets an encoding of the board state
-    def get_board(self) -> str:
+    # Gets an encoding of the board state: the legacy hex string by default,
+    # or the packed bytes of board_to_bytes for BoardFormat.PACKED.
+    def get_board(self, board_format: BoardFormat = BoardFormat.HEX) -> str | bytes:
+        if board_format == BoardFormat.PACKED:
+            return self._encoder.to_bytes()
         return board_to_string(self._size, self._turn, self._board)
 
     # Gets the current turn: 0 for Black, 1 for White
     def get_turn(self) -> int:
         return int(self._turn)
 
+    # Gets a 64-bit Zobrist hash of the board state, including the player to
+    # move. Cheap enough to use as a cache key for positions.
+    def get_hash(self) -> int:
+        if self._turn == Stone.WHITE:
+            return self._board.hash ^ self._board.zobrist.white_to_play
+        return self._board.hash
+
+    # Gets a hash of the board state that is the same for all 8 rotations and
+    # reflections of it: the least get_hash of any of them. Caches keyed on
+    # it share entries between symmetric positions.
+    # Returns the hash and the symmetry taking this board to the one hashed.
+    # Map moves found for the canonical board back to this one with
+    # transform_point(x, y, size, symmetry.inverse()).
+    def get_canonical_hash(self) -> (int, Symmetry):
+        return self._symmetry_hashes.canonical(self._turn)
+
     # Whether a stone can be placed at the given coordinates
     def can_place(self, x: int, y: int) -> bool:
-        return _can_place(self._board, self._prior_state, x, y, self._turn)
+        if not self._in_bounds(x, y):
+            return False
+        status, new_hash = self._board.check(self._board.index(x, y), self._turn)
+        # Rule out recreating an earlier position (ko) from the hash of the
+        # resulting board
+        return status == MoveStatus.LEGAL and not self._repeats_position(new_hash)
+
+    # Gets the legality of every point for the player to move in one pass.
+    # Returns bytes of MoveStatus values where the status of x, y is at
+    # index x * size + y.
+    def legal_moves(self) -> bytes:
+        return self._board.legal_moves(self._turn, self._repeats_position,
+                                       self._ko_rule != KoRule.SIMPLE)
 
     # Place a stone at the given coordinates if possible 
     # Returns True if successful, False otherwise
     def try_place(self, x: int, y: int) -> bool:
-        if self.can_place(x, y,):
-            self._place(x, y)
+        self._record_played()
+        if self.play(x, y):
+            # Keep track of past board states for later examination
+            self._record(self._undo_stack[-1])
             return True
         return False
+
+    # Make a move at the given coordinates if it is legal, without recording
+    # it in the game's history. Intended for search: every move made
+    # can be taken back with undo without copying the board. Moves still
+    # on the board when try_place or pass_turn is next called are recorded
+    # then.
+    # Returns True if successful, False otherwise
+    def play(self, x: int, y: int) -> bool:
+        if not self.can_place(x, y):
+            return False
+        self._place(x, y)
+        self._unrecorded += 1
+        return True
+
+    # Take back the last move or pass made with play, try_place or pass_turn.
+    # Returns False if there is nothing to take back.
+    def undo(self) -> bool:
+        if len(self._undo_stack) == 0:
+            return False
+        undo = self._undo_stack.pop()
+        move = undo.move
+        self._prior_hash, self._turn, self._passed_last = undo.prior_hash, undo.turn, undo.passed_last
+        if undo.new_key is not None:
+            self._seen_positions.discard(undo.new_key)
+        self._encoder.set_turn(self._turn)
+        if move is not None:
+            x, y = self._board.placed_point(move)
+            captured = self._board.captured_points(move)
+            self._encoder.set_point(x, y, None)
+            for cx, cy in captured:
+                self._encoder.set_point(cx, cy, 1 - self._turn)
+                self._regions.add_stone(self._point(cx, cy), 1 - self._turn)
+                self._symmetry_hashes.toggle(self._point(cx, cy), 1 - self._turn)
+            self._regions.remove_stone(self._point(x, y))
+            self._symmetry_hashes.toggle(self._point(x, y), self._turn)
+            self._captures[self._turn] -= len(captured)
+            self._board.unplace(move)
+        if undo.recorded:
+            self._history.pop()
+        else:
+            self._unrecorded -= 1
+        return True
     
     # Get the winner of the board and each player's score.
     # Under Chinese rules of area scoring:
@@ -68,215 +222,867 @@ class Game:
     # If the results are different, it almost never changes the game's outcome.
     # Returns the player that won (Black (0) or White (1)) and each player's score.
     def score(self) -> (int, int, int):
-        scores = [0, self._komi]
-        considered = set()
-
-        def consider(pos):
-            if pos in considered:
-                return
-            considered.add(pos)
-            color = self._board[pos[0]][pos[1]]
-            if color is not None:
-                scores[color] += 1
-                return
-            # Perform BFS to see if the group of empty tiles is 
-            # bounded entirely by 1 color
-            queue = [pos]
-            count = 1
-            hopeful_color = None
-            failed = False
-            while len(queue) != 0:
-                p = queue.pop(0)
-                for neighbor in _neighbors(self._board, *p):
-                    nabe_color = self._board[neighbor[0]][neighbor[1]]
-                    if nabe_color is None:
-                        if neighbor not in considered:
-                            # Found another empty tile. Continue BFS
-                            considered.add(neighbor)
-                            queue.append(neighbor)
-                            count += 1
-                    elif hopeful_color is None:
-                        # Found the first non-empty tile. Consider it as the hopeful
-                        # color surrounding the entire territory.
-                        hopeful_color = nabe_color
-                    elif nabe_color != hopeful_color:
-                        # Found a neighbor different to original hopeful color.
-                        # No singly-bounded territory here; ignore tiles of this group.
-                        failed = True
-            if hopeful_color is not None and not failed:
-                scores[hopeful_color] += count
-
-        for x in range(self._size):
-            for y in range(self._size):
-                consider((x, y))
+        black, white = self._board.area_scores()
+        scores = [black, white + self._komi]
+        return scores.index(max(scores)), *scores
 
+    # The same as score, for the current position, in constant time from the
+    # incrementally kept empty regions.
+    def live_score(self) -> (int, int, int):
+        black, white = self._regions.scores()
+        scores = [black, white + self._komi]
         return scores.index(max(scores)), *scores
+
+    # Gets the number of stones captured by Black and by White.
+    def get_captures(self) -> (int, int):
+        return tuple(self._captures)
     
     def pass_turn(self):
+        self._record_played()
         if self._passed_last:
             return True
+        self._push_undo(None)
         self._turn = 1 - self._turn
+        self._encoder.set_turn(self._turn)
+        self._record_position()
         self._passed_last = True
+        self._unrecorded += 1
+        self._record(self._undo_stack[-1])
         return False
     
     def just_passed(self):
         return self._passed_last
 
+    # Gets the number of positions in the game's history: one more than the
+    # number of moves and passes made.
+    def get_num_states(self) -> int:
+        return len(self._history)
+
+    # Gets the packed encoding (see board_to_bytes) of the position after the
+    # first n moves and passes of the game.
+    def get_state(self, n: int) -> bytes:
+        return self._history.position(n)
+
+    # Gets the encoding of the position before the opponent's last move,
+    # which the player to move may not recreate under simple ko, or None if
+    # the last action was a pass (or there was none). Players given it can
+    # judge ko (see the module-level legal_moves).
+    def get_prior_state(self, board_format: BoardFormat = BoardFormat.HEX) -> str | bytes | None:
+        if len(self._undo_stack) == 0 or self._undo_stack[-1].move is None:
+            return None
+        # Take the last move back from a copy of the current encoding; it may
+        # have been made with play and not be in the history yet
+        undo = self._undo_stack[-1]
+        encoder = BoardEncoder(self._size)
+        encoder.data[:] = self._encoder.data
+        encoder.set_point(*self._board.placed_point(undo.move), None)
+        for cx, cy in self._board.captured_points(undo.move):
+            encoder.set_point(cx, cy, 1 - undo.turn)
+        encoder.set_turn(undo.turn)
+        state = encoder.to_bytes()
+        if board_format == BoardFormat.PACKED:
+            return state
+        return board_to_string(*decode_board(state))
+
+    # Gets the packed encodings of every position in the game's history, as
+    # get_state for each n.
+    def get_states(self) -> list:
+        return self._history.positions()
+
+    # Gets the moves and passes made so far: the x, y coordinates of each
+    # stone placed, or None for a pass.
+    def get_moves(self) -> list:
+        return [self._history.move(i) for i in range(len(self._history) - 1)]
+
+    # Gets the color of the player that made each move and pass so far.
+    def get_move_colors(self) -> list:
+        return [self._history.color(i) for i in range(len(self._history) - 1)]
+
+    def get_size(self) -> int:
+        return self._size
+
+    def get_komi(self) -> float:
+        return self._komi
+
+    # Gets the engine's profiling stats (see instrumentation.enable): calls
+    # and wall time per function, BFS nodes visited and board copies made.
+    # Empty until instrumentation is enabled. Clears them after if reset.
+    # The stats cover every game in the process, not just this one, as the
+    # instrumentation wraps the engine's code itself.
+    @staticmethod
+    def stats(reset: bool = False) -> dict:
+        import instrumentation
+        stats = instrumentation.stats()
+        if reset:
+            instrumentation.reset()
+        return stats
+
     # Place a stone at the given coordinates
     def _place(self, x: int, y: int):
-        # Save prior state for ko checking
-        self._prior_state = deepcopy(self._board)
+        prior_hash = self._board.hash
         # Place stone, update board
-        self._board[x][y] = self._turn
-        self._update_board(x, y)
+        move = self._board.place(self._board.index(x, y), self._turn)
+        self._push_undo(move)
+        # Only the placed and captured points change in the packed encoding
+        # and the empty regions
+        captured = self._board.captured_points(move)
+        self._encoder.set_point(x, y, self._turn)
+        self._regions.add_stone(self._point(x, y), self._turn)
+        self._symmetry_hashes.toggle(self._point(x, y), self._turn)
+        for cx, cy in captured:
+            self._encoder.set_point(cx, cy, None)
+            self._regions.remove_stone(self._point(cx, cy))
+            self._symmetry_hashes.toggle(self._point(cx, cy), 1 - self._turn)
+        self._captures[self._turn] += len(captured)
+        # Save prior state for ko checking
+        self._prior_hash = prior_hash
         self._turn = 1 - self._turn
-        # Keep track of past board states for later examination
-        self._states.append(board_to_string(self._size, self._turn, self._board))
+        self._encoder.set_turn(self._turn)
+        self._record_position()
         # Reset pass count for game end checking
         self._passed_last = False
 
-    # Update the board in the neighborhood of the stone placed at x, y.
-    def _update_board(self, x: int, y: int):
-        color = self._board[x][y]
-        # For all 4 neighbors,
-        for neighbor in _neighbors(self._board, x, y):
-            neighbor_color = self._board[neighbor[0]][neighbor[1]]
-            # If the neighbor is a different color,
-            if neighbor_color is not None and color != neighbor_color:
-                # And its group has no more liberties,
-                if not self._has_liberties(*neighbor):
-                    # Remove the group.
-                    self._remove_group(*neighbor)
-
-    # Returns whether the group containing the stone at x, y has any liberties.
-    def _has_liberties(self, x: int, y: int) -> bool:
-        return _has_liberties(self._board, x, y)
-    
-    # Removes the stone at x, y.
-    def _remove_stone(self, x: int, y: int):
-        self._board[x][y] = None
-
-    # Removes the group containing the stone at x, y and returns the number
-    # of stones that were in the group.
-    def _remove_group(self, x: int, y: int) -> int:
-        group = {(x, y)}
-        queue = [(x, y)]
-
-        # Perform BFS to look for neighboring same-color stones to add to group
-        while len(queue) != 0:
-            stone = queue.pop(0)
-            stone_color = self._board[stone[0]][stone[1]]
-            for neighbor in _neighbors(self._board, *stone):
-                color = self._board[neighbor[0]][neighbor[1]]
-                if neighbor not in group and color == stone_color:
-                    queue.append(neighbor)
-                    group.add(neighbor)
-
-        num_removed = len(group)
-        for stone in group:
-            self._remove_stone(*stone)
-            
-        return num_removed
+    # Records the moves made with play and not taken back in the history, so
+    # it stays complete when try_place or pass_turn follows them.
+    def _record_played(self):
+        for undo in self._undo_stack[len(self._undo_stack) - self._unrecorded:]:
+            self._record(undo)
+
+    # Records the move or pass of an undo stack entry in the history.
+    def _record(self, undo: "_Undo"):
+        if undo.move is None:
+            self._history.record_pass(undo.turn)
+        else:
+            x, y = self._board.placed_point(undo.move)
+            self._history.record_move(x, y, self._board.captured_points(undo.move), undo.turn)
+        undo.recorded = True
+        self._unrecorded -= 1
+
+    # Save the game state that a move or pass is about to change.
+    def _push_undo(self, move):
+        self._undo_stack.append(_Undo(move, self._prior_hash, self._turn, self._passed_last))
+
+    # Record the current position for superko checking, remembering on the
+    # undo stack whether it was new so undo can forget it again.
+    def _record_position(self):
+        key = self._position_key()
+        if key not in self._seen_positions:
+            self._seen_positions.add(key)
+            self._undo_stack[-1].new_key = key
+
+    # The flat index of x, y on a padded board (see Board.index).
+    def _point(self, x: int, y: int) -> int:
+        return (x + 1) * (self._size + 2) + y + 1
 
     # Returns whether x, y are within the bounds of the board.
     def _in_bounds(self, x: int, y: int) -> bool:
         return _in_bounds(self._board, x, y)
 
-# Whether a stone can be placed at the given coordinates
-def _can_place(board: list, prior_state: list, x: int, y: int, color: int) -> bool:
-    # Can't place on top of another stone
-    if board[x][y] is not None:
-        return False
-    
-    mutable_board = deepcopy(board)
-    mutable_board[x][y] = color
-    has_liberties = _has_liberties(mutable_board, x, y)
-    # Check if the group being added to still has liberties after placement
-    if has_liberties:
-        # If it does, can place.
-        return True
-    # If it doesn't, check if the placement will cause a removal of any 
-    # manhattan neighbors
-    else:
-        for neighbor in _neighbors(board, x, y):
-            # Ignore if same color
-            if mutable_board[x][y] == mutable_board[neighbor[0]][neighbor[1]]:
+    # The key the current position is recorded under for superko checking.
+    # Situational superko distinguishes positions by the player to move.
+    def _position_key(self) -> int:
+        if self._ko_rule == KoRule.SITUATIONAL:
+            return self.get_hash()
+        return self._board.hash
+
+    # Whether a move by the player to move resulting in the board hash
+    # new_hash would recreate a forbidden earlier position.
+    def _repeats_position(self, new_hash: int) -> bool:
+        if self._ko_rule == KoRule.SIMPLE:
+            return new_hash == self._prior_hash
+        if self._ko_rule == KoRule.SITUATIONAL and self._turn == Stone.BLACK:
+            # White will be to move after this move
+            new_hash ^= self._board.zobrist.white_to_play
+        return new_hash in self._seen_positions
+
+# A Go board stored as a flat bytearray of cell values (Stone colors, EMPTY)
+# padded with a one-point BORDER on every side. Point (x, y) is stored at
+# index (x + 1) * (size + 2) + y + 1; see Board.index.
+# ---
+# The board also keeps its chains of stones with their liberties, and the
+# Zobrist hash of its stones, up to date as stones are placed and captured.
+class Board:
+    __slots__ = ("size", "layout", "zobrist", "cells", "chains", "hash")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.layout = _layout(size)
+        self.zobrist = _zobrist_table(size)
+        self.cells = bytearray(self.layout.empty_cells)
+        # The chain each stone belongs to, or None for empty and border points
+        self.chains = [None] * len(self.cells)
+        # Zobrist hash of the stones on the board
+        self.hash = 0
+
+    # Builds a board from a list of lists of None / Stone values, such as
+    # the one returned by string_to_board.
+    @classmethod
+    def from_lists(cls, board: list) -> "Board":
+        new_board = cls(len(board))
+        for x in range(new_board.size):
+            for y in range(new_board.size):
+                color = board[x][y]
+                if color is not None:
+                    p = new_board.index(x, y)
+                    new_board.cells[p] = color
+                    new_board.hash ^= new_board.zobrist.stones[p][color]
+        new_board._rebuild_chains()
+        return new_board
+
+    # Returns the board as a list of lists of None / Stone values.
+    def to_lists(self) -> list:
+        return [[self.get(x, y) for y in range(self.size)] for x in range(self.size)]
+
+    # Returns an independent copy of the board, chains included.
+    def copy(self) -> "Board":
+        new_board = Board.__new__(Board)
+        new_board.size = self.size
+        new_board.layout = self.layout
+        new_board.zobrist = self.zobrist
+        new_board.cells = bytearray(self.cells)
+        new_board.hash = self.hash
+        new_board.chains = [None] * len(self.chains)
+        copies = {}
+        for p in self.layout.points:
+            chain = self.chains[p]
+            if chain is not None:
+                if chain not in copies:
+                    copies[chain] = _Chain(chain.color, list(chain.stones), set(chain.liberties))
+                new_board.chains[p] = copies[chain]
+        return new_board
+
+    # The flat index of the point x, y.
+    def index(self, x: int, y: int) -> int:
+        return (x + 1) * self.layout.stride + y + 1
+
+    # The color of the stone at x, y, or None if the point is empty.
+    def get(self, x: int, y: int) -> int | None:
+        cell = self.cells[self.index(x, y)]
+        return None if cell == EMPTY else cell
+
+    # Checks a stone of the given color at p for occupation and suicide.
+    # Returns the MoveStatus (LEGAL, OCCUPIED or SUICIDE; ko is up to the
+    # caller) and the board hash the move would produce.
+    def check(self, p: int, color: int) -> (MoveStatus, int):
+        if self.cells[p] != EMPTY:
+            return MoveStatus.OCCUPIED, self.hash
+        captured = self.captured_by(p, color)
+        if not captured and not self.keeps_liberty(p, color):
+            return MoveStatus.SUICIDE, self.hash
+        return MoveStatus.LEGAL, self.hash_after(p, color, captured)
+
+    # Computes the MoveStatus of every point for a stone of the given color.
+    # See _legal_moves.
+    def legal_moves(self, color: int, is_repeat, check_all: bool) -> bytes:
+        return _legal_moves(self, color, is_repeat, check_all)
+
+    # Counts each color's stones plus the empty regions bordered only by
+    # that color. Returns Black's and White's area.
+    def area_scores(self) -> (int, int):
+        scores = [0, 0]
+        cells = self.cells
+        considered = bytearray(len(cells))
+
+        for p in self.layout.points:
+            if considered[p]:
+                continue
+            color = cells[p]
+            if color != EMPTY:
+                scores[color] += 1
                 continue
-            if not _has_liberties(mutable_board, *neighbor):
-                # If it does, and the move doesn't violate ko, can place. 
-                mutable_board[neighbor[0]][neighbor[1]] = None
-                if eq(mutable_board, prior_state):
-                    # Violates ko
-                    return False
+            # Flood fill to see if the region of empty points is bounded
+            # entirely by 1 color
+            region, bordering = _flood(self, p)
+            for point in region:
+                considered[point] = 1
+            colors = {cells[point] for point in bordering}
+            if len(colors) == 1:
+                scores[colors.pop()] += len(region)
+
+        return scores[0], scores[1]
+
+    # Returns the distinct opponent chains that would be captured by a stone
+    # of the given color at p, i.e. those whose only liberty is p.
+    def captured_by(self, p: int, color: int) -> list:
+        captured = []
+        for neighbor in self.layout.neighbors[p]:
+            chain = self.chains[neighbor]
+            if chain is not None and chain.color != color \
+                    and len(chain.liberties) == 1 and chain not in captured:
+                captured.append(chain)
+        return captured
+
+    # Returns whether a stone of the given color at p would have a liberty
+    # of its own or one shared through a friendly chain it joins.
+    def keeps_liberty(self, p: int, color: int) -> bool:
+        for neighbor in self.layout.neighbors[p]:
+            cell = self.cells[neighbor]
+            if cell == EMPTY:
+                return True
+            if cell == color and len(self.chains[neighbor].liberties) > 1:
                 return True
-    # Otherwise, cannot place.
-    return False
+        return False
 
-# Returns whether x, y are within the bounds of the board.
-def _in_bounds(board: list, x: int, y: int) -> bool:
-    return x >= 0 and x < len(board) and y >= 0 and y < len(board)
+    # The board hash after a stone of the given color is placed at p and the
+    # chains in captured are removed.
+    def hash_after(self, p: int, color: int, captured: list) -> int:
+        new_hash = self.hash ^ self.zobrist.stones[p][color]
+        for chain in captured:
+            for stone in chain.stones:
+                new_hash ^= self.zobrist.stones[stone][chain.color]
+        return new_hash
+
+    # Places a stone of the given color at the empty point p, merging it
+    # into the chains it touches and removing the opponent chains it leaves
+    # without liberties. Legality is not checked.
+    # Returns a record of the move that can be passed to unplace.
+    def place(self, p: int, color: int) -> "_Move":
+        cells = self.cells
+        chains = self.chains
+        neighbors = self.layout.neighbors[p]
+        move = _Move(p, color, self.hash)
+
+        cells[p] = color
+        self.hash ^= self.zobrist.stones[p][color]
+
+        # Take the point away from adjacent opponent chains' liberties and
+        # collect the friendly chains the stone joins
+        liberties = set()
+        friendly = []
+        for neighbor in neighbors:
+            neighbor_chain = chains[neighbor]
+            if neighbor_chain is None:
+                if cells[neighbor] == EMPTY:
+                    liberties.add(neighbor)
+            elif neighbor_chain.color != color:
+                neighbor_chain.liberties.discard(p)
+            elif neighbor_chain not in friendly:
+                friendly.append(neighbor_chain)
+
+        if not friendly:
+            chain = _Chain(color, [p], liberties)
+        else:
+            # Merge everything into the largest friendly chain. The other
+            # chains are left untouched so unplace can restore them.
+            chain = max(friendly, key=lambda c: len(c.stones))
+            move.chain = chain
+            move.chain_size = len(chain.stones)
+            move.chain_liberties = chain.liberties
+            move.absorbed = [c for c in friendly if c is not chain]
+            liberties |= chain.liberties
+            for absorbed in move.absorbed:
+                for stone in absorbed.stones:
+                    chains[stone] = chain
+                chain.stones.extend(absorbed.stones)
+                liberties |= absorbed.liberties
+            liberties.discard(p)
+            chain.stones.append(p)
+            chain.liberties = liberties
+        chains[p] = chain
+
+        # Remove opponent chains that have no more liberties
+        for neighbor in neighbors:
+            neighbor_chain = chains[neighbor]
+            if neighbor_chain is not None and neighbor_chain.color != color \
+                    and not neighbor_chain.liberties:
+                move.captured.append(neighbor_chain)
+                _remove_group(self, neighbor)
+        return move
+
+    # Takes back a move returned by place. Moves must be taken back in the
+    # reverse order they were made.
+    def unplace(self, move: "_Move"):
+        cells = self.cells
+        chains = self.chains
+        p = move.point
+
+        # Put the captured stones back, taking them away from the liberties
+        # of the chains around them
+        for captured in move.captured:
+            for stone in captured.stones:
+                cells[stone] = captured.color
+                chains[stone] = captured
+            for stone in captured.stones:
+                for neighbor in self.layout.neighbors[stone]:
+                    neighbor_chain = chains[neighbor]
+                    if neighbor_chain is not None and neighbor_chain.color != captured.color:
+                        neighbor_chain.liberties.discard(stone)
+
+        # Split the merged chain back into the chains it was made from
+        if move.chain is not None:
+            del move.chain.stones[move.chain_size:]
+            move.chain.liberties = move.chain_liberties
+            for absorbed in move.absorbed:
+                for stone in absorbed.stones:
+                    chains[stone] = absorbed
+        cells[p] = EMPTY
+        chains[p] = None
+
+        # The point is a liberty again for the opponent chains around it
+        for neighbor in self.layout.neighbors[p]:
+            neighbor_chain = chains[neighbor]
+            if neighbor_chain is not None and neighbor_chain.color != move.color:
+                neighbor_chain.liberties.add(p)
+        self.hash = move.hash
+
+    # The x, y coordinates of the stone placed by a move returned by place.
+    def placed_point(self, move: "_Move") -> (int, int):
+        return self.layout.coords[move.point]
+
+    # The x, y coordinates of the stones captured by a move returned by place.
+    def captured_points(self, move: "_Move") -> list:
+        return [self.layout.coords[stone] for chain in move.captured for stone in chain.stones]
+
+    # Recomputes every chain from the cell values.
+    def _rebuild_chains(self):
+        self.chains = [None] * len(self.cells)
+        for p in self.layout.points:
+            if self.cells[p] != EMPTY and self.chains[p] is None:
+                stones, bordering = _flood(self, p)
+                liberties = {point for point in bordering if self.cells[point] == EMPTY}
+                chain = _Chain(self.cells[p], stones, liberties)
+                for stone in stones:
+                    self.chains[stone] = chain
 
-# Returns whether the group containing the stone at x, y has any liberties.
-def _has_liberties(board: list, x: int, y: int) -> bool:
-    if not _in_bounds(board, x, y):
+# A connected group of same-color stones along with the empty points adjacent
+# to it. Boards keep these up to date as stones are placed and captured so
+# liberty and capture checks never have to flood fill the board.
+class _Chain:
+    __slots__ = ("color", "stones", "liberties")
+
+    def __init__(self, color: int, stones: list, liberties: set):
+        self.color = color
+        self.stones = stones
+        self.liberties = liberties
+
+# What a move or pass made through Game changed, so that Game.undo can take
+# it back: the board's record of the move (None for a pass), the Game state
+# before it, the key of the position it reached if that was new to the
+# superko record, and whether it was recorded in the game's history.
+class _Undo:
+    __slots__ = ("move", "prior_hash", "turn", "passed_last", "new_key", "recorded")
+
+    def __init__(self, move, prior_hash: int | None, turn: int, passed_last: bool):
+        self.move = move
+        self.prior_hash = prior_hash
+        self.turn = turn
+        self.passed_last = passed_last
+        self.new_key = None
+        self.recorded = False
+
+# What Board.place changed, so that Board.unplace can take it back: the
+# board hash before the move, the opponent chains captured, and, if the stone
+# joined friendly chains, the chain they were merged into (with its size and
+# liberty set beforehand) and the chains absorbed into it.
+class _Move:
+    __slots__ = ("point", "color", "hash", "captured", "chain", "chain_size", "chain_liberties", "absorbed")
+
+    def __init__(self, point: int, color: int, hash: int):
+        self.point = point
+        self.color = color
+        self.hash = hash
+        self.captured = []
+        self.chain = None
+        self.chain_size = 0
+        self.chain_liberties = None
+        self.absorbed = None
+
+# The empty regions of a board and the stones bordering each, kept up to
+# date one stone at a time so the area score is always known. Uses the same
+# padded flat indices as Board, whichever backend the game uses.
+# ---
+# Each region keeps its points and, per color, the number of (point,
+# adjacent stone) pairs between it and that color. A region is territory of
+# a color when only that color borders it. Removing a stone joins the regions
+# around it; adding one may split its region, which is only searched in full
+# when a quick search from one of the stone's empty neighbors can't reach
+# the others.
+class _Regions:
+    __slots__ = ("neighbors", "cells", "region_of", "members", "borders", "next_id", "stones", "territory")
+
+    def __init__(self, size: int):
+        layout = _layout(size)
+        self.neighbors = layout.neighbors
+        self.cells = bytearray(layout.empty_cells)
+        # Region id of each empty point
+        self.region_of = [0] * len(self.cells)
+        # Points and border counts of each region by id
+        self.members = {0: set(layout.points)}
+        self.borders = {0: [0, 0]}
+        self.next_id = 1
+        # Stones of each color and territory owned by each color
+        self.stones = [0, 0]
+        self.territory = [0, 0]
+
+    # Black's and White's area scores, without komi.
+    def scores(self) -> (int, int):
+        return self.stones[Stone.BLACK] + self.territory[Stone.BLACK], \
+               self.stones[Stone.WHITE] + self.territory[Stone.WHITE]
+
+    # Puts a stone of color on the empty point p.
+    def add_stone(self, p: int, color: int):
+        cells = self.cells
+        region = self.region_of[p]
+        self._untally(region)
+        members = self.members[region]
+        members.discard(p)
+        border = self.borders[region]
+        cells[p] = color
+        self.stones[color] += 1
+
+        empty_neighbors = []
+        for n in self.neighbors[p]:
+            cell = cells[n]
+            if cell == EMPTY:
+                empty_neighbors.append(n)
+            elif cell != BORDER:
+                # p is no longer an empty point next to this stone
+                border[cell] -= 1
+
+        if len(members) == 0:
+            del self.members[region], self.borders[region]
+            return
+        if len(empty_neighbors) > 1 and self._splits(empty_neighbors)[0]:
+            del self.members[region], self.borders[region]
+            for n in empty_neighbors:
+                if self.region_of[n] == region:
+                    self._label(n)
+            return
+        border[color] += len(empty_neighbors)
+        self._tally(region)
+
+    # Takes the stone off the point p.
+    def remove_stone(self, p: int):
+        cells = self.cells
+        color = cells[p]
+        cells[p] = EMPTY
+        self.stones[color] -= 1
+
+        regions = set()
+        for n in self.neighbors[p]:
+            if cells[n] == EMPTY:
+                region = self.region_of[n]
+                if region not in regions:
+                    regions.add(region)
+                    self._untally(region)
+                # p is no longer a stone next to this empty point
+                self.borders[region][color] -= 1
+
+        if len(regions) == 0:
+            region = self.next_id
+            self.next_id += 1
+            self.members[region] = set()
+            self.borders[region] = [0, 0]
+        else:
+            # Join the regions into the largest
+            region = max(regions, key=lambda r: len(self.members[r]))
+            members = self.members[region]
+            border = self.borders[region]
+            for other in regions:
+                if other != region:
+                    for q in self.members[other]:
+                        self.region_of[q] = region
+                    members |= self.members.pop(other)
+                    other_border = self.borders.pop(other)
+                    border[0] += other_border[0]
+                    border[1] += other_border[1]
+
+        self.region_of[p] = region
+        self.members[region].add(p)
+        border = self.borders[region]
+        for n in self.neighbors[p]:
+            cell = cells[n]
+            if cell < EMPTY:
+                border[cell] += 1
+        self._tally(region)
+
+    # Whether the empty points in starts are no longer all connected, found by
+    # searching out from the first until every other one is reached.
+    # Returns that and the number of points searched.
+    def _splits(self, starts: list) -> (bool, int):
+        cells = self.cells
+        neighbors = self.neighbors
+        remaining = set(starts[1:])
+        seen = {starts[0]}
+        frontier = [starts[0]]
+        i = 0
+        while i < len(frontier):
+            for n in neighbors[frontier[i]]:
+                if cells[n] == EMPTY and n not in seen:
+                    if n in remaining:
+                        remaining.discard(n)
+                        if len(remaining) == 0:
+                            return False, len(frontier)
+                    seen.add(n)
+                    frontier.append(n)
+            i += 1
+        return True, len(frontier)
+
+    # Makes the empty points connected to start a new region.
+    # Returns the number of points in it.
+    def _label(self, start: int) -> int:
+        cells = self.cells
+        neighbors = self.neighbors
+        region = self.next_id
+        self.next_id += 1
+        border = [0, 0]
+        self.region_of[start] = region
+        frontier = [start]
+        i = 0
+        while i < len(frontier):
+            for n in neighbors[frontier[i]]:
+                cell = cells[n]
+                if cell == EMPTY:
+                    if self.region_of[n] != region:
+                        self.region_of[n] = region
+                        frontier.append(n)
+                elif cell != BORDER:
+                    border[cell] += 1
+            i += 1
+        self.members[region] = set(frontier)
+        self.borders[region] = border
+        self._tally(region)
+        return len(frontier)
+
+    # The color whose territory a region is, or None.
+    def _owner(self, region: int) -> int | None:
+        black, white = self.borders[region]
+        if black and not white:
+            return Stone.BLACK
+        if white and not black:
+            return Stone.WHITE
         return None
 
-    group = set()
-    queue = [(x, y)]
-
-    # Perform BFS to look for liberties
-    while len(queue) != 0:
-        stone = queue.pop(0)
-        stone_color = board[stone[0]][stone[1]]
-        for neighbor in _neighbors(board, *stone):
-            color = board[neighbor[0]][neighbor[1]]
-            # Found a liberty
-            if color is None:
-                return True
-            elif neighbor not in group and color == stone_color:
-                queue.append(neighbor)
-                group.add(neighbor)
-
-    # Found no liberties
-    return False
-
-def _neighbors(board: list, x: int, y: int) -> list:
-    nabes = []
-    for dir in NEIGHBORHOOD:
-        new_stone = (x + dir[0], y + dir[1])
-        if _in_bounds(board, *new_stone):
-            nabes.append(new_stone)
-    return nabes
-
-# Returns a deep copy of a board.
-def deepcopy(board: list) -> list:
-    new_board = [[None for _ in range(len(board))] for _ in range(len(board))]
-    for x in range(len(board)):
-        for y in range(len(board)):
-            new_board[x][y] = board[x][y]
-    return new_board
-
-# Returns whether two boards are equivalent.
-def eq(board1: list, board2: list) -> bool:
-    for x in range(len(board1)):
-        for y in range(len(board1)):
-            if board1[x][y] != board2[x][y]:
-                return False
-    return True
-
-# Encodes a board state into a board state encoding
-def board_to_string(size: int, to_play: Stone, board: list):
-    if size != len(board) or size != len(board[0]):
-        raise ValueError("size does not match board shape")
+    def _tally(self, region: int):
+        owner = self._owner(region)
+        if owner is not None:
+            self.territory[owner] += len(self.members[region])
+
+    def _untally(self, region: int):
+        owner = self._owner(region)
+        if owner is not None:
+            self.territory[owner] -= len(self.members[region])
+
+# Geometry shared by all boards of one size: the flat indices of the points
+# on the board, the x, y coordinates of each index, and the 4 neighbor
+# indices of each point (border included) in NEIGHBORHOOD order.
+class _Layout:
+    __slots__ = ("size", "stride", "points", "coords", "offsets", "neighbors", "empty_cells")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.stride = size + 2
+        self.offsets = tuple(dx * self.stride + dy for dx, dy in NEIGHBORHOOD)
+        self.points = [(x + 1) * self.stride + y + 1 for x in range(size) for y in range(size)]
+
+        self.coords = [None] * (self.stride * self.stride)
+        self.neighbors = [()] * (self.stride * self.stride)
+        cells = bytearray([BORDER]) * (self.stride * self.stride)
+        for p in self.points:
+            self.coords[p] = (p // self.stride - 1, p % self.stride - 1)
+            self.neighbors[p] = tuple(p + offset for offset in self.offsets)
+            cells[p] = EMPTY
+        self.empty_cells = bytes(cells)
+
+# Returns the shared layout for boards of the given size.
+def _layout(size: int) -> _Layout:
+    if size not in _layouts:
+        _layouts[size] = _Layout(size)
+    return _layouts[size]
+
+# Random keys for Zobrist hashing positions on a board of the given size.
+# stones[p][color] is XORed into the hash while that stone is on the board.
+class _ZobristTable:
+    __slots__ = ("stones", "white_to_play")
+
+    def __init__(self, size: int):
+        rng = random.Random(ZOBRIST_SEED * 100 + size)
+        layout = _layout(size)
+        self.stones = [None] * (layout.stride * layout.stride)
+        for p in layout.points:
+            self.stones[p] = (rng.getrandbits(64), rng.getrandbits(64))
+        self.white_to_play = rng.getrandbits(64)
+
+# Returns the shared Zobrist table for boards of the given size.
+def _zobrist_table(size: int) -> _ZobristTable:
+    if size not in _zobrist_tables:
+        _zobrist_tables[size] = _ZobristTable(size)
+    return _zobrist_tables[size]
+
+# The Zobrist hashes of a board under each of the 8 symmetries, kept up to
+# date as stones come and go: hashes[s] is the hash (as Board.hash) of the
+# board transformed by Symmetry s. Each stone placed or removed costs 8
+# XORs instead of transforming and rehashing whole boards.
+class _SymmetryHashes:
+    __slots__ = ("keys", "white_to_play", "hashes")
+
+    def __init__(self, size: int):
+        self.keys = _symmetry_table(size)
+        self.white_to_play = _zobrist_table(size).white_to_play
+        self.hashes = [0] * len(Symmetry)
+
+    # Adds or removes a stone of the given color at the flat index p.
+    def toggle(self, p: int, color: int):
+        hashes = self.hashes
+        for symmetry, keys in enumerate(self.keys):
+            hashes[symmetry] ^= keys[p][color]
+
+    # The least hash (as Game.get_hash) of the board under any symmetry with
+    # the given player to move, and the symmetry giving it.
+    def canonical(self, to_play: int) -> (int, Symmetry):
+        turn_key = self.white_to_play if to_play == Stone.WHITE else 0
+        key, symmetry = min((board_hash ^ turn_key, symmetry) for symmetry, board_hash in enumerate(self.hashes))
+        return key, Symmetry(symmetry)
+
+# Zobrist keys by symmetry: keys[s][p] are the stone keys of the point p is
+# taken to by Symmetry s.
+def _symmetry_table(size: int) -> list:
+    if size not in _symmetry_tables:
+        layout = _layout(size)
+        stones = _zobrist_table(size).stones
+        table = []
+        for symmetry in Symmetry:
+            keys = [None] * len(stones)
+            for p in layout.points:
+                x, y = transform_point(*layout.coords[p], size, symmetry)
+                keys[p] = stones[(x + 1) * layout.stride + y + 1]
+            table.append(keys)
+        _symmetry_tables[size] = table
+    return _symmetry_tables[size]
+
+# Returns the point x, y is taken to on a board of the given size by
+# symmetry.
+def transform_point(x: int, y: int, size: int, symmetry: Symmetry) -> (int, int):
+    if symmetry & 4:
+        x, y = y, x
+    for _ in range(symmetry & 3):
+        x, y = y, size - 1 - x
+    return x, y
+
+# Gets the legality of every point for the player to move in a board state
+# encoding, as bytes of MoveStatus values with x, y at index x * size + y.
+# Ko is judged against prior_state, the encoding of the position before the
+# opponent's last move, if given. Either encoding format is accepted.
+def legal_moves(board_state: str | bytes, prior_state: str | bytes | None = None) -> bytes:
+    _, to_play, board = decode_board(board_state)
+    board = Board.from_lists(board)
+    prior_hash = None
+    if prior_state is not None:
+        prior_hash = Board.from_lists(decode_board(prior_state)[2]).hash
+    return _legal_moves(board, to_play, lambda new_hash: new_hash == prior_hash, False)
+
+# Computes the MoveStatus of every point for a stone of the given color.
+# is_repeat(new_hash) says whether a move producing that board hash is
+# forbidden by ko; only capturing moves are checked unless check_all is set,
+# as under simple ko nothing else can repeat a position.
+def _legal_moves(board: Board, color: int, is_repeat, check_all: bool) -> bytes:
+    cells = board.cells
+    chains = board.chains
+    neighbors = board.layout.neighbors
+    mask = bytearray(board.size * board.size)
+
+    for i, p in enumerate(board.layout.points):
+        if cells[p] != EMPTY:
+            mask[i] = MoveStatus.OCCUPIED
+            continue
+        has_liberty = False
+        captured = None
+        for neighbor in neighbors[p]:
+            cell = cells[neighbor]
+            if cell == EMPTY:
+                has_liberty = True
+            elif cell == BORDER:
+                continue
+            elif cell == color:
+                if len(chains[neighbor].liberties) > 1:
+                    has_liberty = True
+            elif len(chains[neighbor].liberties) == 1:
+                if captured is None:
+                    captured = []
+                if chains[neighbor] not in captured:
+                    captured.append(chains[neighbor])
+
+        if captured is None:
+            if not has_liberty:
+                mask[i] = MoveStatus.SUICIDE
+            elif check_all and is_repeat(board.hash ^ board.zobrist.stones[p][color]):
+                mask[i] = MoveStatus.KO
+        elif is_repeat(board.hash_after(p, color, captured)):
+            mask[i] = MoveStatus.KO
+    return bytes(mask)
+
+# Returns whether x, y are within the bounds of the board.
+def _in_bounds(board: Board, x: int, y: int) -> bool:
+    return x >= 0 and x < board.size and y >= 0 and y < board.size
+
+# Removes the group containing the stone at p and returns the number of
+# stones that were in the group.
+def _remove_group(board: Board, p: int) -> int:
+    cells = board.cells
+    chains = board.chains
+    chain = chains[p]
+    stones = board.zobrist.stones
+
+    for stone in chain.stones:
+        cells[stone] = EMPTY
+        chains[stone] = None
+        board.hash ^= stones[stone][chain.color]
+    # Every removed stone becomes a liberty of the chains bordering it
+    for stone in chain.stones:
+        for neighbor in board.layout.neighbors[stone]:
+            neighbor_chain = chains[neighbor]
+            if neighbor_chain is not None:
+                neighbor_chain.liberties.add(stone)
+
+    return len(chain.stones)
+
+# Flood fills the connected region of points sharing the cell value at p.
+# Returns the points in the region and the set of on-board points bordering it.
+def _flood(board: Board, p: int) -> (list, set):
+    cells = board.cells
+    neighbors = board.layout.neighbors
+    value = cells[p]
+
+    region = [p]
+    in_region = {p}
+    bordering = set()
+    i = 0
+    while i < len(region):
+        for neighbor in neighbors[region[i]]:
+            cell = cells[neighbor]
+            if cell == value:
+                if neighbor not in in_region:
+                    in_region.add(neighbor)
+                    region.append(neighbor)
+            elif cell != BORDER:
+                bordering.add(neighbor)
+        i += 1
+    return region, bordering
+
+# Encodes a board state into a board state encoding.
+# The board may be a Board, another backend with to_lists (see Backend), or
+# a list of lists of None / Stone values.
+def board_to_string(size: int, to_play: Stone, board):
+    if isinstance(board, Board):
+        if size != board.size:
+            raise ValueError("size does not match board shape")
+        # Stone.BLACK -> 1, Stone.WHITE -> 2, EMPTY -> 0
+        digits = [(1, 2, 0)[board.cells[p]] for p in board.layout.points]
+    else:
+        if not isinstance(board, list):
+            board = board.to_lists()
+        if size != len(board) or size != len(board[0]):
+            raise ValueError("size does not match board shape")
+        digits = [0 if board[x][y] is None else (1 if board[x][y] == Stone.BLACK else 2)
+                  for x in range(size) for y in range(size)]
     
     encoding = str(size)
     encoding += "b" if to_play == Stone.BLACK else "w"
 
     board_enc = 0
-    for x in range(size):
-        for y in range(size):
-            board_enc *= 3
-            board_enc += 0 if board[x][y] is None else (1 if board[x][y] == Stone.BLACK else 2)
+    for digit in digits:
+        board_enc *= 3
+        board_enc += digit
     encoding += format(board_enc, 'x')
 
     return encoding
@@ -298,4 +1104,110 @@ def string_to_board(encoding: str):
             board[x][y] = None if board_enc % 3 == 0 else (int(Stone.BLACK) if board_enc % 3 == 1 else int(Stone.WHITE))
             board_enc //= 3
 
-    return size, to_play, board
\ No newline at end of file
+    return size, to_play, board
+
+# Packed board state encoding: a byte for the size, a byte for the player to
+# move, then 2 bits per point in the same x-major order and with the same
+# point values as board_to_string (0 empty, 1 Black, 2 White). Point i is
+# stored in bits 2 * (i % 4) of byte i // 4 of the points.
+PACKED_HEADER_SIZE = 2
+
+# The 4 decoded point values held by each possible packed byte.
+_UNPACKED = [tuple((None, int(Stone.BLACK), int(Stone.WHITE), None)[(byte >> shift) & 3] for shift in (0, 2, 4, 6))
+             for byte in range(256)]
+
+# Encodes a board state into a packed board state encoding.
+# The board may be anything board_to_string accepts.
+def board_to_bytes(size: int, to_play: Stone, board) -> bytes:
+    if not isinstance(board, list):
+        board = board.to_lists()
+    if size != len(board) or size != len(board[0]):
+        raise ValueError("size does not match board shape")
+    encoder = BoardEncoder(size, to_play)
+    for x in range(size):
+        for y in range(size):
+            if board[x][y] is not None:
+                encoder.set_point(x, y, board[x][y])
+    return encoder.to_bytes()
+
+# Decodes a packed board state encoding into a board state, reading the
+# points straight out of the given buffer.
+def bytes_to_board(encoding: bytes) -> (int, int, list):
+    view = memoryview(encoding)
+    size = view[0]
+    to_play = int(Stone.BLACK) if view[1] == Stone.BLACK else int(Stone.WHITE)
+
+    points = []
+    for byte in view[PACKED_HEADER_SIZE:]:
+        points.extend(_UNPACKED[byte])
+    board = [points[x * size:(x + 1) * size] for x in range(size)]
+
+    return size, to_play, board
+
+# Decodes a board state encoding of either format into a board state.
+def decode_board(encoding: str | bytes) -> (int, int, list):
+    if isinstance(encoding, (bytes, bytearray, memoryview)):
+        return bytes_to_board(encoding)
+    return string_to_board(encoding)
+
+# Compares two packed board state encodings of the same size point by point.
+# Returns the x, y and new value (None or a Stone) of every point that
+# differs. The points are compared as one big integer, so only the points
+# that changed are visited.
+def diff_boards(old: bytes, new: bytes) -> list:
+    size = new[0]
+    if old[0] != size:
+        raise ValueError("board sizes differ")
+    changed = (int.from_bytes(old[PACKED_HEADER_SIZE:], "little")
+               ^ int.from_bytes(new[PACKED_HEADER_SIZE:], "little"))
+    points = []
+    while changed:
+        # Point i is held by bits 2 * i and 2 * i + 1
+        i = ((changed & -changed).bit_length() - 1) >> 1
+        changed &= ~(3 << (2 * i))
+        value = (new[PACKED_HEADER_SIZE + (i >> 2)] >> (2 * (i & 3))) & 3
+        points.append((i // size, i % size, _UNPACKED[value][0]))
+    return points
+
+# Gets the symmetry-canonical hash of a board state encoding, as
+# Game.get_canonical_hash, from scratch: cheap for boards with few stones.
+def canonical_hash(board_state: str | bytes) -> (int, Symmetry):
+    if isinstance(board_state, str):
+        board_state = board_to_bytes(*string_to_board(board_state))
+    size, to_play = board_state[0], board_state[1]
+    stride = size + 2
+    hashes = _SymmetryHashes(size)
+    for byte in range(PACKED_HEADER_SIZE, len(board_state)):
+        if board_state[byte] == 0:
+            continue
+        for j, color in enumerate(_UNPACKED[board_state[byte]]):
+            if color is not None:
+                x, y = divmod((byte - PACKED_HEADER_SIZE) * 4 + j, size)
+                hashes.toggle((x + 1) * stride + y + 1, color)
+    return hashes.canonical(to_play)
+
+# Builds a packed board state encoding one point at a time, so that an
+# encoding kept alongside a changing board only needs its changed points
+# rewritten.
+class BoardEncoder:
+    __slots__ = ("size", "data")
+
+    def __init__(self, size: int, to_play: Stone = Stone.BLACK):
+        self.size = size
+        self.data = bytearray(PACKED_HEADER_SIZE + (size * size + 3) // 4)
+        self.data[0] = size
+        self.data[1] = to_play
+
+    def set_turn(self, to_play: Stone):
+        self.data[1] = to_play
+
+    # Sets the point x, y to a stone of the given color, or empty for None.
+    def set_point(self, x: int, y: int, color: int | None):
+        i = x * self.size + y
+        shift = 2 * (i & 3)
+        value = 0 if color is None else color + 1
+        byte = PACKED_HEADER_SIZE + (i >> 2)
+        self.data[byte] = (self.data[byte] & ~(3 << shift)) | (value << shift)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.data)
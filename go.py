@@ -3,34 +3,122 @@
 # Program entry point for Go game.
 # Author: Porter Zach
 
+import os
+import socket
 import game
 import interface.graphics as graphics
 from interface.popups import *
+from players.player import BoardFormat, PlayerType, PASS
+from players.mcts_player import MCTSPlayer
+from players.book_player import BookPlayer
+from players.random_player import fallback_move
+from players.remote_player import RemotePlayer
+from network import BackgroundClient
+
+# Seconds the built-in AI player thinks per move.
+AI_MOVE_SECONDS = 2.0
+# Opening book the built-in AI player plays from while it can, if present
+# (see opening_book.py).
+OPENING_BOOK_PATH = "book.bin"
 
 class Go:
     def __init__(self):
         params = get_game_params()
+        size = params.size
+
+        # The opponent of an online game, or None for a local game
+        self.remote = None
+        # The Player of each color, or None for a human at this computer
+        if params.player1 & (PlayerType.SERVER | PlayerType.CLIENT):
+            self.remote, color, size = connect_online(params)
+            self.players = [None, None]
+            self.players[color] = make_player(params.player1)
+            self.players[1 - color] = self.remote
+        else:
+            self.players = [make_player(params.player1), make_player(params.player2)]
         
-        self.model = game.Game(self, params.size)
-        self.view = graphics.Graphics(self, params.size)
-        self.view.start()
+        self.model = game.Game(self, size)
+        self.view = graphics.Graphics(self, size)
+        try:
+            self.view.start()
+        finally:
+            if self.remote is not None:
+                self.remote.close()
 
     def try_place(self, x: int, y: int) -> bool:
-        return self.model.try_place(x, y)
+        turn = self.model.get_turn()
+        if not self.model.try_place(x, y):
+            return False
+        self.forward(turn, (x, y))
+        return True
     def get_turn(self) -> int:
         return self.model.get_turn()
-    def get_board(self) -> str:
-        return self.model.get_board()
+    def get_board(self, board_format: BoardFormat = BoardFormat.PACKED) -> str | bytes:
+        return self.model.get_board(board_format)
+    def get_prior_state(self, board_format: BoardFormat = BoardFormat.PACKED) -> str | bytes | None:
+        return self.model.get_prior_state(board_format)
+    def fallback_move(self) -> tuple | str:
+        return fallback_move(self.model)
+    def live_score(self) -> (int, int, int):
+        return self.model.live_score()
+    def get_captures(self) -> (int, int):
+        return self.model.get_captures()
+    def legal_moves(self) -> bytes:
+        return self.model.legal_moves()
+    def get_player(self, color: int):
+        return self.players[color]
     def pass_turn(self):
-        if self.model.pass_turn():
+        turn = self.model.get_turn()
+        ended = self.model.pass_turn()
+        self.forward(turn, PASS)
+        if ended:
             self.end_game()
     def just_passed(self):
         return self.model.just_passed()
+    def get_num_states(self) -> int:
+        return self.model.get_num_states()
+    def get_state(self, n: int) -> bytes:
+        return self.model.get_state(n)
+
+    # Sends a move made by the player of color to the online opponent, unless
+    # it is the opponent's own move coming back from the server.
+    def forward(self, color: int, move: tuple | str):
+        if self.remote is not None and self.players[color] is not self.remote:
+            self.remote.send(move)
 
     def end_game(self):
         self.view.freeze()
         end_game_popup(self.model.score())
         self.view.destroy()
 
+# Creates the Player for a player type at this computer, or returns None for
+# a human. The opponent of an online game (PlayerType.UNK) also gives None;
+# see connect_online.
+def make_player(player_type: PlayerType | None):
+    if player_type is not None and player_type & PlayerType.AI:
+        player = MCTSPlayer(playouts=10**9, seconds=AI_MOVE_SECONDS)
+        if os.path.exists(OPENING_BOOK_PATH):
+            return BookPlayer(player, OPENING_BOOK_PATH)
+        return player
+    return None
+
+# Hosts an online game and waits for the opponent to join, or asks for the
+# address of a host and joins its game. The host plays Black and picks the
+# board size.
+# Returns the RemotePlayer standing in for the opponent, the color played
+# at this computer and the board size.
+def connect_online(params: game.GameParams) -> (RemotePlayer, int, int):
+    connection = BackgroundClient()
+    if params.player1 & PlayerType.SERVER:
+        port = connection.host()
+        address = "127.0.0.1"
+        text = f"Waiting for an opponent to join\n{socket.gethostbyname(socket.gethostname())}:{port}"
+    else:
+        address = get_host_address()
+        text = f"Joining the game at {address}..."
+    color = connection.connect(address, size=params.size)
+    wait_popup(text, color)
+    return RemotePlayer(connection), color.result(), connection.client.size
+
 if __name__ == "__main__":
     Go()
\ No newline at end of file
@@ -0,0 +1,151 @@
+# history.py
+# ----------------
+# Compact record of the moves of a Go game with random access to positions.
+# Author: Porter Zach
+
+from array import array
+from game import Stone, BoardEncoder
+
+# Stored in place of a point for a pass.
+PASS = 0xFFFF
+
+# Records a game as a list of actions (moves and passes) and the stones each
+# move captured, plus a packed keyframe of the position every
+# keyframe_interval actions. Any position can then be rebuilt from the
+# nearest earlier keyframe by replaying at most keyframe_interval deltas.
+# ---
+# Position n is the position after the first n actions; position 0 is the
+# empty board with Black to play. Each action is stored with the color that
+# made it, which sets the player to move after it.
+class GameHistory:
+    def __init__(self, size: int, keyframe_interval: int = 32):
+        self.size = size
+        self.keyframe_interval = keyframe_interval
+
+        # Point (x * size + y) of each action, or PASS
+        self._points = array("H")
+        # Stone color of the player making each action
+        self._colors = array("B")
+        # Points captured by each action, concatenated, and the end offset of
+        # each action's captures in _captures
+        self._captures = array("H")
+        self._capture_ends = array("I")
+
+        # The latest position, kept up to date delta by delta
+        self._current = BoardEncoder(size)
+        self._keyframes = [self._current.to_bytes()]
+
+    # The number of positions recorded, i.e. the number of actions plus one.
+    def __len__(self) -> int:
+        return len(self._points) + 1
+
+    # Records a stone of the given color placed at x, y, along with the
+    # x, y coordinates of the stones it captured.
+    def record_move(self, x: int, y: int, captured: list, color: int):
+        self._points.append(x * self.size + y)
+        self._colors.append(color)
+        for cx, cy in captured:
+            self._captures.append(cx * self.size + cy)
+        self._capture_ends.append(len(self._captures))
+        self._apply(self._current, len(self._points) - 1)
+        self._add_keyframe()
+
+    # Records a pass by the player of the given color.
+    def record_pass(self, color: int):
+        self._points.append(PASS)
+        self._colors.append(color)
+        self._capture_ends.append(len(self._captures))
+        self._apply(self._current, len(self._points) - 1)
+        self._add_keyframe()
+
+    # Forgets the last action recorded.
+    def pop(self):
+        if len(self._points) == 0:
+            raise IndexError("pop from empty history")
+        if len(self._points) % self.keyframe_interval == 0:
+            self._keyframes.pop()
+        i = len(self._points) - 1
+        self._revert(self._current, i)
+        del self._captures[self._capture_start(i):]
+        self._points.pop()
+        self._colors.pop()
+        self._capture_ends.pop()
+
+    # The packed encoding (see game.board_to_bytes) of position n.
+    # Negative n counts back from the latest position.
+    def position(self, n: int) -> bytes:
+        if n < 0:
+            n += len(self)
+        if n < 0 or n >= len(self):
+            raise IndexError("position out of range")
+        if n == len(self._points):
+            return self._current.to_bytes()
+
+        keyframe = n // self.keyframe_interval
+        encoder = BoardEncoder(self.size)
+        encoder.data[:] = self._keyframes[keyframe]
+        for i in range(keyframe * self.keyframe_interval, n):
+            self._apply(encoder, i)
+        return encoder.to_bytes()
+
+    # The packed encodings of every position in order, rebuilt with one
+    # delta each.
+    def positions(self) -> list:
+        encoder = BoardEncoder(self.size)
+        positions = [encoder.to_bytes()]
+        for i in range(len(self._points)):
+            self._apply(encoder, i)
+            positions.append(encoder.to_bytes())
+        return positions
+
+    # The x, y coordinates of action i, or None for a pass.
+    def move(self, i: int) -> tuple | None:
+        point = self._points[i]
+        if point == PASS:
+            return None
+        return divmod(point, self.size)
+
+    # The color of the player that made action i.
+    def color(self, i: int) -> Stone:
+        return Stone(self._colors[i])
+
+    # The x, y coordinates of the stones captured by action i.
+    def captured(self, i: int) -> list:
+        return [divmod(point, self.size) for point in self._captures[self._capture_start(i):self._capture_ends[i]]]
+
+    # Approximate number of bytes used to store the history.
+    def nbytes(self) -> int:
+        return (self._points.itemsize * len(self._points)
+                + self._colors.itemsize * len(self._colors)
+                + self._captures.itemsize * len(self._captures)
+                + self._capture_ends.itemsize * len(self._capture_ends)
+                + sum(len(keyframe) for keyframe in self._keyframes))
+
+    # Applies action i to encoder, which must hold position i.
+    def _apply(self, encoder: BoardEncoder, i: int):
+        color = self._colors[i]
+        point = self._points[i]
+        if point != PASS:
+            encoder.set_point(*divmod(point, self.size), color)
+            for captured in self._captures[self._capture_start(i):self._capture_ends[i]]:
+                encoder.set_point(*divmod(captured, self.size), None)
+        encoder.set_turn(1 - color)
+
+    # Takes action i back from encoder, which must hold position i + 1.
+    def _revert(self, encoder: BoardEncoder, i: int):
+        color = self._colors[i]
+        point = self._points[i]
+        if point != PASS:
+            encoder.set_point(*divmod(point, self.size), None)
+            for captured in self._captures[self._capture_start(i):self._capture_ends[i]]:
+                encoder.set_point(*divmod(captured, self.size), 1 - color)
+        encoder.set_turn(color)
+
+    # The start offset of action i's captures in _captures.
+    def _capture_start(self, i: int) -> int:
+        return self._capture_ends[i - 1] if i > 0 else 0
+
+    # Saves a keyframe if the latest position falls on the interval.
+    def _add_keyframe(self):
+        if len(self._points) % self.keyframe_interval == 0:
+            self._keyframes.append(self._current.to_bytes())
@@ -0,0 +1,136 @@
+# instrumentation.py
+# ----------------
+# Opt-in profiling counters and timers for the Go game engine.
+# Author: Porter Zach
+
+import sys
+import json
+import time
+import functools
+import game
+
+# Module-level helpers of game timed while instrumentation is on.
+_FUNCTIONS = ("_legal_moves", "_remove_group", "_flood", "board_to_string", "string_to_board", "board_to_bytes",
+              "bytes_to_board")
+
+# Methods timed while instrumentation is on, by class.
+_METHODS = {
+    game.Game: ("try_place", "play", "can_place", "undo", "legal_moves", "score", "live_score",
+                "pass_turn", "get_board"),
+    game.Board: ("place", "unplace", "check", "legal_moves", "area_scores", "copy"),
+    game._Regions: ("add_stone", "remove_stone", "_splits", "_label"),
+}
+
+# Counts taken from the results of some calls: points visited by the flood
+# fills (the area scoring fill and the searches keeping the empty regions),
+# and board copies, counted once at the board classes' copy.
+def _count_flood(result):
+    _counters["bfs_nodes"] += len(result[0])
+
+def _count_split_search(result):
+    _counters["bfs_nodes"] += result[1]
+
+def _count_label(result):
+    _counters["bfs_nodes"] += result
+
+def _count_copy(result):
+    _counters["board_copies"] += 1
+
+_COUNTERS = {
+    "_flood": _count_flood,
+    "_Regions._splits": _count_split_search,
+    "_Regions._label": _count_label,
+    "Board.copy": _count_copy,
+    "BitBoard.copy": _count_copy,
+}
+
+# Calls and cumulative wall time (including nested calls) by name
+_calls = {}
+_seconds = {}
+_counters = {"bfs_nodes": 0, "board_copies": 0}
+
+# (owner, attribute, original) of every function replaced while on
+_originals = []
+_dump_interval = None
+_dump_stream = None
+_last_dump = 0.0
+
+# Turns instrumentation on by replacing the engine's functions and methods
+# with timed wrappers, and off again with disable, which puts the originals
+# back. While it is off the engine runs its own code, so it costs nothing.
+# ---
+# If dump_interval is set, stats are written to stream as a JSON line at
+# most that many seconds apart, as instrumented calls are made. Calls made
+# through names imported from game before enabling are not seen.
+def enable(dump_interval: float | None = None, stream=sys.stderr):
+    global _dump_interval, _dump_stream, _last_dump
+    _dump_interval = dump_interval
+    _dump_stream = stream
+    _last_dump = time.perf_counter()
+    if _originals:
+        return
+
+    for name in _FUNCTIONS:
+        _replace(game, name, name)
+    methods = dict(_METHODS)
+    try:
+        from bitboard import BitBoard
+        methods[BitBoard] = ("place", "unplace", "check", "legal_moves", "area_scores", "copy")
+    except ImportError:
+        pass
+    for cls, names in methods.items():
+        for name in names:
+            _replace(cls, name, f"{cls.__name__}.{name}")
+
+def disable():
+    while _originals:
+        owner, name, original = _originals.pop()
+        setattr(owner, name, original)
+
+def is_enabled() -> bool:
+    return len(_originals) > 0
+
+# Returns the stats gathered since the last reset across the process: calls
+# and seconds by function, BFS nodes visited and board copies made.
+def stats() -> dict:
+    return {
+        "functions": {name: {"calls": _calls[name], "seconds": _seconds[name]}
+                      for name in sorted(_calls, key=_seconds.get, reverse=True)},
+        **_counters,
+    }
+
+def reset():
+    _calls.clear()
+    _seconds.clear()
+    for name in _counters:
+        _counters[name] = 0
+
+# Writes the stats to stream as one JSON line.
+def dump(stream=sys.stderr):
+    stream.write(json.dumps({"time": time.time(), **stats()}) + "\n")
+    stream.flush()
+
+def _replace(owner, name: str, label: str):
+    original = getattr(owner, name)
+    _originals.append((owner, name, original))
+    setattr(owner, name, _wrap(original, label, _COUNTERS.get(label)))
+
+def _wrap(func, label: str, count):
+    _calls.setdefault(label, 0)
+    _seconds.setdefault(label, 0.0)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        global _last_dump
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        end = time.perf_counter()
+        _calls[label] = _calls.get(label, 0) + 1
+        _seconds[label] = _seconds.get(label, 0.0) + end - start
+        if count is not None:
+            count(result)
+        if _dump_interval is not None and end - _last_dump >= _dump_interval:
+            _last_dump = end
+            dump(_dump_stream)
+        return result
+    return wrapper
@@ -5,8 +5,10 @@
 
 from .graphics_utils import *
 from .graphics_constants import *
+from .scheduler import MoveScheduler
 from tkinter import Event
-from game import string_to_board
+from game import MoveStatus, BoardEncoder, decode_board, board_to_bytes, diff_boards
+from players.player import PASS, RESIGN
 
 class Graphics(Clickable):
     def __init__(self, controller, board_size: int):
@@ -18,19 +20,46 @@ class Graphics(Clickable):
         self.board_size = board_size
 
         self.turn_text = tk.StringVar(value="Black's turn.")
+        self.score_text = tk.StringVar(value="")
+        self.show_illegal = tk.BooleanVar(value=False)
 
         self.draw_board()
         self.make_buttons()
 
-        self.drawn_stones = []
+        # Canvas item of the stone drawn at each point (x * size + y), or None,
+        # and the packed encoding of the position drawn
+        self.stone_items = [None] * (board_size * board_size)
+        self.drawn_board = BoardEncoder(board_size).to_bytes()
 
         self.turn = self.controller.get_turn()
 
-        # Guide outlines on hover
-        self.motion_ids = []
+        # Guide outline on hover, moved around rather than redrawn, and the
+        # last pointer position over the canvas (or None) for it to follow.
+        # Motion events are coalesced: the outline is updated once per idle
+        # period however many events arrived.
+        self.hover_id = draw_circle_outline(0, 0, STONE_RADIUS, STONE_HOVER_THICKNESS, STONE_COLORS[0])
+        set_visible(self.hover_id, False)
+        self.pointer = None
+        self.hover_pending = False
+
+        # Legality of each point in the current position, cached until the
+        # game's number of states changes, and the marks drawn on illegal
+        # empty points when show_illegal is set
+        self.legal_mask = None
+        self.legal_mask_key = None
+        self.illegal_ids = []
+
+        # Position number being viewed with the history buttons, or None
+        # when showing the current position
+        self.viewing = None
 
         self.frozen = False
 
+        # Computes AI players' moves off the main loop
+        self.scheduler = MoveScheduler()
+        set_close_handler(self.destroy)
+        self.request_move()
+
     def draw_board(self):
         board_width_pixels = GRID_UNIT_SIZE * (self.board_size - 2) + GRID_BOX_SIZE
         board_height_pixels = GRID_UNIT_SIZE * (self.board_size - 2) + GRID_BOX_SIZE
@@ -72,6 +101,12 @@ class Graphics(Clickable):
         turn_label = ttk.Label(frame, textvariable=self.turn_text, font=("Arial", 12), background=SIDEBAR_COLOR)
         turn_label.place(x=self.window_width+TURN_LABEL_X, y=TURN_LABEL_Y)
 
+        score_label = ttk.Label(frame, textvariable=self.score_text, font=("Arial", 10), background=SIDEBAR_COLOR)
+        score_label.place(x=self.window_width+SCORE_LABEL_X, y=SCORE_LABEL_Y)
+
+        illegal = ttk.Checkbutton(frame, text="Show illegal points", variable=self.show_illegal, command=self.update_overlays)
+        illegal.place(x=self.window_width+ILLEGAL_TOGGLE_X, y=ILLEGAL_TOGGLE_Y)
+
         passb = ttk.Button(frame, text="Pass", command=self.pass_turn)
         passb.place(x=self.window_width+PASS_BUTTON_X, y=PASS_BUTTON_Y)
         resign = ttk.Button(frame, text="Resign", command=self.request_resign)
@@ -87,42 +122,141 @@ class Graphics(Clickable):
         fb.place(x=self.window_width+FB_BUTTON_X, y=self.window_height+FB_BUTTON_Y)
 
     def pass_turn(self):
+        if not self.human_turn():
+            return
+        self.play_pass()
+
+    def play_pass(self):
+        self.viewing = None
         self.controller.pass_turn()
         self.redraw_board(self.controller.get_board())
+        self.request_move()
 
     def request_resign(self):
         # TODO: Ask go.py to present user with "Are you sure you want to resign?"
-        destroy_window()
+        self.destroy()
+
+    # Whether the player to move is a human using this window.
+    def human_turn(self) -> bool:
+        return self.controller.get_player(self.controller.get_turn()) is None
 
+    # Starts computing the move of the player to move in the background if
+    # it is an AI. receive_move plays it once it is ready.
+    def request_move(self):
+        if self.frozen:
+            return
+        player = self.controller.get_player(self.controller.get_turn())
+        if player is None:
+            return
+        self.scheduler.request(player, self.controller.get_board(player.board_format), self.receive_move,
+                               self.controller.get_prior_state(player.board_format))
+        if self.viewing is None:
+            self.redraw_board(self.controller.get_board())
+
+    # Plays a move computed by request_move. A move the game rejects is
+    # replaced with a random legal move (see random_player.fallback_move)
+    # rather than a pass that could end the game.
+    def receive_move(self, move: tuple | str):
+        if self.frozen:
+            return
+        if move == RESIGN:
+            self.request_resign()
+            return
+        if move != PASS and not self.controller.try_place(*move):
+            move = self.controller.fallback_move()
+            if move != PASS and not self.controller.try_place(*move):
+                move = PASS
+        if move == PASS:
+            self.play_pass()
+        else:
+            self.viewing = None
+            self.redraw_board(self.controller.get_board())
+            self.request_move()
+
+    # Step through the game's history: one position forward (delta 1) or
+    # back (delta -1), or with skip all the way to the latest or first one.
     def state_change(self, delta, skip=False):
-        print(delta, skip)
+        latest = self.controller.get_num_states() - 1
+        current = latest if self.viewing is None else self.viewing
+        if skip:
+            target = latest if delta > 0 else 0
+        else:
+            target = min(max(current + delta, 0), latest)
+
+        if target == latest:
+            self.viewing = None
+            self.redraw_board(self.controller.get_board())
+        else:
+            self.viewing = target
+            self.redraw_board(self.controller.get_state(target))
+            self.turn_text.set(f"Viewing move {target} of {latest}.")
 
     # Attempt to add a stone to the board.
     def add_stone(self, x: int, y: int):
+        # Stones can only be added to the current position, on a human's turn
+        if self.viewing is not None or not self.human_turn():
+            return
         if self.controller.try_place(x, y):
             self.redraw_board(self.controller.get_board())
+            self.request_move()
     
-    # Redraw the board as the new state
-    def redraw_board(self, board_enc: str):
-        for stone in self.drawn_stones:
-            delete(stone)
-        self.drawn_stones.clear()
-
-        size, self.turn, board = string_to_board(board_enc)
+    # Redraw the board as the new state. Only the points that differ from the
+    # position drawn last are redrawn.
+    def redraw_board(self, board_enc: str | bytes):
+        if isinstance(board_enc, str):
+            board_enc = board_to_bytes(*decode_board(board_enc))
+        self.turn = board_enc[1]
         color_text = "Black" if self.turn == 0 else "White"
-        color_text += "'s turn."
+        color_text += " is thinking..." if self.scheduler.busy() else "'s turn."
         if self.controller.just_passed():
             color_text += "\nOpponent passed."
         self.turn_text.set(color_text)
 
-        for x in range(size):
-            for y in range(size):
-                color = board[x][y]
-                if color is not None:
+        # The score and captures of the game so far, wherever the history
+        # buttons are
+        _, black, white = self.controller.live_score()
+        black_captures, white_captures = self.controller.get_captures()
+        self.score_text.set(f"Score  B {black:g}  W {white:g}\nCaptures  B {black_captures}  W {white_captures}")
+
+        for x, y, color in diff_boards(self.drawn_board, board_enc):
+            i = x * self.board_size + y
+            if self.stone_items[i] is not None:
+                delete(self.stone_items[i])
+                self.stone_items[i] = None
+            if color is not None:
+                pix_x = GRID_OFFSET_X + x * GRID_UNIT_SIZE
+                pix_y = GRID_OFFSET_Y + y * GRID_UNIT_SIZE
+                self.stone_items[i] = draw_circle(pix_x, pix_y, STONE_RADIUS, STONE_COLORS[color])
+        self.drawn_board = bytes(board_enc)
+        self.update_overlays()
+
+    # Whether guides for the next move are shown: the live position is on
+    # screen and a human is to move.
+    def can_move(self) -> bool:
+        return not self.frozen and self.viewing is None and self.human_turn()
+
+    # The legality (MoveStatus) of each point for the player to move, as
+    # returned by Game.legal_moves.
+    def legality(self) -> bytes:
+        key = self.controller.get_num_states()
+        if key != self.legal_mask_key:
+            self.legal_mask = self.controller.legal_moves()
+            self.legal_mask_key = key
+        return self.legal_mask
+
+    # Brings the hover outline and illegal point marks up to date.
+    def update_overlays(self):
+        for id in self.illegal_ids:
+            delete(id)
+        self.illegal_ids.clear()
+        if self.show_illegal.get() and self.can_move():
+            for i, status in enumerate(self.legality()):
+                if status == MoveStatus.SUICIDE or status == MoveStatus.KO:
+                    x, y = divmod(i, self.board_size)
                     pix_x = GRID_OFFSET_X + x * GRID_UNIT_SIZE
                     pix_y = GRID_OFFSET_Y + y * GRID_UNIT_SIZE
-                    id = draw_circle(pix_x, pix_y, STONE_RADIUS, STONE_COLORS[color])
-                    self.drawn_stones.append(id)
+                    self.illegal_ids.append(draw_circle(pix_x, pix_y, ILLEGAL_MARK_RADIUS, ILLEGAL_COLOR))
+        self.update_hover()
 
     def left_click(self, event: Event):
         if self.frozen:
@@ -138,34 +272,38 @@ class Graphics(Clickable):
             self.add_stone(*pos)
 
     def motion(self, event: Event):
-        if self.frozen:
-            # Remove previous guide outlines if any exists
-            while len(self.motion_ids) > 0:
-                delete(self.motion_ids.pop())
-            return
-        
         # Only consider motion on the canvas
-        if type(event.widget) is tk.Canvas:
-            # Remove previous guide outlines if any exists
-            while len(self.motion_ids) > 0:
-                delete(self.motion_ids.pop())
-            # Get board position of mouse if it is hovering over the canvas
-            pos = self.board_position(event.x, event.y)
-            if pos is None:
-                return
-            # Draw new guide outline
-            pix_x = GRID_OFFSET_X + pos[0] * GRID_UNIT_SIZE
-            pix_y = GRID_OFFSET_Y + pos[1] * GRID_UNIT_SIZE
-            self.motion_ids.append(draw_circle_outline(pix_x, pix_y, STONE_RADIUS, STONE_HOVER_THICKNESS, STONE_COLORS[self.turn]))
-
-    # Transform pixel coordinates into board coordinates
+        self.pointer = (event.x, event.y) if type(event.widget) is tk.Canvas else None
+        if not self.hover_pending:
+            self.hover_pending = True
+            schedule_idle(self.update_hover)
+
+    # Moves the hover outline to the legal point under the pointer, if any.
+    def update_hover(self):
+        self.hover_pending = False
+        pos = None
+        if self.pointer is not None and self.can_move():
+            pos = self.board_position(*self.pointer)
+        if pos is None or self.legality()[pos[0] * self.board_size + pos[1]] != MoveStatus.LEGAL:
+            set_visible(self.hover_id, False)
+            return
+        pix_x = GRID_OFFSET_X + pos[0] * GRID_UNIT_SIZE
+        pix_y = GRID_OFFSET_Y + pos[1] * GRID_UNIT_SIZE
+        move_circle(self.hover_id, pix_x, pix_y, STONE_RADIUS)
+        set_outline_color(self.hover_id, STONE_COLORS[self.controller.get_turn()])
+        set_visible(self.hover_id, True)
+
+    # Transform pixel coordinates into board coordinates: the nearest
+    # intersection, if the point is within a stone's radius of it
     def board_position(self, pix_x: int, pix_y: int) -> tuple | None:
-        for x in range(self.board_size):
-            c_x = x * GRID_UNIT_SIZE + GRID_OFFSET_X
-            for y in range(self.board_size):
-                c_y = y * GRID_UNIT_SIZE + GRID_OFFSET_Y
-                if (pix_x - c_x)**2 + (pix_y - c_y)**2 <= STONE_RADIUS**2:
-                    return x, y
+        x = round((pix_x - GRID_OFFSET_X) / GRID_UNIT_SIZE)
+        y = round((pix_y - GRID_OFFSET_Y) / GRID_UNIT_SIZE)
+        if not (0 <= x < self.board_size and 0 <= y < self.board_size):
+            return None
+        c_x = x * GRID_UNIT_SIZE + GRID_OFFSET_X
+        c_y = y * GRID_UNIT_SIZE + GRID_OFFSET_Y
+        if (pix_x - c_x)**2 + (pix_y - c_y)**2 <= STONE_RADIUS**2:
+            return x, y
         return None
 
     def right_click(self, event: Event):
@@ -182,8 +320,10 @@ class Graphics(Clickable):
 
     def freeze(self):
         self.frozen = True
+        self.scheduler.cancel()
         for child in get_frame().winfo_children():
             child.config(state='disable')
 
     def destroy(self):
+        self.scheduler.shutdown()
         destroy_window()
\ No newline at end of file
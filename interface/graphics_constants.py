@@ -15,6 +15,7 @@ GRID_UNIT_SIZE = GRID_BOX_SIZE + GRID_LINE_THICKNESS
 STONE_RADIUS = 21
 HINT_RADIUS = 5
 STONE_HOVER_THICKNESS = 1
+ILLEGAL_MARK_RADIUS = 6
 
 BOARD_COLOR = format_color(148, 94, 28)
 BACKGROUND_COLOR = BOARD_COLOR
@@ -28,10 +29,15 @@ SIDEBAR_BORDER_THICKNESS = 2
 WHITE_COLOR = format_color(255, 255, 255)
 BLACK_COLOR = format_color(0, 0, 0)
 STONE_COLORS = [BLACK_COLOR, WHITE_COLOR]
+ILLEGAL_COLOR = format_color(110, 110, 110)
 
 # Game button parameters
 TURN_LABEL_X = -150
 TURN_LABEL_Y = 60
+ILLEGAL_TOGGLE_X = -150
+ILLEGAL_TOGGLE_Y = 120
+SCORE_LABEL_X = -150
+SCORE_LABEL_Y = 150
 PASS_BUTTON_X = -150
 PASS_BUTTON_Y = 20
 RESIGN_BUTTON_X = -150
@@ -90,6 +90,32 @@ def draw_circle_outline(x: int, y: int, r: int, outline_thickness: int, color) -
 def delete(id: int):
     _canvas.delete(id)
 
+# Moves an existing circle item to be centered on x, y with radius r.
+def move_circle(id: int, x: int, y: int, r: int):
+    _canvas.coords(id, x - r, y - r, x + r, y + r)
+
+def set_outline_color(id: int, color):
+    _canvas.itemconfigure(id, outline=color)
+
+def set_visible(id: int, visible: bool):
+    _canvas.itemconfigure(id, state="normal" if visible else "hidden")
+
+# Calls func on the main loop after ms milliseconds.
+# Returns an id for unschedule.
+def schedule(ms: int, func) -> str:
+    return _root.after(ms, func)
+
+def unschedule(id: str):
+    _root.after_cancel(id)
+
+# Calls func on the main loop once pending events have been handled.
+def schedule_idle(func) -> str:
+    return _root.after_idle(func)
+
+# Calls func instead of destroy_window when the window is closed.
+def set_close_handler(func):
+    _root.protocol('WM_DELETE_WINDOW', func)
+
 def get_frame():
     return _frame
 
@@ -103,6 +103,47 @@ def get_game_params():
 
     return GameParams(size, p1, p2)
 
+# Asks for the address of the computer hosting an online game.
+def get_host_address() -> str:
+    root, frame = create_themed_window("Join an online game", width=300, height=120)
+    root.resizable(False, False)
+
+    def quit():
+        root.destroy()
+        sys.exit(0)
+    root.protocol('WM_DELETE_WINDOW', quit)
+
+    ttk.Label(frame, text="Host's IP address:", font=("Arial", 12)).pack(side="top", pady=5)
+    address = tk.StringVar(frame, value="127.0.0.1")
+    ttk.Entry(frame, textvariable=address).pack(side="top", pady=5)
+    ttk.Button(frame, text="Join", command=root.destroy).pack(side="right", padx=50, pady=10)
+    ttk.Button(frame, text="Quit", command=quit).pack(side="left", padx=50, pady=10)
+
+    root.mainloop()
+    return address.get().strip()
+
+# Shows text until future is done, such as an opponent joining an online
+# game. Quits the application if the window is closed first.
+def wait_popup(text: str, future):
+    root, frame = create_themed_window("Go", width=300, height=80)
+    root.resizable(False, False)
+
+    def quit():
+        root.destroy()
+        sys.exit(0)
+    root.protocol('WM_DELETE_WINDOW', quit)
+
+    ttk.Label(frame, text=text, font=("Arial", 12)).pack(side="top", padx=10, pady=20)
+
+    def poll():
+        if future.done():
+            root.destroy()
+        else:
+            root.after(100, poll)
+    root.after(100, poll)
+
+    root.mainloop()
+
 def end_game_popup(final_info: (int, int, int)):
     root, frame = create_themed_window("Game complete", width=250, height=100)
     root.resizable(False, False)
@@ -0,0 +1,65 @@
+# scheduler.py
+# ----------------
+# Runs player move computation in the background for the Go interface.
+# Author: Porter Zach
+
+from concurrent.futures import Executor, ThreadPoolExecutor
+from players.player import ask_move
+from .graphics_utils import schedule, unschedule
+
+# How often to check whether a background move is ready.
+POLL_INTERVAL_MS = 20
+
+# Calls Player.get_move on an executor so the Tk main loop keeps handling
+# events while a player thinks, and hands the move back on the main loop by
+# polling with root.after. One move is computed at a time.
+# ---
+# Defaults to a single worker thread, which lets players keep state between
+# moves (such as a search tree). A ProcessPoolExecutor may be passed instead
+# to keep the GIL free for the interface, but the player is then pickled
+# for every move and changes it makes to itself are lost.
+class MoveScheduler:
+    def __init__(self, executor: Executor | None = None):
+        self._executor = executor if executor is not None else ThreadPoolExecutor(max_workers=1)
+        self._future = None
+        self._callback = None
+        self._poll_id = None
+
+    def busy(self) -> bool:
+        return self._future is not None
+
+    # Starts computing player's move for board_state (with prior_state, for
+    # players that use it; see ask_move). callback is called on the main
+    # loop with the move once it is ready, unless cancelled first.
+    def request(self, player, board_state: str | bytes, callback, prior_state: str | bytes | None = None):
+        self.cancel()
+        self._future = self._executor.submit(ask_move, player, board_state, prior_state)
+        self._callback = callback
+        self._poll_id = schedule(POLL_INTERVAL_MS, self._poll)
+
+    # Drops the pending request, if any. A move already being computed can't
+    # be interrupted; it runs to the end of the player's budget and its
+    # result is discarded.
+    def cancel(self):
+        if self._poll_id is not None:
+            unschedule(self._poll_id)
+            self._poll_id = None
+        if self._future is not None:
+            self._future.cancel()
+            self._future = None
+        self._callback = None
+
+    # Cancels any pending request and stops the executor.
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _poll(self):
+        self._poll_id = None
+        if not self._future.done():
+            self._poll_id = schedule(POLL_INTERVAL_MS, self._poll)
+            return
+        future, callback = self._future, self._callback
+        self._future = self._callback = None
+        # Errors in the player are raised here, on the main loop
+        callback(future.result())
@@ -0,0 +1,471 @@
+# network.py
+# ----------------
+# asyncio game server and client for online Go games.
+# Author: Porter Zach
+
+import time
+import random
+import struct
+import asyncio
+import argparse
+import threading
+from enum import IntEnum
+from concurrent.futures import Future
+from game import Game, Stone, MoveStatus
+from players.player import PASS, RESIGN
+from selfplay import percentile
+
+DEFAULT_PORT = 6464
+
+# Board sizes a session may be opened with.
+SIZES = (9, 13, 19)
+
+# Message types. Every message is one type byte followed by a payload of
+# fixed size for that type (see _PAYLOADS), so no length prefix is needed.
+class Message(IntEnum):
+    # Client: session id, board size. Joins (or opens) a session.
+    JOIN     = 1
+    # Server: color, board size. Both players have joined.
+    START    = 2
+    # Client: x, y. Plays a stone.
+    PLAY     = 3
+    # Server: color, x, y. A stone was played, sent to both players.
+    PLAYED   = 4
+    # Client: no payload.
+    PASS     = 5
+    # Server: color. A player passed, sent to both players.
+    PASSED   = 6
+    # Client: no payload.
+    RESIGN   = 7
+    # Server: reason. The last message was refused.
+    REJECTED = 8
+    # Server: reason, winner, Black's and White's scores in half points.
+    END      = 9
+
+# Why a message was refused.
+class Reject(IntEnum):
+    # The sender isn't the player to move, or the game hasn't started
+    TURN    = 0
+    # The move is not legal
+    ILLEGAL = 1
+    # The session already has two players
+    FULL    = 2
+    # Not a message a client may send
+    INVALID = 3
+
+# Why a game ended.
+class End(IntEnum):
+    PASSES    = 0
+    RESIGN    = 1
+    # The opponent disconnected
+    ABANDONED = 2
+
+_PAYLOADS = {
+    Message.JOIN:     struct.Struct("!IB"),
+    Message.START:    struct.Struct("!BB"),
+    Message.PLAY:     struct.Struct("!BB"),
+    Message.PLAYED:   struct.Struct("!BBB"),
+    Message.PASS:     struct.Struct("!"),
+    Message.PASSED:   struct.Struct("!B"),
+    Message.RESIGN:   struct.Struct("!"),
+    Message.REJECTED: struct.Struct("!B"),
+    Message.END:      struct.Struct("!BBHH"),
+}
+
+# Writes one message. Does not wait for it to be sent.
+def _send(writer: asyncio.StreamWriter, message: Message, *values):
+    writer.write(bytes((message,)) + _PAYLOADS[message].pack(*values))
+
+# Reads one message.
+# Returns its type and payload values.
+async def _receive(reader: asyncio.StreamReader) -> (Message, tuple):
+    message = Message((await reader.readexactly(1))[0])
+    payload = _PAYLOADS[message]
+    return message, payload.unpack(await reader.readexactly(payload.size))
+
+# One game between two connected players. The server's Game is the only
+# authority on what is legal; clients just mirror the moves it accepts.
+class _Session:
+    def __init__(self, session_id: int, size: int):
+        self.session_id = session_id
+        self.size = size
+        self.game = Game(None, size)
+        # The writer of each color's player, indexed by Stone
+        self.writers = [None, None]
+        self.over = False
+
+    def started(self) -> bool:
+        return None not in self.writers
+
+    def broadcast(self, message: Message, *values):
+        for writer in self.writers:
+            if writer is not None:
+                _send(writer, message, *values)
+
+    # Handles a message from the player of color.
+    # Returns True if it ended the game.
+    def handle(self, color: int, message: Message, values: tuple) -> bool:
+        writer = self.writers[color]
+        if message not in (Message.PLAY, Message.PASS, Message.RESIGN):
+            _send(writer, Message.REJECTED, Reject.INVALID)
+            return False
+        if not self.started() or self.over or color != self.game.get_turn():
+            _send(writer, Message.REJECTED, Reject.TURN)
+            return False
+
+        if message == Message.PLAY:
+            if self.game.try_place(*values):
+                self.broadcast(Message.PLAYED, color, *values)
+            else:
+                _send(writer, Message.REJECTED, Reject.ILLEGAL)
+            return False
+        if message == Message.PASS:
+            ended = self.game.pass_turn()
+            self.broadcast(Message.PASSED, color)
+            if ended:
+                self.end(End.PASSES)
+            return ended
+        self.end(End.RESIGN, 1 - color)
+        return True
+
+    # Ends the game and tells both players the result. The winner is decided
+    # by score unless given.
+    def end(self, reason: End, winner: int | None = None):
+        score = self.game.score()
+        if winner is None:
+            winner = score[0]
+        self.over = True
+        self.broadcast(Message.END, reason, winner, int(score[1] * 2), int(score[2] * 2))
+
+# Hosts any number of concurrent sessions. The first player to join a
+# session id opens it with their board size and plays Black; the second
+# plays White. Sessions are dropped when their game ends.
+class GameServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT):
+        self.host = host
+        self.port = port
+        self._sessions = {}
+        self._server = None
+        # The writer of each connected player, by the task handling them
+        self._handlers = {}
+
+    # Starts listening. If port is 0, self.port is set to the port chosen.
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    # Stops listening and disconnects the players still connected.
+    async def close(self):
+        self._server.close()
+        for writer in self._handlers.values():
+            writer.close()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self._server.wait_closed()
+
+    def num_sessions(self) -> int:
+        return len(self._sessions)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = None
+        color = None
+        self._handlers[asyncio.current_task()] = writer
+        try:
+            message, values = await _receive(reader)
+            if message != Message.JOIN or values[1] not in SIZES:
+                _send(writer, Message.REJECTED, Reject.INVALID)
+                return
+            session, color = self._join(*values, writer)
+            if session is None:
+                _send(writer, Message.REJECTED, Reject.FULL)
+                return
+            if session.started():
+                for start_color in (Stone.BLACK, Stone.WHITE):
+                    _send(session.writers[start_color], Message.START, start_color, session.size)
+
+            while True:
+                message, values = await _receive(reader)
+                if session.handle(color, message, values):
+                    self._sessions.pop(session.session_id, None)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            # Disconnected, or sent an unknown message type
+            pass
+        finally:
+            if session is not None:
+                self._leave(session, color)
+            writer.close()
+            self._handlers.pop(asyncio.current_task(), None)
+
+    # Adds a player to a session, opening it if needed.
+    # Returns the session and the player's color, or None, None if it is full.
+    def _join(self, session_id: int, size: int, writer: asyncio.StreamWriter) -> (_Session | None, int | None):
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = _Session(session_id, size)
+            self._sessions[session_id] = session
+        if session.writers[Stone.BLACK] is None:
+            color = Stone.BLACK
+        elif session.writers[Stone.WHITE] is None:
+            color = Stone.WHITE
+        else:
+            return None, None
+        session.writers[color] = writer
+        return session, color
+
+    def _leave(self, session: _Session, color: int):
+        session.writers[color] = None
+        if not session.over:
+            if session.writers[1 - color] is not None:
+                session.end(End.ABANDONED, 1 - color)
+            self._sessions.pop(session.session_id, None)
+
+# The connection of one player to a GameServer. Keeps a Game mirroring the
+# server's from the moves it reports, so the player can look at the board
+# and legal moves without asking the server.
+# ---
+# Turns strictly alternate, so messages are read in order: on the player's
+# turn the next message answers their action; otherwise it is the
+# opponent's action (or the end of the game).
+class GameClient:
+    def __init__(self):
+        self.color = None
+        self.size = None
+        self.game = None
+        # END payload (reason, winner, Black's score, White's score) once the
+        # game is over
+        self.result = None
+        # Seconds from sending each action to the server accepting it
+        self.latencies = []
+        self._reader = None
+        self._writer = None
+
+    # Connects and joins a session, waiting for the opponent to join.
+    # Returns the color this player plays.
+    async def connect(self, host: str, port: int, session_id: int, size: int) -> int:
+        self._reader, self._writer = await asyncio.open_connection(host, port)
+        _send(self._writer, Message.JOIN, session_id, size)
+        message, values = await _receive(self._reader)
+        if message != Message.START:
+            raise ConnectionError(f"could not join session {session_id}: {Reject(values[0]).name}")
+        self.color, self.size = values
+        self.game = Game(None, self.size)
+        return self.color
+
+    def my_turn(self) -> bool:
+        return self.result is None and self.game.get_turn() == self.color
+
+    # Plays a stone at x, y.
+    # Returns True if the server accepted it.
+    async def play(self, x: int, y: int) -> bool:
+        return await self._act(Message.PLAY, x, y)
+
+    # Returns True if the server accepted the pass.
+    async def pass_turn(self) -> bool:
+        return await self._act(Message.PASS)
+
+    async def resign(self):
+        await self._act(Message.RESIGN)
+
+    # Waits for the opponent's action and applies it to the mirrored game.
+    # Returns the message type and payload values.
+    async def wait_for_opponent(self) -> (Message, tuple):
+        return await self._next()
+
+    async def close(self):
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    async def _act(self, message: Message, *values) -> bool:
+        start = time.perf_counter()
+        _send(self._writer, message, *values)
+        await self._writer.drain()
+        reply, _ = await self._next()
+        if reply == Message.REJECTED:
+            return False
+        self.latencies.append(time.perf_counter() - start)
+        return True
+
+    # Reads the next message, keeping the mirrored game and result up to date.
+    async def _next(self) -> (Message, tuple):
+        message, values = await _receive(self._reader)
+        if message == Message.PLAYED:
+            self.game.try_place(values[1], values[2])
+        elif message == Message.PASSED:
+            self.game.pass_turn()
+        elif message == Message.END:
+            self.result = values
+        return message, values
+
+# Runs a GameClient (and optionally the GameServer it plays on) on an event
+# loop in a background thread, for code that is not async such as the Tk
+# interface. Calls return concurrent Futures or block the calling thread.
+# ---
+# The client reads its messages in order, so actions and waits are run one
+# at a time in the order they are made: a wait for the opponent made right
+# after sending a move reads the server's answer to the move first.
+class BackgroundClient:
+    def __init__(self):
+        self.client = GameClient()
+        self.server = None
+        # Error raised by the first action the server rejected, if any
+        self.error = None
+        self._loop = asyncio.new_event_loop()
+        self._lock = asyncio.Lock()
+        # Futures of the waits for the opponent not finished yet
+        self._receiving = set()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="BackgroundClient", daemon=True)
+        self._thread.start()
+
+    # Starts a GameServer for the opponent to join.
+    # Returns the port it listens on.
+    def host(self, host: str = "0.0.0.0", port: int = DEFAULT_PORT) -> int:
+        self.server = GameServer(host, port)
+        self._run(self.server.start()).result()
+        return self.server.port
+
+    # Joins a session (see GameClient.connect). Returns a Future of the color
+    # this player plays, set once the opponent has joined too.
+    def connect(self, host: str, port: int = DEFAULT_PORT, session_id: int = 0, size: int = 9) -> Future:
+        return self._run(self.client.connect(host, port, session_id, size))
+
+    # Sends this player's move: (x, y), PASS or RESIGN. Does not wait for the
+    # server's answer; if it rejects the move, the next receive raises.
+    def send(self, move: tuple | str):
+        if move == PASS:
+            action = self.client.pass_turn()
+        elif move == RESIGN:
+            action = self.client.resign()
+        else:
+            action = self.client.play(*move)
+        self._run(self._checked(action, move))
+
+    # Waits for the opponent's action.
+    # Returns their move (x, y), PASS, or RESIGN if they resigned or left.
+    def receive(self) -> tuple | str:
+        receiving = self._run(self.client.wait_for_opponent())
+        self._receiving.add(receiving)
+        try:
+            message, values = receiving.result()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # The server (or the opponent hosting it) went away
+            return RESIGN
+        finally:
+            self._receiving.discard(receiving)
+        if self.error is not None:
+            raise self.error
+        if message == Message.PLAYED:
+            return values[1], values[2]
+        if message == Message.PASSED:
+            return PASS
+        return RESIGN
+
+    # Stops waiting for the opponent, finishes sending this player's moves,
+    # then disconnects and stops the server if hosting. Leaving before the
+    # game is over loses it (see GameServer).
+    def close(self, timeout: float = 5.0):
+        for future in list(self._receiving):
+            future.cancel()
+        try:
+            self._run(self._close()).result(timeout)
+        except (TimeoutError, ConnectionError):
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    # Schedules coroutine on the loop after everything scheduled before it.
+    def _run(self, coroutine) -> Future:
+        async def run():
+            async with self._lock:
+                return await coroutine
+        return asyncio.run_coroutine_threadsafe(run(), self._loop)
+
+    async def _close(self):
+        if self.client._writer is not None:
+            await self.client.close()
+        if self.server is not None and self.server._server is not None:
+            await self.server.close()
+
+    async def _checked(self, action, move: tuple | str):
+        accepted = await action
+        if accepted is False and self.error is None:
+            self.error = ConnectionError(f"server rejected move {move}")
+
+# Plays one game as a simulated client, choosing random legal moves and
+# passing once it has made max_moves moves or has none left.
+async def _simulated_client(host: str, port: int, session_id: int, size: int, max_moves: int, rng: random.Random):
+    client = GameClient()
+    await client.connect(host, port, session_id, size)
+    moves = 0
+    try:
+        while client.result is None:
+            if not client.my_turn():
+                await client.wait_for_opponent()
+                continue
+            legal = [i for i, status in enumerate(client.game.legal_moves()) if status == MoveStatus.LEGAL]
+            if moves < max_moves and legal:
+                moves += 1
+                await client.play(*divmod(rng.choice(legal), size))
+            else:
+                await client.pass_turn()
+    finally:
+        await client.close()
+    return client.latencies
+
+# Plays games between pairs of simulated clients over localhost, on the
+# server at port or, if port is None, on a server started in this process.
+# Returns every per-action round-trip latency in seconds and the wall-clock
+# seconds taken.
+async def simulate(clients: int = 200, size: int = 9, max_moves: int | None = None,
+                   host: str = "127.0.0.1", port: int | None = None, seed: int = 0) -> (list, float):
+    if max_moves is None:
+        max_moves = size * size
+    server = None
+    if port is None:
+        server = GameServer(host, 0)
+        await server.start()
+        port = server.port
+
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        _simulated_client(host, port, i // 2, size, max_moves, random.Random(rng.getrandbits(32)))
+        for i in range(clients)))
+    seconds = time.perf_counter() - start
+    if server is not None:
+        await server.close()
+    return sorted(latency for latencies in results for latency in latencies), seconds
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host online Go games, or load test a host with simulated clients.")
+    parser.add_argument("mode", choices=("serve", "simulate"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None,
+                        help=f"port to serve on (default: {DEFAULT_PORT}) or to simulate against "
+                             "(default: a server in this process)")
+    parser.add_argument("-n", "--clients", type=int, default=200, help="simulated clients, two per game")
+    parser.add_argument("-s", "--size", type=int, default=9, choices=SIZES)
+    parser.add_argument("--max-moves", type=int, default=None, help="moves per simulated client (default: size^2)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        server = GameServer(args.host, DEFAULT_PORT if args.port is None else args.port)
+        print(f"Serving on {server.host}:{server.port}")
+        asyncio.run(server.serve_forever())
+    else:
+        latencies, seconds = asyncio.run(simulate(args.clients, args.size, args.max_moves,
+                                                  args.host, args.port, args.seed))
+        print(f"{args.clients} clients, {len(latencies)} actions in {seconds:.2f}s "
+              f"({len(latencies) / seconds:.0f} actions/s)")
+        print(f"  round trip (ms): p50 {percentile(latencies, 50) * 1000:.3f}, "
+              f"p90 {percentile(latencies, 90) * 1000:.3f}, p99 {percentile(latencies, 99) * 1000:.3f}, "
+              f"max {(latencies[-1] if latencies else 0.0) * 1000:.3f}")
@@ -0,0 +1,146 @@
+# opening_book.py
+# ----------------
+# On-disk opening book of the moves played from early positions in a
+# collection of Go games.
+# Author: Porter Zach
+
+import random
+import struct
+import argparse
+from collections import Counter, OrderedDict
+from game import Game, KoRule, canonical_hash, transform_point, board_to_bytes, string_to_board
+from sorted_table import HEADER, SortedTable
+from sgf import SGFError, IllegalMoveError, open_collection, iter_game_texts, parse_game, replay, map_batches
+
+MAGIC = b"GOBOOK01"
+# Canonical position hash (Game.get_canonical_hash), move (x * size + y in
+# the canonical orientation), weight. Sorted by hash, then by weight from
+# highest.
+_ENTRY = struct.Struct(">QHI")
+
+# Positions whose moves are kept decoded in each OpeningBook.
+CACHE_SIZE = 4096
+
+# A read-only opening book for one board size: a table of (position, move,
+# weight) entries sorted by position in one file, where a move's weight is
+# the number of games that played it there (see sorted_table.SortedTable).
+# Positions are keyed by their symmetry-canonical hash, so a line of play is
+# found in any of its 8 orientations.
+# ---
+# The moves of the last cache_size positions looked up are kept decoded in
+# a least recently used cache.
+class OpeningBook(SortedTable):
+    def __init__(self, path: str, cache_size: int = CACHE_SIZE):
+        super().__init__(path, MAGIC, _ENTRY, "an opening book")
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+
+    # Finds the book moves for a board state encoding (as given to
+    # Player.get_move). Returns (x, y) moves with their weights, from the
+    # most played, or an empty list if the position is not in the book.
+    def moves(self, board_state: str | bytes) -> list:
+        if isinstance(board_state, str):
+            board_state = board_to_bytes(*string_to_board(board_state))
+        if board_state[0] != self.size:
+            return []
+        key, symmetry = canonical_hash(board_state)
+        entries = self.lookup(key)
+        if not entries:
+            return entries
+        inverse = symmetry.inverse()
+        return [(transform_point(*divmod(move, self.size), self.size, inverse), weight)
+                for move, weight in entries]
+
+    # Chooses a book move for a board state at random, in proportion to the
+    # moves' weights. Returns None if the position is not in the book.
+    def choose(self, board_state: str | bytes, rng: random.Random = random) -> tuple | None:
+        moves = self.moves(board_state)
+        if not moves:
+            return None
+        return rng.choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+    # Finds the book moves for a canonical position hash, in the canonical
+    # orientation. Returns (x * size + y, weight) pairs.
+    def lookup(self, position_hash: int) -> list:
+        entries = self._cache.get(position_hash)
+        if entries is not None:
+            self._cache.move_to_end(position_hash)
+            return entries
+
+        entries = list(self.find(position_hash))
+        self._cache[position_hash] = entries
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return entries
+
+# Builds an opening book from the first max_moves moves of the games of one
+# board size in an SGF collection, replaying each through game.Game. Games
+# are replayed in batches across worker processes (in this process if
+# workers is 0). Moves played fewer than min_count times from a position are
+# left out, as are passes.
+# Returns the number of games used and the number skipped (other sizes,
+# unreadable or with illegal moves).
+def build_book(sgf_path: str, book_path: str, size: int = 19, max_moves: int = 30, min_count: int = 2,
+               workers: int | None = None, batch_size: int = 64, ko_rule: KoRule = KoRule.SIMPLE) -> (int, int):
+    counts = Counter()
+    games = [0, 0]
+
+    def add_batch(result: tuple):
+        used, skipped, batch_counts = result
+        games[0] += used
+        games[1] += skipped
+        counts.update(batch_counts)
+
+    with open_collection(sgf_path) as stream:
+        for result in map_batches(_book_batch, iter_game_texts(stream), batch_size, size, max_moves, ko_rule,
+                                  workers=workers):
+            add_batch(result)
+
+    entries = sorted((position_hash, -weight, move) for (position_hash, move), weight in counts.items()
+                     if weight >= min_count)
+    with open(book_path, "wb") as out:
+        out.write(HEADER.pack(MAGIC, size, len(entries)))
+        for position_hash, weight, move in entries:
+            out.write(_ENTRY.pack(position_hash, move, -weight))
+    return games[0], games[1]
+
+# Replays the opening moves of the game texts of one batch.
+# Returns the number of games used and skipped, and how many times each
+# (canonical position hash, canonical move) was played.
+def _book_batch(texts: list, size: int, max_moves: int, ko_rule: KoRule) -> (int, int, Counter):
+    counts = Counter()
+    used = skipped = 0
+    for text in texts:
+        try:
+            record = parse_game(text)
+            if record.size != size:
+                skipped += 1
+                continue
+            record.moves = record.moves[:max_moves]
+            positions = [Game(None, size).get_canonical_hash()]
+            replay(record, ko_rule, lambda game: positions.append(game.get_canonical_hash()))
+        except (SGFError, IllegalMoveError):
+            skipped += 1
+            continue
+        for (_, point), (position_hash, symmetry) in zip(record.moves, positions):
+            if point is not None:
+                x, y = transform_point(*point, size, symmetry)
+                counts[position_hash, x * size + y] += 1
+        used += 1
+    return used, skipped, counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an opening book from an SGF collection.")
+    parser.add_argument("sgf", help="SGF collection, optionally gzip-compressed (.gz)")
+    parser.add_argument("book", help="book file to write")
+    parser.add_argument("-s", "--size", type=int, default=19)
+    parser.add_argument("-m", "--max-moves", type=int, default=30, help="moves of each game to use")
+    parser.add_argument("-c", "--min-count", type=int, default=2,
+                        help="games that must play a move from a position for it to be kept")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="worker processes (default: one per CPU, 0: replay in this process)")
+    args = parser.parse_args()
+
+    used, skipped = build_book(args.sgf, args.book, args.size, args.max_moves, args.min_count, args.workers)
+    with OpeningBook(args.book) as book:
+        print(f"Built a book of {len(book)} moves from {used} games ({skipped} skipped)")
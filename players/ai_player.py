@@ -1,10 +1,81 @@
 # ai_player.py
 # ----------------͏󠄂͏️͏󠄌͏󠄎͏󠄑͏︇͏󠄇
-# Base class for an AI Go player.
+# Playout-based AI Go player.
 # Author: Porter Zach
 
-from .player import Player
-# from abc import abstractmethod
+import math
+import time
+import random
+from .player import Player, BoardFormat, PASS
+from game import Stone, decode_board
+from playout import PlayoutBoard, DEFAULT_KOMI, find_ko_point
 
+# Exploration constant for choosing which move to run the next playout for.
+UCB_EXPLORATION = 1.0
+
+# Chooses moves by flat Monte Carlo search: each candidate move (legal, and
+# not filling one of its own eyes) is scored by random playouts to the end
+# of the game on a playout.PlayoutBoard, with playouts shared out between
+# candidates by UCB1. The most-played candidate is chosen. Ko is judged
+# against prior_state.
+# ---
+# Searches until playouts playouts have run or, if seconds is set, that much
+# time has passed, whichever comes first.
 class AIPlayer(Player):
-    pass
\ No newline at end of file
+    board_format = BoardFormat.PACKED
+    uses_prior_state = True
+
+    def __init__(self, playouts: int = 1000, seconds: float | None = None,
+                 komi: float = DEFAULT_KOMI, seed: int | None = None):
+        self.playouts = playouts
+        self.seconds = seconds
+        self.komi = komi
+        self._rng = random.Random(seed)
+
+        # Totals over every search, for tracking playout speed
+        self.total_playouts = 0
+        self.total_playout_seconds = 0.0
+
+    # Playouts run per second of search so far.
+    @property
+    def playouts_per_second(self) -> float:
+        if self.total_playout_seconds == 0:
+            return 0.0
+        return self.total_playouts / self.total_playout_seconds
+
+    def get_move(self, board_state: bytes, prior_state: bytes | None = None) -> tuple | str:
+        size, to_play, board = decode_board(board_state)
+        root = PlayoutBoard.from_lists(board, to_play, find_ko_point(board_state, prior_state))
+        candidates = [p for p in root.empties if root.is_legal(p) and not root.is_eye(p)]
+        if len(candidates) == 0:
+            return PASS
+
+        wins = [0] * len(candidates)
+        visits = [0] * len(candidates)
+        max_moves = size * size * 3
+        start = time.perf_counter()
+        n = 0
+        while n < self.playouts:
+            if self.seconds is not None and time.perf_counter() - start >= self.seconds:
+                break
+            if n < len(candidates):
+                i = n
+            else:
+                log_n = math.log(n)
+                i = max(range(len(candidates)), key=lambda j: wins[j] / visits[j]
+                        + UCB_EXPLORATION * math.sqrt(log_n / visits[j]))
+
+            playout = root.copy()
+            playout.place(candidates[i])
+            playout.play_random(self._rng, max_moves)
+            black_won = playout.score() - self.komi > 0
+            if black_won == (to_play == Stone.BLACK):
+                wins[i] += 1
+            visits[i] += 1
+            n += 1
+
+        self.total_playouts += n
+        self.total_playout_seconds += time.perf_counter() - start
+
+        best = max(range(len(candidates)), key=lambda j: visits[j])
+        return root.coords(candidates[best])
@@ -0,0 +1,38 @@
+# book_player.py
+# ----------------
+# A Go player that plays from an opening book before handing over to
+# another player.
+# Author: Porter Zach
+
+import random
+from .player import Player, ask_move
+from opening_book import OpeningBook
+
+# Plays a move from an opening_book.OpeningBook while the position is in the
+# book, chosen at random in proportion to how often it was played, and asks
+# player for the move once it isn't. Book moves take microseconds, so the
+# wrapped player's search starts only once the game leaves the book.
+class BookPlayer(Player):
+    def __init__(self, player: Player, book: OpeningBook | str, seed: int | None = None):
+        self.player = player
+        self.board_format = player.board_format
+        self.uses_prior_state = player.uses_prior_state
+        self.book = OpeningBook(book) if isinstance(book, str) else book
+        self._rng = random.Random(seed)
+        # Moves played from the book so far
+        self.book_moves = 0
+
+    # prior_state is passed on to the wrapped player if it uses one. Book
+    # moves don't need it: a position repeated in the opening is never ko.
+    def get_move(self, board_state: str | bytes, prior_state: str | bytes | None = None) -> tuple | str:
+        move = self.book.choose(board_state, self._rng)
+        if move is None:
+            return ask_move(self.player, board_state, prior_state)
+        self.book_moves += 1
+        return move
+
+    # Closes the book and the wrapped player, if it has anything to close.
+    def close(self):
+        self.book.close()
+        if hasattr(self.player, "close"):
+            self.player.close()
@@ -0,0 +1,214 @@
+# mcts_player.py
+# ----------------
+# Monte Carlo Tree Search AI Go player.
+# Author: Porter Zach
+
+import math
+import time
+import random
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from .player import BoardFormat, PASS
+from .ai_player import AIPlayer
+from game import Stone, decode_board
+from playout import PlayoutBoard, DEFAULT_KOMI, find_ko_point
+
+# Exploration constant for UCT child selection.
+UCT_EXPLORATION = 0.8
+
+# Stored as a node's move for a pass.
+PASS_MOVE = -1
+
+# A node of the search tree: the move leading to it (a flat board index or
+# PASS_MOVE), and the playouts through it won by the player who made that
+# move. Kept to a few slots, with untried moves in a small-int array, so
+# large trees stay small.
+class _Node:
+    __slots__ = ("move", "parent", "children", "untried", "visits", "wins")
+
+    def __init__(self, move: int | None, parent: "_Node | None"):
+        self.move = move
+        self.parent = parent
+        self.children = []
+        # Moves not expanded into children yet, filled in on the first visit
+        self.untried = None
+        self.visits = 0
+        self.wins = 0
+
+# Searches with UCT, growing one node per playout, keeping the tree between
+# moves: after it plays, the subtree for the move chosen is kept, and on its
+# next turn the subtree for the opponent's reply becomes the new root.
+# ---
+# With workers above 1, that many - 1 extra processes each search the same
+# position from scratch while this process searches its kept tree; the root
+# statistics are summed before choosing (root parallelism). Call close() to
+# stop the worker processes.
+class MCTSPlayer(AIPlayer):
+    board_format = BoardFormat.PACKED
+
+    def __init__(self, playouts: int = 2000, seconds: float | None = None, workers: int = 1,
+                 komi: float = DEFAULT_KOMI, seed: int | None = None):
+        super().__init__(playouts, seconds, komi, seed)
+        self.workers = workers
+        self._executor = None
+
+        # The tree kept from the last move and the position it was made in
+        self._tree = None
+        self._tree_board = None
+
+    def get_move(self, board_state: bytes, prior_state: bytes | None = None) -> tuple | str:
+        size, to_play, board = decode_board(board_state)
+        ko_point = find_ko_point(board_state, prior_state)
+        root_board = PlayoutBoard.from_lists(board, to_play, ko_point)
+        root, root_board = self._reuse_tree(root_board)
+
+        futures = []
+        if self.workers > 1:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers - 1)
+            for _ in range(self.workers - 1):
+                futures.append(self._executor.submit(
+                    _search_position, board, to_play, ko_point, self.playouts, self.seconds,
+                    self.komi, self._rng.getrandbits(32)))
+
+        start = time.perf_counter()
+        playouts = _search(root, root_board, self._rng, self.playouts, self.seconds, self.komi)
+        self.total_playouts += playouts
+        self.total_playout_seconds += time.perf_counter() - start
+
+        # Merge the root statistics of every search
+        visits = {child.move: child.visits for child in root.children}
+        for future in futures:
+            for move, child_visits in future.result().items():
+                visits[move] = visits.get(move, 0) + child_visits
+        if len(visits) == 0:
+            return PASS
+        best = max(visits, key=visits.get)
+
+        # Keep the chosen move's subtree for next turn
+        self._tree = next((child for child in root.children if child.move == best), None)
+        if self._tree is not None:
+            self._tree.parent = None
+            self._tree_board = root_board.copy()
+            _play(self._tree_board, best)
+
+        if best == PASS_MOVE:
+            return PASS
+        return root_board.coords(best)
+
+    # Number of nodes in the kept tree, for checking memory use.
+    def tree_size(self) -> int:
+        if self._tree is None:
+            return 0
+        count = 0
+        stack = [self._tree]
+        while stack:
+            node = stack.pop()
+            count += 1
+            stack.extend(node.children)
+        return count
+
+    # Stops the worker processes, if any.
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    # Finds the opponent's reply to the last move among the kept tree's
+    # children: the one leading to root_board's stones, player to move and
+    # ko point. Returns the root node and board to search from: the reply's
+    # subtree and the kept board with the reply played, or a new tree for
+    # root_board if nothing matches.
+    def _reuse_tree(self, root_board: PlayoutBoard) -> (_Node, PlayoutBoard):
+        tree, tree_board = self._tree, self._tree_board
+        self._tree = self._tree_board = None
+        if tree is None or tree_board.size != root_board.size:
+            return _Node(None, None), root_board
+
+        for child in tree.children:
+            board = tree_board.copy()
+            _play(board, child.move)
+            if (board.cells == root_board.cells and board.to_play == root_board.to_play
+                    and board.ko_point == root_board.ko_point):
+                child.parent = None
+                return child, board
+        return _Node(None, None), root_board
+
+# Plays a node's move on a playout board.
+def _play(board: PlayoutBoard, move: int):
+    if move == PASS_MOVE:
+        board.pass_turn()
+    else:
+        board.place(move)
+
+# Runs UCT search from root, whose position is root_board, until playouts
+# playouts have run or seconds (if set) have passed.
+# Returns the number of playouts run.
+def _search(root: _Node, root_board: PlayoutBoard, rng: random.Random, playouts: int,
+            seconds: float | None, komi: float) -> int:
+    max_moves = root_board.size * root_board.size * 3
+    root_color = root_board.to_play
+    start = time.perf_counter()
+    n = 0
+    while n < playouts:
+        if seconds is not None and time.perf_counter() - start >= seconds:
+            break
+        board = root_board.copy()
+        node = root
+        depth = 0
+
+        # Select down the tree through fully expanded nodes
+        while True:
+            if node.untried is None:
+                node.untried = _candidates(board)
+            if node.untried or not node.children or board.passes >= 2:
+                break
+            log_visits = math.log(node.visits)
+            node = max(node.children, key=lambda child: child.wins / child.visits
+                       + UCT_EXPLORATION * math.sqrt(log_visits / child.visits))
+            _play(board, node.move)
+            depth += 1
+
+        # Expand one untried move
+        if node.untried and board.passes < 2:
+            i = rng.randrange(len(node.untried))
+            move = node.untried[i]
+            node.untried[i] = node.untried[-1]
+            node.untried.pop()
+            if len(node.untried) == 0:
+                node.untried = ()
+            child = _Node(move, node)
+            node.children.append(child)
+            node = child
+            _play(board, move)
+            depth += 1
+
+        board.play_random(rng, max_moves)
+        black_won = board.score() - komi > 0
+
+        # The move into a node at odd depth was made by the root player
+        mover = root_color if depth % 2 == 1 else 1 - root_color
+        while node is not None:
+            node.visits += 1
+            if black_won == (mover == Stone.BLACK):
+                node.wins += 1
+            mover = 1 - mover
+            node = node.parent
+        n += 1
+    return n
+
+# The moves searched from a position: every legal move that doesn't fill
+# one of the mover's eyes, or a pass if there are none.
+def _candidates(board: PlayoutBoard) -> array:
+    moves = array("h", [p for p in board.empties if board.is_legal(p) and not board.is_eye(p)])
+    if len(moves) == 0:
+        moves.append(PASS_MOVE)
+    return moves
+
+# Searches a position from scratch in a worker process.
+# Returns the visit count of each root move.
+def _search_position(board: list, to_play: int, ko_point: int, playouts: int, seconds: float | None,
+                     komi: float, seed: int) -> dict:
+    root = _Node(None, None)
+    _search(root, PlayoutBoard.from_lists(board, to_play, ko_point), random.Random(seed), playouts, seconds, komi)
+    return {child.move: child.visits for child in root.children}
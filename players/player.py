@@ -3,7 +3,7 @@
 # Base class for a Go player.
 # Author: Porter Zach
 
-from enum import IntFlag, auto
+from enum import IntEnum, IntFlag, auto
 from abc import ABC, abstractmethod
 
 class PlayerType(IntFlag):
@@ -13,14 +13,58 @@ class PlayerType(IntFlag):
     LOCAL  = auto()
     SERVER = auto() # after submit, indicate IP to share with opponent
     CLIENT = auto() # after submit, prompt for IP
-    
+
+# Format of the board state encodings passed to players.
+# HEX: the legacy board_to_string encoding.
+# PACKED: the 2-bits-per-point bytes of board_to_bytes.
+class BoardFormat(IntEnum):
+    HEX = 0
+    PACKED = 1
+
+# Non-move actions a player's get_move may return.
+PASS = "pass"
+RESIGN = "resign"
+
 class Player(ABC):
+    # The board state format this player's get_move expects.
+    board_format = BoardFormat.HEX
+    # Whether get_move takes a prior_state keyword argument: the position
+    # before the opponent's last move (see Game.get_prior_state), so the
+    # player can tell which moves ko forbids. See ask_move.
+    uses_prior_state = False
+
     # Gets the move from a player agent.
     # Returns the move (x, y) or a string describing the non-move action.
     # ---
     # Does not provide unfettered access to the Game object to avoid unwanted
     # modifications. Instead, provides an encoding of the game state that may
-    # be converted to a Board object and manipulated.
+    # be converted to a Board object and manipulated (see game.decode_board).
     @abstractmethod
-    def get_move(self, board_state: str) -> tuple | str:
-        raise NotImplementedError("get_move not implemented in subclass")
\ No newline at end of file
+    def get_move(self, board_state: str | bytes) -> tuple | str:
+        raise NotImplementedError("get_move not implemented in subclass")
+
+    # Gets the moves for a batch of board states at once, for a player
+    # serving many games (see batch_scheduler.BatchScheduler). Players that
+    # can share work between positions, such as one vectorized evaluation
+    # for the whole batch, override this.
+    # Returns the moves in the same order as board_states.
+    # ---
+    # prior_states, given only if uses_prior_state is set (see ask_moves),
+    # holds the prior state of each position, or None where there is none.
+    def get_moves(self, board_states: list, prior_states: list | None = None) -> list:
+        if prior_states is None:
+            prior_states = [None] * len(board_states)
+        return [ask_move(self, board_state, prior_state)
+                for board_state, prior_state in zip(board_states, prior_states)]
+
+# Gets player's move for board_state, giving it prior_state if it uses one.
+def ask_move(player: Player, board_state: str | bytes, prior_state: str | bytes | None = None) -> tuple | str:
+    if player.uses_prior_state:
+        return player.get_move(board_state, prior_state=prior_state)
+    return player.get_move(board_state)
+
+# Gets player's moves for board_states, giving it prior_states if it uses them.
+def ask_moves(player: Player, board_states: list, prior_states: list) -> list:
+    if player.uses_prior_state:
+        return player.get_moves(board_states, prior_states=prior_states)
+    return player.get_moves(board_states)
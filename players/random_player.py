@@ -0,0 +1,38 @@
+# random_player.py
+# ----------------
+# A Go player that makes random legal moves.
+# Author: Porter Zach
+
+import random
+from .player import Player, BoardFormat, PASS
+from game import MoveStatus, bytes_to_board, legal_moves
+
+# Plays a uniformly random legal move that doesn't fill one of its own
+# single-point eyes, and passes when there is none. Ko is judged against
+# prior_state when given. Uses the module-level random generator, so
+# seeding random makes its games reproducible.
+class RandomPlayer(Player):
+    board_format = BoardFormat.PACKED
+    uses_prior_state = True
+
+    def get_move(self, board_state: bytes, prior_state: bytes | None = None) -> tuple | str:
+        size, to_play, board = bytes_to_board(board_state)
+        mask = legal_moves(board_state, prior_state)
+        candidates = [divmod(i, size) for i, status in enumerate(mask)
+                      if status == MoveStatus.LEGAL and not is_eye(board, size, *divmod(i, size), to_play)]
+        if len(candidates) == 0:
+            return PASS
+        return random.choice(candidates)
+
+# A random legal move for the player to move in game, as RandomPlayer
+# chooses, for when a player's own move is rejected. Returns PASS if there
+# is none.
+def fallback_move(game) -> tuple | str:
+    return RandomPlayer().get_move(game.get_board(BoardFormat.PACKED), game.get_prior_state(BoardFormat.PACKED))
+
+# Whether every neighbor of the empty point x, y is a stone of the given color.
+def is_eye(board: list, size: int, x: int, y: int, color: int) -> bool:
+    for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+        if 0 <= nx < size and 0 <= ny < size and board[nx][ny] != color:
+            return False
+    return True
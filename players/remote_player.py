@@ -0,0 +1,28 @@
+# remote_player.py
+# ----------------
+# The opponent in an online Go game.
+# Author: Porter Zach
+
+from .player import Player, BoardFormat
+from network import BackgroundClient
+
+# Stands in for the player at the other end of an online game. get_move
+# waits for the opponent's action to come from the server, so it is run in
+# the background like an AI's (see interface.scheduler.MoveScheduler), and
+# send forwards the local player's moves the other way.
+class RemotePlayer(Player):
+    board_format = BoardFormat.PACKED
+
+    def __init__(self, connection: BackgroundClient):
+        self.connection = connection
+
+    # The board state is not needed: the server's game is the authority.
+    def get_move(self, board_state: bytes) -> tuple | str:
+        return self.connection.receive()
+
+    # Sends the move, PASS or RESIGN made by the player at this computer.
+    def send(self, move: tuple | str):
+        self.connection.send(move)
+
+    def close(self):
+        self.connection.close()
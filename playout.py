@@ -0,0 +1,359 @@
+# playout.py
+# ----------------
+# Light-weight Go board for random playouts in AI players.
+# Author: Porter Zach
+
+import math
+import time
+import random
+from game import Stone, MoveStatus, EMPTY, BORDER, _layout, legal_moves
+
+# Scoring constant used when a playout reaches the end of the game.
+DEFAULT_KOMI = 6.5
+
+# Per-size diagonal neighbor indices of each point on a padded board.
+_diagonals = {}
+
+# A stripped-down board for playing random games to the end as fast as
+# possible: no history, no hashing, no superko, only simple ko.
+# ---
+# Uses the same padded flat layout as game.Board. Chains are circular linked
+# lists of stones (next_stone) with a shared head (chain_head), and only
+# pseudo-liberties are counted per chain: the number of (stone, empty
+# neighbor) pairs. That is enough to tell when a chain is captured, and is
+# cheap to keep up to date as chains merge. The empty points are kept in a
+# list with each point's position in it, so a random empty point can be
+# picked and removed in O(1), and each point's count of empty neighbors is
+# kept too: a point with one is always legal (bar ko) and never an eye, so
+# most points tried in a playout are settled by one lookup.
+# ---
+# In pure Python this reaches about 2k playouts/s on 9x9 (python
+# playout.py), not the tens of thousands of a compiled engine.
+class PlayoutBoard:
+    __slots__ = ("size", "neighbors", "diagonals", "cells", "chain_head", "next_stone",
+                 "liberties", "chain_size", "empties", "empty_index", "empty_neighbors",
+                 "to_play", "ko_point", "passes")
+
+    def __init__(self, size: int):
+        layout = _layout(size)
+        self.size = size
+        self.neighbors = layout.neighbors
+        self.diagonals = _diagonal_table(size)
+        self.cells = list(layout.empty_cells)
+        length = len(self.cells)
+        self.chain_head = [0] * length
+        self.next_stone = [0] * length
+        self.liberties = [0] * length
+        self.chain_size = [0] * length
+        self.empties = list(layout.points)
+        self.empty_index = [0] * length
+        for i, p in enumerate(self.empties):
+            self.empty_index[p] = i
+        self.empty_neighbors = [0] * length
+        for p in self.empties:
+            self.empty_neighbors[p] = sum(1 for n in self.neighbors[p] if self.cells[n] == EMPTY)
+        self.to_play = Stone.BLACK
+        self.ko_point = 0
+        self.passes = 0
+
+    # Builds a playout board from a list of lists of None / Stone values,
+    # such as the one returned by game.decode_board, with the point simple
+    # ko forbids the player to move, if any (see find_ko_point).
+    @classmethod
+    def from_lists(cls, board: list, to_play: int, ko_point: int = 0) -> "PlayoutBoard":
+        new_board = cls(len(board))
+        for x in range(new_board.size):
+            for y in range(new_board.size):
+                if board[x][y] is not None:
+                    new_board.to_play = board[x][y]
+                    new_board.place(new_board.index(x, y))
+        new_board.to_play = to_play
+        new_board.ko_point = ko_point
+        return new_board
+
+    # Returns an independent copy of the board.
+    def copy(self) -> "PlayoutBoard":
+        new_board = PlayoutBoard.__new__(PlayoutBoard)
+        new_board.size = self.size
+        new_board.neighbors = self.neighbors
+        new_board.diagonals = self.diagonals
+        new_board.cells = self.cells[:]
+        new_board.chain_head = self.chain_head[:]
+        new_board.next_stone = self.next_stone[:]
+        new_board.liberties = self.liberties[:]
+        new_board.chain_size = self.chain_size[:]
+        new_board.empties = self.empties[:]
+        new_board.empty_index = self.empty_index[:]
+        new_board.empty_neighbors = self.empty_neighbors[:]
+        new_board.to_play = self.to_play
+        new_board.ko_point = self.ko_point
+        new_board.passes = self.passes
+        return new_board
+
+    # The flat index of the point x, y.
+    def index(self, x: int, y: int) -> int:
+        return (x + 1) * (self.size + 2) + y + 1
+
+    # The x, y coordinates of the flat index p.
+    def coords(self, p: int) -> (int, int):
+        return p // (self.size + 2) - 1, p % (self.size + 2) - 1
+
+    # Whether the player to move may play at the empty point p.
+    def is_legal(self, p: int) -> bool:
+        if p == self.ko_point:
+            return False
+        if self.empty_neighbors[p]:
+            return True
+        cells = self.cells
+        chain_head = self.chain_head
+        color = self.to_play
+        neighbors = self.neighbors[p]
+        for n in neighbors:
+            cell = cells[n]
+            if cell == BORDER:
+                continue
+            # Pseudo-liberties of the chain besides the ones at p
+            head = chain_head[n]
+            others = self.liberties[head]
+            for m in neighbors:
+                if cells[m] < EMPTY and chain_head[m] == head:
+                    others -= 1
+            if cell == color:
+                if others > 0:
+                    return True
+            elif others == 0:
+                # Captures
+                return True
+        return False
+
+    # Whether p is an eye of the player to move: every neighbor is one of
+    # its stones, and at most one diagonal (none on the edge) is the
+    # opponent's. Filling these only ever hurts in a random playout.
+    def is_eye(self, p: int) -> bool:
+        if self.empty_neighbors[p]:
+            return False
+        cells = self.cells
+        color = self.to_play
+        for n in self.neighbors[p]:
+            if cells[n] != color and cells[n] != BORDER:
+                return False
+        bad = 0
+        on_edge = False
+        for d in self.diagonals[p]:
+            cell = cells[d]
+            if cell == BORDER:
+                on_edge = True
+            elif cell == 1 - color:
+                bad += 1
+        return bad == 0 if on_edge else bad < 2
+
+    # Places a stone for the player to move at the empty point p and passes
+    # the turn. Legality is not checked.
+    def place(self, p: int):
+        cells = self.cells
+        chain_head = self.chain_head
+        liberties = self.liberties
+        empty_neighbors = self.empty_neighbors
+        chain_size = self.chain_size
+        color = self.to_play
+
+        # Take p out of the empty points
+        empties = self.empties
+        i = self.empty_index[p]
+        last = empties.pop()
+        if last != p:
+            empties[i] = last
+            self.empty_index[last] = i
+
+        cells[p] = color
+        chain_head[p] = p
+        self.next_stone[p] = p
+        chain_size[p] = 1
+        liberties[p] = empty_neighbors[p]
+        for n in self.neighbors[p]:
+            empty_neighbors[n] -= 1
+            cell = cells[n]
+            if cell < EMPTY:
+                liberties[chain_head[n]] -= 1
+
+        captured = 0
+        ko_point = 0
+        other = 1 - color
+        for n in self.neighbors[p]:
+            cell = cells[n]
+            if cell == color:
+                if chain_head[n] != chain_head[p]:
+                    self._merge(chain_head[n], chain_head[p])
+            elif cell == other:
+                head = chain_head[n]
+                if liberties[head] == 0:
+                    if chain_size[head] == 1:
+                        ko_point = n
+                    captured += self._capture(head)
+
+        # Simple ko: a lone stone that captured a lone stone and now has a
+        # single liberty can be recaptured straight away
+        head = chain_head[p]
+        if captured == 1 and chain_size[head] == 1 and liberties[head] == 1:
+            self.ko_point = ko_point
+        else:
+            self.ko_point = 0
+        self.to_play = 1 - color
+        self.passes = 0
+
+    def pass_turn(self):
+        self.to_play = 1 - self.to_play
+        self.ko_point = 0
+        self.passes += 1
+
+    # Plays random moves, never filling the mover's own eyes, until both
+    # players pass in a row or max_moves moves are made.
+    def play_random(self, rng: random.Random, max_moves: int):
+        empties = self.empties
+        empty_index = self.empty_index
+        empty_neighbors = self.empty_neighbors
+        is_legal = self.is_legal
+        is_eye = self.is_eye
+        place = self.place
+        # Cheaper than randrange for picking an index
+        uniform = rng.random
+        for _ in range(max_moves):
+            if self.passes >= 2:
+                return
+            # Try empty points in random order without repeats by moving
+            # rejected ones past the end of the range still being drawn from
+            n = len(empties)
+            while n > 0:
+                i = int(uniform() * n)
+                p = empties[i]
+                # A point next to an empty one is legal and not an eye
+                if empty_neighbors[p]:
+                    if p != self.ko_point:
+                        place(p)
+                        break
+                elif not is_eye(p) and is_legal(p):
+                    place(p)
+                    break
+                n -= 1
+                last = empties[n]
+                empties[i] = last
+                empties[n] = p
+                empty_index[last] = i
+                empty_index[p] = n
+            else:
+                self.pass_turn()
+
+    # Area score: stones plus empty points whose neighbors are all one
+    # color. Counts every such point, which is right at the end of a random
+    # playout where only single eyes are left empty.
+    # Returns Black's score minus White's, without komi.
+    def score(self) -> int:
+        cells = self.cells
+        counts = [0, 0, 0, 0]
+        for p, cell in enumerate(cells):
+            counts[cell] += 1
+        score = counts[Stone.BLACK] - counts[Stone.WHITE]
+        for p in self.empties:
+            owner = None
+            for n in self.neighbors[p]:
+                cell = cells[n]
+                if cell == BORDER:
+                    continue
+                if cell == EMPTY or (owner is not None and cell != owner):
+                    owner = None
+                    break
+                owner = cell
+            if owner == Stone.BLACK:
+                score += 1
+            elif owner == Stone.WHITE:
+                score -= 1
+        return score
+
+    # Joins the chain with head b into the chain with head a, relabeling the
+    # smaller of the two.
+    def _merge(self, a: int, b: int):
+        if self.chain_size[a] < self.chain_size[b]:
+            a, b = b, a
+        chain_head = self.chain_head
+        next_stone = self.next_stone
+        stone = b
+        while True:
+            chain_head[stone] = a
+            stone = next_stone[stone]
+            if stone == b:
+                break
+        next_stone[a], next_stone[b] = next_stone[b], next_stone[a]
+        self.liberties[a] += self.liberties[b]
+        self.chain_size[a] += self.chain_size[b]
+
+    # Removes the chain with the given head from the board.
+    # Returns the number of stones removed.
+    def _capture(self, head: int) -> int:
+        cells = self.cells
+        chain_head = self.chain_head
+        next_stone = self.next_stone
+        stone = head
+        while True:
+            cells[stone] = EMPTY
+            self._add_empty(stone)
+            stone = next_stone[stone]
+            if stone == head:
+                break
+        # Each removed stone is a new pseudo-liberty for every stone next to
+        # it, and a new empty neighbor for every point
+        empty_neighbors = self.empty_neighbors
+        while True:
+            for n in self.neighbors[stone]:
+                empty_neighbors[n] += 1
+                if cells[n] < EMPTY:
+                    self.liberties[chain_head[n]] += 1
+            stone = next_stone[stone]
+            if stone == head:
+                break
+        return self.chain_size[head]
+
+    def _add_empty(self, p: int):
+        self.empty_index[p] = len(self.empties)
+        self.empties.append(p)
+
+# The flat index of the point simple ko forbids the player to move in
+# board_state, judged against prior_state (see game.legal_moves), or 0 if
+# there is none.
+def find_ko_point(board_state: str | bytes, prior_state: str | bytes | None) -> int:
+    if prior_state is None:
+        return 0
+    mask = legal_moves(board_state, prior_state)
+    if MoveStatus.KO not in mask:
+        return 0
+    size = math.isqrt(len(mask))
+    x, y = divmod(mask.index(MoveStatus.KO), size)
+    return (x + 1) * (size + 2) + y + 1
+
+# Returns the diagonal neighbor indices of each point for the given size.
+def _diagonal_table(size: int) -> list:
+    if size not in _diagonals:
+        layout = _layout(size)
+        stride = layout.stride
+        offsets = (stride + 1, stride - 1, -stride + 1, -stride - 1)
+        table = [()] * (stride * stride)
+        for p in layout.points:
+            table[p] = tuple(p + offset for offset in offsets)
+        _diagonals[size] = table
+    return _diagonals[size]
+
+# Runs random playouts from the empty board for about the given number of
+# seconds. Returns the number of playouts per second.
+def measure_playouts(size: int = 9, seconds: float = 1.0, seed: int = 0) -> float:
+    rng = random.Random(seed)
+    start_board = PlayoutBoard(size)
+    max_moves = size * size * 3
+    playouts = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        start_board.copy().play_random(rng, max_moves)
+        playouts += 1
+    return playouts / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    for size in (9, 13, 19):
+        print(f"{size}x{size}: {measure_playouts(size):.0f} playouts/s")
@@ -0,0 +1,166 @@
+# position_index.py
+# ----------------
+# On-disk index of the positions reached in a collection of Go games.
+# Author: Porter Zach
+
+import os
+import heapq
+import struct
+import argparse
+import tempfile
+from itertools import islice
+from game import Game, KoRule
+from sorted_table import HEADER, SortedTable
+from sgf import SGFError, IllegalMoveError, open_collection, iter_game_texts, parse_game, replay, map_batches
+
+MAGIC = b"GOPOSIX1"
+# Position hash (Game.get_hash), game number, move number. Big-endian, so
+# entries sort the same as their bytes.
+_ENTRY = struct.Struct(">QII")
+
+# Entries sorted in memory at a time while building, before being written
+# out as a sorted run to merge.
+RUN_ENTRIES = 1 << 20
+
+# A read-only index of the positions reached in a game collection of one
+# board size: a table of (position hash, game, move) entries sorted by hash
+# in one file, memory-mapped and binary searched (see
+# sorted_table.SortedTable), so the index is never loaded whole.
+# ---
+# Games are numbered by their order in the collection from 0, counting
+# games that couldn't be indexed. Move n is the position after the first n
+# moves and passes; move 0, the empty board, is in every game.
+class PositionIndex(SortedTable):
+    def __init__(self, path: str):
+        super().__init__(path, MAGIC, _ENTRY, "a position index")
+
+    # Finds the games that reached the position with the given hash.
+    # Returns up to limit (game, move) pairs, in game order.
+    def lookup(self, position_hash: int, limit: int | None = None) -> list:
+        return list(islice(self.find(position_hash), limit))
+
+    # Finds the games that reached the current position of game.
+    def lookup_game(self, game: Game, limit: int | None = None) -> list:
+        if game.get_size() != self.size:
+            raise ValueError(f"index is for {self.size}x{self.size} games")
+        return self.lookup(game.get_hash(), limit)
+
+# Builds an index of every position in the games of one board size in an
+# SGF collection, replaying each game through game.Game. Games are replayed
+# in batches across worker processes (in this process if workers is 0);
+# entries are sorted in runs on disk and merged, so memory use stays bounded
+# for collections of any size.
+# Returns the number of games indexed and the number skipped (other sizes,
+# unreadable or with illegal moves).
+def build_index(sgf_path: str, index_path: str, size: int = 19, workers: int | None = None,
+                batch_size: int = 64, ko_rule: KoRule = KoRule.SIMPLE) -> (int, int):
+    counts = [0, 0]
+    runs = []
+    run = []
+    run_dir = tempfile.mkdtemp(prefix="position_index_", dir=os.path.dirname(os.path.abspath(index_path)))
+
+    def add_batch(result: tuple):
+        indexed, skipped, entries = result
+        counts[0] += indexed
+        counts[1] += skipped
+        run.extend(entries[i:i + _ENTRY.size] for i in range(0, len(entries), _ENTRY.size))
+        if len(run) >= RUN_ENTRIES:
+            runs.append(_write_run(run, run_dir, len(runs)))
+            run.clear()
+
+    try:
+        with open_collection(sgf_path) as stream:
+            games = enumerate(iter_game_texts(stream))
+            for result in map_batches(_index_batch, games, batch_size, size, ko_rule, workers=workers):
+                add_batch(result)
+        if run:
+            runs.append(_write_run(run, run_dir, len(runs)))
+            run.clear()
+        _merge_runs(runs, index_path, size)
+    finally:
+        for path in runs:
+            os.remove(path)
+        os.rmdir(run_dir)
+    return counts[0], counts[1]
+
+# Replays one batch of (game number, game text) pairs. Returns the number
+# of games indexed and skipped and the packed entries.
+def _index_batch(games: list, size: int, ko_rule: KoRule) -> (int, int, bytes):
+    entries = bytearray()
+    indexed = skipped = 0
+    for game_number, text in games:
+        try:
+            record = parse_game(text)
+            if record.size != size:
+                skipped += 1
+                continue
+            hashes = [Game(None, size).get_hash()]
+            replay(record, ko_rule, lambda game: hashes.append(game.get_hash()))
+        except (SGFError, IllegalMoveError):
+            skipped += 1
+            continue
+        for move, position_hash in enumerate(hashes):
+            entries += _ENTRY.pack(position_hash, game_number, move)
+        indexed += 1
+    return indexed, skipped, bytes(entries)
+
+# Sorts a run of packed entries and writes it to a file.
+# Returns the file's path.
+def _write_run(run: list, run_dir: str, number: int) -> str:
+    run.sort()
+    path = os.path.join(run_dir, f"run{number}")
+    with open(path, "wb") as f:
+        f.write(b"".join(run))
+    return path
+
+def _read_entries(f):
+    while True:
+        entry = f.read(_ENTRY.size)
+        if len(entry) < _ENTRY.size:
+            return
+        yield entry
+
+# Merges sorted runs into the index file.
+def _merge_runs(runs: list, index_path: str, size: int):
+    files = [open(path, "rb", buffering=1 << 16) for path in runs]
+    try:
+        with open(index_path, "wb") as out:
+            out.write(HEADER.pack(MAGIC, size, 0))
+            count = 0
+            for entry in heapq.merge(*(_read_entries(f) for f in files)):
+                out.write(entry)
+                count += 1
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, size, count))
+    finally:
+        for f in files:
+            f.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query an index of the positions in an SGF collection.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="index the games of one size in a collection")
+    build.add_argument("sgf", help="SGF collection, optionally gzip-compressed (.gz)")
+    build.add_argument("index", help="index file to write")
+    build.add_argument("-s", "--size", type=int, default=19)
+    build.add_argument("-w", "--workers", type=int, default=None,
+                       help="worker processes (default: one per CPU, 0: replay in this process)")
+    query = commands.add_parser("query", help="find the games reaching a position of a game in a collection")
+    query.add_argument("index")
+    query.add_argument("sgf", help="collection holding the game")
+    query.add_argument("game", type=int, help="game number in the collection, from 0")
+    query.add_argument("move", type=int, help="number of moves into the game")
+    query.add_argument("-n", "--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        indexed, skipped = build_index(args.sgf, args.index, args.size, args.workers)
+        print(f"Indexed {indexed} games ({skipped} skipped)")
+    else:
+        with open_collection(args.sgf) as stream:
+            text = next(text for i, text in enumerate(iter_game_texts(stream)) if i == args.game)
+        record = parse_game(text)
+        record.moves = record.moves[:args.move]
+        with PositionIndex(args.index) as index:
+            for game_number, move in index.lookup_game(replay(record), args.limit):
+                print(f"game {game_number}, move {move}")
@@ -0,0 +1,175 @@
+# selfplay.py
+# ----------------
+# Headless runner that plays games between two Go players across processes.
+# Author: Porter Zach
+
+import time
+import random
+import argparse
+import importlib
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
+from game import Game, Stone
+from players.player import Player, PASS, RESIGN, ask_move
+from players.random_player import fallback_move
+
+# Why a game ended.
+END_PASSES = "passes"
+END_RESIGN = "resign"
+END_MOVE_LIMIT = "move limit"
+
+@dataclass
+class GameResult:
+    # Index (0 or 1) of the player spec that won, or None if the game hit
+    # the move limit
+    winner: int | None
+    black: int
+    end: str
+    score: tuple
+    moves: int
+    illegal_moves: int
+    seconds: float
+    # Seconds each get_move call took
+    latencies: list = field(default_factory=list)
+
+# Imports a Player subclass from a "module:Class" spec, such as
+# "players.random_player:RandomPlayer".
+def load_player(spec: str) -> type:
+    module_name, _, class_name = spec.partition(":")
+    player_class = getattr(importlib.import_module(module_name), class_name)
+    if not (isinstance(player_class, type) and issubclass(player_class, Player)):
+        raise TypeError(f"{spec} is not a Player subclass")
+    return player_class
+
+# Plays one game between the players given by two specs. black is the index
+# of the spec playing Black. random is seeded with seed first so games with
+# players using it are reproducible.
+# ---
+# Players that use it are told the position before the opponent's last move
+# so they can judge ko. A move the game still rejects is counted and
+# replaced with a random legal move (see fallback_move), rather than a pass
+# that could end the game.
+def play_game(specs: tuple, black: int, size: int, max_moves: int, seed: int) -> GameResult:
+    random.seed(seed)
+    players = [None, None]
+    players[Stone.BLACK] = load_player(specs[black])()
+    players[Stone.WHITE] = load_player(specs[1 - black])()
+    # Index into specs of the player of each color
+    spec_of = [black, 1 - black]
+
+    game = Game(None, size)
+    latencies = []
+    illegal_moves = 0
+    winner = None
+    end = END_MOVE_LIMIT
+    start = time.perf_counter()
+
+    while len(latencies) < max_moves:
+        turn = game.get_turn()
+        player = players[turn]
+        board_state = game.get_board(player.board_format)
+        prior_state = game.get_prior_state(player.board_format)
+
+        move_start = time.perf_counter()
+        move = ask_move(player, board_state, prior_state)
+        latencies.append(time.perf_counter() - move_start)
+
+        if move == RESIGN:
+            winner = spec_of[1 - turn]
+            end = END_RESIGN
+            break
+        if move != PASS and game.try_place(*move):
+            continue
+        if move != PASS:
+            illegal_moves += 1
+            move = fallback_move(game)
+            if move != PASS and game.try_place(*move):
+                continue
+        if game.pass_turn():
+            end = END_PASSES
+            break
+
+    score = game.score()
+    if end == END_PASSES:
+        winner = spec_of[score[0]]
+    return GameResult(winner, black, end, score, len(latencies), illegal_moves,
+                      time.perf_counter() - start, latencies)
+
+# Plays games between the players given by two specs, spread over a pool of
+# worker processes (or in this process if workers is 0). The specs swap
+# colors every game when alternate is set.
+# Returns the GameResults and the wall-clock seconds taken.
+def run(specs: tuple, games: int, size: int = 9, workers: int | None = None,
+        max_moves: int | None = None, alternate: bool = True, seed: int = 0) -> (list, float):
+    if max_moves is None:
+        max_moves = size * size * 3
+    args = [(specs, i % 2 if alternate else 0, size, max_moves, seed + i) for i in range(games)]
+
+    start = time.perf_counter()
+    if workers == 0:
+        results = [play_game(*arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(play_game, *zip(*args)))
+    return results, time.perf_counter() - start
+
+# The q-th percentile (0 - 100) of a sorted list, by nearest rank.
+def percentile(values: list, q: float) -> float:
+    if len(values) == 0:
+        return 0.0
+    rank = max(0, min(len(values) - 1, round(q / 100 * len(values) + 0.5) - 1))
+    return values[rank]
+
+# Summarizes results from run: wins, throughput and per-move latency.
+def summarize(results: list, seconds: float) -> dict:
+    latencies = sorted(latency for result in results for latency in result.latencies)
+    moves = len(latencies)
+    return {
+        "games": len(results),
+        "seconds": seconds,
+        "wins": [sum(result.winner == i for result in results) for i in range(2)],
+        "unfinished": sum(result.winner is None for result in results),
+        "illegal_moves": sum(result.illegal_moves for result in results),
+        "games_per_second": len(results) / seconds if seconds > 0 else 0.0,
+        "moves_per_second": moves / seconds if seconds > 0 else 0.0,
+        "moves": moves,
+        "latency_ms": {
+            "p50": percentile(latencies, 50) * 1000,
+            "p90": percentile(latencies, 90) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": (latencies[-1] if moves else 0.0) * 1000,
+        },
+    }
+
+def print_summary(specs: tuple, summary: dict):
+    print(f"{summary['games']} games in {summary['seconds']:.2f}s "
+          f"({summary['games_per_second']:.2f} games/s, {summary['moves_per_second']:.1f} moves/s)")
+    for i in range(2):
+        print(f"  {specs[i]}: {summary['wins'][i]} wins")
+    if summary["unfinished"]:
+        print(f"  {summary['unfinished']} games hit the move limit")
+    if summary["illegal_moves"]:
+        print(f"  {summary['illegal_moves']} illegal moves replaced with random legal moves")
+    latency = summary["latency_ms"]
+    print(f"  move latency (ms): p50 {latency['p50']:.3f}, p90 {latency['p90']:.3f}, "
+          f"p99 {latency['p99']:.3f}, max {latency['max']:.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play Go games between two players without a display.")
+    parser.add_argument("player1", help="first player as module:Class, e.g. players.random_player:RandomPlayer")
+    parser.add_argument("player2", help="second player as module:Class")
+    parser.add_argument("-n", "--games", type=int, default=100)
+    parser.add_argument("-s", "--size", type=int, default=9, choices=(9, 13, 19))
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="worker processes (default: one per CPU, 0: play in this process)")
+    parser.add_argument("--max-moves", type=int, default=None, help="move limit per game (default: 3 * size^2)")
+    parser.add_argument("--no-alternate", action="store_true", help="player1 always plays Black")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    specs = (args.player1, args.player2)
+    for spec in specs:
+        load_player(spec)
+    results, seconds = run(specs, args.games, args.size, args.workers, args.max_moves,
+                           not args.no_alternate, args.seed)
+    print_summary(specs, summarize(results, seconds))
@@ -0,0 +1,314 @@
+# sgf.py
+# ----------------
+# Reading and writing Go games in Smart Game Format (SGF), and bulk replay
+# of game collections through the engine.
+# Author: Porter Zach
+
+import os
+import re
+import gzip
+import time
+import argparse
+from collections import deque
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
+from game import Game, Stone, KoRule
+
+# Bytes read from a collection at a time while looking for games.
+CHUNK_SIZE = 1 << 20
+
+# SGF property values for the two colors.
+_COLORS = {b"B": Stone.BLACK, b"W": Stone.WHITE}
+_COLOR_IDS = ["B", "W"]
+
+# The characters that matter when finding where games start and end.
+_SPECIAL = re.compile(rb"[\[\]()\\]")
+# A node, a variation start or end, or a property with its values.
+_TOKEN = re.compile(rb"\s*(?:(;)|(\()|(\))|([A-Za-z]+)((?:\s*\[(?:[^\]\\]|\\.)*\])+))", re.S)
+_VALUE = re.compile(rb"\[((?:[^\]\\]|\\.)*)\]", re.S)
+_ESCAPE = re.compile(rb"\\(.)", re.S)
+
+# The SGF can't be read, or describes a game this engine can't replay (such
+# as one starting with handicap stones set up on the board).
+class SGFError(ValueError):
+    pass
+
+# A move in a game record was rejected by the engine.
+class IllegalMoveError(ValueError):
+    pass
+
+@dataclass
+class GameRecord:
+    size: int = 19
+    komi: float = 6.5
+    # Moves in order as (color, (x, y)), or (color, None) for a pass
+    moves: list = field(default_factory=list)
+    # Stones set up before the first move as (color, (x, y))
+    setup: list = field(default_factory=list)
+    # Other root properties by ID, such as PB, PW, RE and DT
+    info: dict = field(default_factory=dict)
+
+# Finds the games in an SGF collection read from a binary stream, one at a
+# time: returns the bytes of each top-level game tree. Only the current game
+# is held in memory, so collections of any size can be read.
+def iter_game_texts(stream, chunk_size: int = CHUNK_SIZE):
+    game = bytearray()
+    depth = 0
+    in_value = False
+    # Index in the current chunk of a character escaped by a backslash
+    escaped = -1
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        start = 0
+        for match in _SPECIAL.finditer(chunk):
+            i = match.start()
+            char = chunk[i]
+            if in_value:
+                if i == escaped:
+                    continue
+                if char == 0x5C: # \
+                    escaped = i + 1
+                elif char == 0x5D: # ]
+                    in_value = False
+            elif char == 0x5B: # [
+                in_value = True
+            elif char == 0x28: # (
+                if depth == 0:
+                    start = i
+                depth += 1
+            elif char == 0x29 and depth > 0: # )
+                depth -= 1
+                if depth == 0:
+                    game += chunk[start:i + 1]
+                    yield bytes(game)
+                    game.clear()
+        if depth > 0:
+            game += chunk[start:]
+        # An escape at the end of the chunk applies to the next one's start
+        escaped = 0 if escaped == len(chunk) else -1
+
+# Parses the text of one game tree, following the main line (the first
+# variation wherever the game branches).
+def parse_game(text: bytes) -> GameRecord:
+    record = GameRecord()
+    nodes = 0
+    pos = 0
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if match is None:
+            if text[pos:].strip() == b"":
+                break
+            raise SGFError(f"unexpected {text[pos:pos + 10]!r} at byte {pos}")
+        pos = match.end()
+        node, _, end, prop_id, values = match.groups()
+        if node:
+            nodes += 1
+        elif end:
+            # The first variation has ended, so the main line is complete
+            break
+        elif prop_id:
+            if nodes == 0:
+                raise SGFError("property outside a node")
+            _add_property(record, prop_id, [_unescape(value) for value in _VALUE.findall(values)])
+    if nodes == 0:
+        raise SGFError("game has no nodes")
+    return record
+
+# Reads every game in an SGF file, which may be gzip-compressed.
+def iter_games(path: str):
+    with open_collection(path) as stream:
+        for text in iter_game_texts(stream):
+            yield parse_game(text)
+
+def open_collection(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+# Builds the record of a game played so far. info holds extra root
+# properties, such as PB, PW or RE.
+def record_from_game(game: Game, **info) -> GameRecord:
+    record = GameRecord(size=game.get_size(), komi=game.get_komi(), info=dict(info))
+    record.moves = list(zip(game.get_move_colors(), game.get_moves()))
+    return record
+
+# Writes a record as an SGF game tree.
+def format_game(record: GameRecord) -> str:
+    parts = [f"(;GM[1]FF[4]SZ[{record.size}]KM[{record.komi:g}]"]
+    for prop_id, value in record.info.items():
+        parts.append(f"{prop_id}[{_escape(value)}]")
+    for color in (Stone.BLACK, Stone.WHITE):
+        points = [_format_point(point) for stone_color, point in record.setup if stone_color == color]
+        if points:
+            parts.append("A" + _COLOR_IDS[color] + "".join(f"[{point}]" for point in points))
+    for color, point in record.moves:
+        parts.append(f"\n;{_COLOR_IDS[color]}[{'' if point is None else _format_point(point)}]")
+    parts.append(")\n")
+    return "".join(parts)
+
+# Writes records to a text stream one at a time, as one SGF collection.
+def write_games(stream, records):
+    for record in records:
+        stream.write(format_game(record))
+
+# Replays a record through a new Game, checking every move. If given,
+# on_move is called with the game after each move or pass.
+# Returns the Game. Raises SGFError if the game can't be replayed from an
+# empty board with alternating turns, or IllegalMoveError if a move is
+# rejected.
+def replay(record: GameRecord, ko_rule: KoRule = KoRule.SIMPLE, on_move=None) -> Game:
+    if record.setup:
+        raise SGFError("games with setup stones are not supported")
+    game = Game(None, record.size, ko_rule)
+    for i, (color, point) in enumerate(record.moves):
+        if color != game.get_turn():
+            raise SGFError(f"move {i + 1} is out of turn")
+        if point is None:
+            game.pass_turn()
+        elif not game.try_place(*point):
+            raise IllegalMoveError(f"move {i + 1} at {point} is illegal")
+        if on_move is not None:
+            on_move(game)
+    return game
+
+@dataclass
+class ReplayStats:
+    games: int = 0
+    moves: int = 0
+    # Games rejected by the engine, and games that couldn't be read or
+    # replayed at all
+    illegal: int = 0
+    unreadable: int = 0
+    seconds: float = 0.0
+
+    def add(self, other: "ReplayStats"):
+        self.games += other.games
+        self.moves += other.moves
+        self.illegal += other.illegal
+        self.unreadable += other.unreadable
+
+# Replays every game in an SGF collection, streaming it in batches to a pool
+# of worker processes (or replaying in this process if workers is 0).
+def replay_collection(path: str, workers: int | None = None, batch_size: int = 64,
+                      ko_rule: KoRule = KoRule.SIMPLE) -> ReplayStats:
+    stats = ReplayStats()
+    start = time.perf_counter()
+    with open_collection(path) as stream:
+        for batch_stats in map_batches(_replay_batch, iter_game_texts(stream), batch_size, ko_rule, workers=workers):
+            stats.add(batch_stats)
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+# Calls fn(batch, *args) on the items in lists of batch_size, in a pool of
+# worker processes (or in this process if workers is 0), and yields the
+# results in batch order. At most max_pending batches (by default two per
+# worker) are in flight, so memory use doesn't grow with the input.
+def map_batches(fn, items, batch_size: int, *args, workers: int | None = None,
+                max_pending: int | None = None):
+    batches = _batches(items, batch_size)
+    if workers == 0:
+        for batch in batches:
+            yield fn(batch, *args)
+        return
+    workers = workers or os.cpu_count()
+    max_pending = max_pending or 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append(executor.submit(fn, batch, *args))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+# Parses and replays the game texts of one batch.
+def _replay_batch(texts: list, ko_rule: KoRule) -> ReplayStats:
+    stats = ReplayStats()
+    for text in texts:
+        stats.games += 1
+        try:
+            record = parse_game(text)
+            replay(record, ko_rule)
+            stats.moves += len(record.moves)
+        except IllegalMoveError:
+            stats.illegal += 1
+        except SGFError:
+            stats.unreadable += 1
+    return stats
+
+def _batches(items, batch_size: int):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _add_property(record: GameRecord, prop_id: bytes, values: list):
+    try:
+        if prop_id in _COLORS:
+            record.moves.append((_COLORS[prop_id], _parse_point(values[0], record.size)))
+        elif prop_id == b"AB" or prop_id == b"AW":
+            color = _COLORS[prop_id[1:]]
+            for value in values:
+                record.setup.extend((color, point) for point in _parse_points(value, record.size))
+        elif prop_id == b"SZ":
+            record.size = int(values[0].split(b":")[0])
+        elif prop_id == b"KM":
+            record.komi = float(values[0]) if values[0].strip() else 0.0
+        elif prop_id == b"GM" or prop_id == b"FF":
+            # Written by format_game itself
+            pass
+        elif len(record.moves) == 0:
+            record.info[prop_id.decode("ascii")] = values[0].decode("utf-8", "replace")
+    except (ValueError, IndexError) as e:
+        raise SGFError(f"bad {prop_id.decode('ascii')} value: {e}") from e
+
+# SGF points are two letters, column then row, from "a" at the top left.
+# An empty value (or "tt" on boards up to 19x19) is a pass.
+def _parse_point(value: bytes, size: int) -> tuple | None:
+    if value == b"" or (value == b"tt" and size <= 19):
+        return None
+    if len(value) != 2:
+        raise SGFError(f"bad point {value!r}")
+    x, y = value[0] - 0x61, value[1] - 0x61
+    if not (0 <= x < size and 0 <= y < size):
+        raise SGFError(f"point {value!r} is off the board")
+    return x, y
+
+# Setup points may be compressed as a rectangle, "top left:bottom right".
+def _parse_points(value: bytes, size: int) -> list:
+    if b":" not in value:
+        return [_parse_point(value, size)]
+    corner1, corner2 = (_parse_point(corner, size) for corner in value.split(b":"))
+    return [(x, y) for x in range(corner1[0], corner2[0] + 1) for y in range(corner1[1], corner2[1] + 1)]
+
+def _format_point(point: tuple) -> str:
+    return chr(0x61 + point[0]) + chr(0x61 + point[1])
+
+def _unescape(value: bytes) -> bytes:
+    return _ESCAPE.sub(rb"\1", value)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("]", "\\]")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay every game of an SGF collection through the engine.")
+    parser.add_argument("path", help="SGF file, optionally gzip-compressed (.gz)")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="worker processes (default: one per CPU, 0: replay in this process)")
+    parser.add_argument("-b", "--batch-size", type=int, default=64, help="games sent to a worker at a time")
+    parser.add_argument("--ko", choices=[rule.name.lower() for rule in KoRule], default="simple")
+    args = parser.parse_args()
+
+    stats = replay_collection(args.path, args.workers, args.batch_size, KoRule[args.ko.upper()])
+    print(f"{stats.games} games, {stats.moves} moves in {stats.seconds:.2f}s "
+          f"({stats.games / stats.seconds:.1f} games/s, {stats.moves / stats.seconds:.0f} moves/s)")
+    if stats.illegal:
+        print(f"  {stats.illegal} games with illegal moves")
+    if stats.unreadable:
+        print(f"  {stats.unreadable} games unreadable or unsupported")
@@ -0,0 +1,66 @@
+# sorted_table.py
+# ----------------
+# Read-only, memory-mapped tables of fixed-size entries sorted by a position
+# hash, the file format of the opening book and the position index.
+# Author: Porter Zach
+
+import mmap
+import struct
+
+# Magic, board size, number of entries
+HEADER = struct.Struct(">8sQQ")
+# The big-endian position hash each entry starts with.
+_HASH = struct.Struct(">Q")
+
+# A table of entries for one board size in one file: a HEADER, then entries
+# packed with the entry struct, whose first field is the position hash, in
+# order of hash. The file is memory-mapped, so processes opening the same
+# table share its pages, and lookups binary search it, so only the pages
+# touched are read.
+# ---
+# kind names the file in the error raised when its magic is not magic.
+class SortedTable:
+    def __init__(self, path: str, magic: bytes, entry: struct.Struct, kind: str):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        file_magic, self.size, self._count = HEADER.unpack_from(self._map, 0)
+        if file_magic != magic:
+            self.close()
+            raise ValueError(f"{path} is not {kind}")
+        self._entry = entry
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    # Yields the fields after the hash of each entry with the given position
+    # hash, in file order.
+    def find(self, position_hash: int):
+        i = self._first_entry(position_hash)
+        while i < self._count:
+            entry = self._entry.unpack_from(self._map, HEADER.size + i * self._entry.size)
+            if entry[0] != position_hash:
+                return
+            yield entry[1:]
+            i += 1
+
+    # Index of the first entry with a hash of at least position_hash.
+    def _first_entry(self, position_hash: int) -> int:
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            entry_hash = _HASH.unpack_from(self._map, HEADER.size + middle * self._entry.size)[0]
+            if entry_hash < position_hash:
+                low = middle + 1
+            else:
+                high = middle
+        return low
@@ -0,0 +1,63 @@
+# test_lint.py
+# ----------------
+# Static checks on the source: pyflakes (undefined and unused names) and
+# statements that can never run. Run with pytest.
+# Author: Porter Zach
+
+import os
+import ast
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# pyflakes messages not treated as errors: the interface modules use star
+# imports of their helpers and constants on purpose.
+_ALLOWED = ("ImportStarUsed", "ImportStarUsage")
+
+# Every Python source file in the repository.
+def _sources() -> list:
+    paths = []
+    for directory, subdirectories, files in os.walk(ROOT):
+        subdirectories[:] = [d for d in subdirectories if not d.startswith(".") and d != "__pycache__"]
+        paths.extend(os.path.join(directory, name) for name in files if name.endswith(".py"))
+    return sorted(paths)
+
+# Collects every message pyflakes reports.
+class _Reporter:
+    def __init__(self):
+        self.messages = []
+
+    def unexpectedError(self, filename, message):
+        self.messages.append(f"{filename}: {message}")
+
+    def syntaxError(self, filename, message, lineno, offset, text):
+        self.messages.append(f"{filename}:{lineno}: {message}")
+
+    def flake(self, message):
+        if type(message).__name__ not in _ALLOWED:
+            self.messages.append(str(message))
+
+def test_pyflakes():
+    api = pytest.importorskip("pyflakes.api")
+    reporter = _Reporter()
+    for path in _sources():
+        with open(path, encoding="utf-8") as f:
+            api.check(f.read(), os.path.relpath(path, ROOT), reporter)
+    assert not reporter.messages, "\n".join(reporter.messages)
+
+# Statements following a return, raise, break or continue in the same block.
+def test_no_unreachable_code():
+    unreachable = []
+    for path in _sources():
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            for field in ("body", "orelse", "finalbody"):
+                block = getattr(node, field, None)
+                if not isinstance(block, list):
+                    continue
+                for statement, following in zip(block, block[1:]):
+                    if isinstance(statement, (ast.Return, ast.Raise, ast.Break, ast.Continue)):
+                        unreachable.append(f"{os.path.relpath(path, ROOT)}:{following.lineno}")
+                        break
+    assert not unreachable, "unreachable code at " + ", ".join(unreachable)
@@ -0,0 +1,417 @@
+# test_rules.py
+# ----------------
+# Checks the Go game engine against a naive reference implementation of
+# the rules. Run with pytest, or directly: python test_rules.py [games]
+# Author: Porter Zach
+
+import os
+import sys
+import random
+import tempfile
+from game import Game, Backend, KoRule, MoveStatus, Stone, BoardFormat, NEIGHBORHOOD, EMPTY, decode_board, legal_moves
+from players.player import ask_move
+from playout import PlayoutBoard
+from players.ai_player import AIPlayer
+from players.mcts_player import MCTSPlayer
+from players.book_player import BookPlayer
+from batch_scheduler import BatchScheduler
+from sorted_table import HEADER
+from opening_book import MAGIC as BOOK_MAGIC
+
+# Board sizes checked. Small boards fill up quickly, so games reach
+# captures, ko fights and suicide points within a few dozen moves.
+SIZES = range(4, 10)
+
+# The rules written out as plainly as possible, with the board as a list of
+# lists of None / Stone values and every check done from scratch. Slow, but
+# simple enough to trust, so the engine's incremental bookkeeping can be
+# compared against it.
+class _ReferenceGame:
+    def __init__(self, size: int, ko_rule: KoRule):
+        self.size = size
+        self.ko_rule = ko_rule
+        self.board = [[None] * size for _ in range(size)]
+        self.turn = Stone.BLACK
+        self.captures = [0, 0]
+        # Board before the last stone placement, for simple ko
+        self.prior = None
+        self.passed_last = False
+        # Every position reached, as (board, player to move), and the moves
+        # (x, y or None for a pass) and colors of the actions between them
+        self.positions = [(self._key(self.board), Stone.BLACK)]
+        self.moves = []
+        self.colors = []
+        # State before each action, for undo
+        self._saved = []
+
+    # The MoveStatus of a stone at x, y for the player to move, and the
+    # board and number of stones captured if it is legal.
+    def check(self, x: int, y: int) -> (MoveStatus, list | None, int):
+        if self.board[x][y] is not None:
+            return MoveStatus.OCCUPIED, None, 0
+        board = [column[:] for column in self.board]
+        board[x][y] = self.turn
+        captured = 0
+        for nx, ny in self._neighbors(x, y):
+            if board[nx][ny] == 1 - self.turn:
+                group, liberties = self._group(board, nx, ny)
+                if not liberties:
+                    for gx, gy in group:
+                        board[gx][gy] = None
+                    captured += len(group)
+        if not self._group(board, x, y)[1]:
+            return MoveStatus.SUICIDE, None, 0
+        if self._repeats(board):
+            return MoveStatus.KO, None, 0
+        return MoveStatus.LEGAL, board, captured
+
+    # The MoveStatus of every point, indexed by x * size + y.
+    def legal_moves(self) -> bytes:
+        return bytes(self.check(x, y)[0] for x in range(self.size) for y in range(self.size))
+
+    # Returns True if the move was legal and made.
+    def play(self, x: int, y: int) -> bool:
+        status, board, captured = self.check(x, y)
+        if status != MoveStatus.LEGAL:
+            return False
+        self._save()
+        self.prior = self._key(self.board)
+        self.board = board
+        self.captures[self.turn] += captured
+        self._advance((x, y))
+        self.passed_last = False
+        return True
+
+    # Returns True if the game ended: the opponent passed last.
+    def pass_turn(self) -> bool:
+        if self.passed_last:
+            return True
+        self._save()
+        self._advance(None)
+        self.passed_last = True
+        return False
+
+    def undo(self) -> bool:
+        if not self._saved:
+            return False
+        self.board, self.turn, self.captures, self.prior, self.passed_last = self._saved.pop()
+        self.positions.pop()
+        self.moves.pop()
+        self.colors.pop()
+        return True
+
+    # Area score: stones plus empty regions bordered by one color only,
+    # with komi for White. Returns the winner and each player's score.
+    def score(self, komi: float) -> (int, int, int):
+        scores = [0, 0]
+        seen = set()
+        for x in range(self.size):
+            for y in range(self.size):
+                color = self.board[x][y]
+                if color is not None:
+                    scores[color] += 1
+                elif (x, y) not in seen:
+                    region, bordering = self._group(self.board, x, y, True)
+                    seen.update(region)
+                    if len(bordering) == 1:
+                        scores[bordering.pop()] += len(region)
+        scores[Stone.WHITE] += komi
+        return scores.index(max(scores)), *scores
+
+    def _save(self):
+        self._saved.append(([column[:] for column in self.board], self.turn, self.captures[:],
+                            self.prior, self.passed_last))
+
+    def _advance(self, move: tuple | None):
+        self.moves.append(move)
+        self.colors.append(self.turn)
+        self.turn = Stone(1 - self.turn)
+        self.positions.append((self._key(self.board), self.turn))
+
+    # Whether the board after a move by the player to move is forbidden.
+    def _repeats(self, board: list) -> bool:
+        key = self._key(board)
+        if self.ko_rule == KoRule.SIMPLE:
+            return key == self.prior
+        if self.ko_rule == KoRule.POSITIONAL:
+            return any(key == seen for seen, _ in self.positions)
+        return (key, 1 - self.turn) in self.positions
+
+    # The group of points connected to x, y sharing its value, and its
+    # liberties, or for an empty region (with colors set) the colors
+    # bordering it.
+    def _group(self, board: list, x: int, y: int, colors: bool = False) -> (list, set):
+        value = board[x][y]
+        group = [(x, y)]
+        in_group = {(x, y)}
+        bordering = set()
+        i = 0
+        while i < len(group):
+            for nx, ny in self._neighbors(*group[i]):
+                if board[nx][ny] == value:
+                    if (nx, ny) not in in_group:
+                        in_group.add((nx, ny))
+                        group.append((nx, ny))
+                elif colors:
+                    bordering.add(board[nx][ny])
+                elif board[nx][ny] is None:
+                    bordering.add((nx, ny))
+            i += 1
+        return group, bordering
+
+    def _neighbors(self, x: int, y: int) -> list:
+        return [(x + dx, y + dy) for dx, dy in NEIGHBORHOOD
+                if 0 <= x + dx < self.size and 0 <= y + dy < self.size]
+
+    @staticmethod
+    def _key(board: list) -> tuple:
+        return tuple(tuple(column) for column in board)
+
+# Checks everything about the current position the engine reports against
+# the reference.
+# Returns the reference's legal move mask.
+def _check_position(game: Game, reference: _ReferenceGame, where: str) -> bytes:
+    size = reference.size
+    expected = (size, reference.turn, [list(column) for column in reference.board])
+    if decode_board(game.get_board()) != expected or decode_board(game.get_board(BoardFormat.PACKED)) != expected:
+        raise AssertionError(f"board differs {where}")
+    mask = reference.legal_moves()
+    if game.legal_moves() != mask:
+        raise AssertionError(f"legal moves differ {where}")
+    if reference.ko_rule == KoRule.SIMPLE:
+        prior_state = game.get_prior_state(BoardFormat.PACKED)
+        if legal_moves(game.get_board(BoardFormat.PACKED), prior_state) != mask:
+            raise AssertionError(f"module-level legal moves differ {where}")
+    if game.get_captures() != tuple(reference.captures):
+        raise AssertionError(f"captures differ {where}")
+    score = reference.score(game.get_komi())
+    if game.score() != score or game.live_score() != score:
+        raise AssertionError(f"score differs {where}")
+    return mask
+
+# Checks the engine's record of the game against the reference's.
+def _check_history(game: Game, reference: _ReferenceGame, where: str):
+    positions = [(reference.size, turn, [list(column) for column in board]) for board, turn in reference.positions]
+    if [decode_board(state) for state in game.get_states()] != positions:
+        raise AssertionError(f"history positions differ {where}")
+    if game.get_num_states() != len(positions) or decode_board(game.get_state(-1)) != positions[-1]:
+        raise AssertionError(f"history length differs {where}")
+    if game.get_moves() != reference.moves or game.get_move_colors() != reference.colors:
+        raise AssertionError(f"history moves differ {where}")
+    prior_state = game.get_prior_state(BoardFormat.PACKED)
+    if reference.moves and reference.moves[-1] is not None:
+        if prior_state is None or decode_board(prior_state) != positions[-2]:
+            raise AssertionError(f"prior state differs {where}")
+    elif prior_state is not None:
+        raise AssertionError(f"prior state given after a pass {where}")
+
+# Plays seeded random games on the engine and the reference side by side,
+# checking after every action that they agree on the board, legal moves,
+# captures, score and history. Along the way, moves are tried and taken
+# back with play and undo as a search would, some played moves are kept
+# for try_place or pass_turn to record, and illegal moves are tried. Each
+# game ends by undoing every action back to the empty board.
+# Returns the number of moves made.
+def compare_with_reference(games: int, size: int, ko_rule: KoRule, backend: Backend, seed: int = 0) -> int:
+    rng = random.Random(seed)
+    moves = 0
+    for game_num in range(games):
+        game = Game(None, size, ko_rule, backend)
+        reference = _ReferenceGame(size, ko_rule)
+        for _ in range(size * size * 3):
+            where = f"in {size}x{size} game {game_num} ({ko_rule.name}, {backend.name}) after {moves} moves"
+            mask = _check_position(game, reference, where)
+            legal = [i for i, status in enumerate(mask) if status == MoveStatus.LEGAL]
+            illegal = [i for i, status in enumerate(mask) if status != MoveStatus.LEGAL]
+
+            # Try a short line of moves and take it back
+            if legal and rng.random() < 0.1:
+                num_states = game.get_num_states()
+                depth = 0
+                for _ in range(rng.randint(1, 3)):
+                    line = [i for i, status in enumerate(reference.legal_moves()) if status == MoveStatus.LEGAL]
+                    if not line:
+                        break
+                    x, y = divmod(rng.choice(line), size)
+                    if not (game.play(x, y) and reference.play(x, y)):
+                        raise AssertionError(f"move {x}, {y} rejected by play {where}")
+                    depth += 1
+                    _check_position(game, reference, where)
+                for _ in range(depth):
+                    if not (game.undo() and reference.undo()):
+                        raise AssertionError(f"undo failed {where}")
+                _check_position(game, reference, where)
+                if game.get_num_states() != num_states:
+                    raise AssertionError(f"moves tried with play were recorded {where}")
+
+            if illegal and rng.random() < 0.2:
+                x, y = divmod(rng.choice(illegal), size)
+                if game.try_place(x, y) or game.play(x, y):
+                    raise AssertionError(f"illegal move {x}, {y} accepted {where}")
+
+            if not legal or rng.random() < 0.03:
+                ended = game.pass_turn()
+                if ended != reference.pass_turn():
+                    raise AssertionError(f"pass handling differs {where}")
+                if ended:
+                    break
+                continue
+            # Captures are favoured, to get into the ko fights random play
+            # rarely reaches
+            capturing = [i for i in legal if reference.check(*divmod(i, size))[2] > 0]
+            x, y = divmod(rng.choice(capturing if capturing and rng.random() < 0.7 else legal), size)
+            # Some moves are made with play and recorded by the next action
+            placed = game.play(x, y) if rng.random() < 0.1 else game.try_place(x, y)
+            if not (placed and reference.play(x, y)):
+                raise AssertionError(f"move {x}, {y} rejected {where}")
+            moves += 1
+            if rng.random() < 0.05:
+                if not (game.undo() and reference.undo()):
+                    raise AssertionError(f"undo failed {where}")
+
+        where = f"at the end of {size}x{size} game {game_num} ({ko_rule.name}, {backend.name})"
+        # Any moves still unrecorded are recorded by a pass
+        if not game.just_passed():
+            game.pass_turn()
+            reference.pass_turn()
+        _check_history(game, reference, where)
+        while reference.undo():
+            if not game.undo():
+                raise AssertionError(f"undo failed {where}")
+            _check_position(game, reference, where)
+            _check_history(game, reference, where)
+        if game.undo():
+            raise AssertionError(f"undo past the first move {where}")
+    return moves
+
+# Makes moves (x, y, or None for a pass) on a 4x4 board under each ko rule
+# and backend, checking the engine against the reference throughout, then
+# checks the status of x, y for the player to move under each rule.
+def _check_ko(moves: list, x: int, y: int, statuses: dict):
+    for ko_rule, status in statuses.items():
+        for backend in Backend:
+            where = f"in the {ko_rule.name} {backend.name} game"
+            game = Game(None, 4, ko_rule, backend)
+            reference = _ReferenceGame(4, ko_rule)
+            for move in moves:
+                _check_position(game, reference, where)
+                if move is None:
+                    game.pass_turn()
+                    reference.pass_turn()
+                elif not (game.try_place(*move) and reference.play(*move)):
+                    raise AssertionError(f"move {move} rejected {where}")
+            mask = _check_position(game, reference, where)
+            _check_history(game, reference, where)
+            assert mask[x * 4 + y] == status, f"{x}, {y} is {MoveStatus(mask[x * 4 + y]).name} {where}"
+
+# Black's 3, 1 captures White's 3, 2 and 3, 3. White replaying 3, 3 would
+# bring back the board after Black's 7th move, but with Black rather than
+# White to move, and not the board of one move ago.
+def test_board_repeated_with_other_player_to_move():
+    moves = [(2, 2), (2, 1), (3, 1), (3, 3), (1, 0), (3, 0), (2, 3), (3, 2), (3, 1)]
+    _check_ko(moves, 3, 3, {KoRule.SIMPLE: MoveStatus.LEGAL, KoRule.POSITIONAL: MoveStatus.KO,
+                            KoRule.SITUATIONAL: MoveStatus.LEGAL})
+
+# White's 0, 3 captures Black's 0, 2 after a pass. Black retaking at 0, 2
+# would bring back the board after Black's 9th move with White to move
+# again, though not the board of one move ago.
+def test_board_repeated_across_pass():
+    moves = [(2, 3), (3, 2), (2, 2), (1, 1), (0, 2), (1, 2), (2, 0), (0, 0), (1, 3), None, (0, 1), (0, 3)]
+    _check_ko(moves, 0, 2, {KoRule.SIMPLE: MoveStatus.LEGAL, KoRule.POSITIONAL: MoveStatus.KO,
+                            KoRule.SITUATIONAL: MoveStatus.KO})
+
+# White's 1, 1 takes Black's 2, 1 in a ko. Black retaking at once would
+# bring back the board of one move ago, which every rule forbids.
+def test_simple_ko():
+    moves = [(1, 0), (2, 0), (0, 1), (3, 1), (1, 2), (2, 2), (2, 1), (1, 1)]
+    _check_ko(moves, 2, 1, {ko_rule: MoveStatus.KO for ko_rule in KoRule})
+
+# The ko of test_simple_ko, played on a 5x5 board with Black to move.
+def _ko_game() -> Game:
+    game = Game(None, 5)
+    for move in [(1, 0), (2, 0), (0, 1), (3, 1), (1, 2), (2, 2), (2, 1), (1, 1)]:
+        game.try_place(*move)
+    assert not game.can_place(2, 1)
+    return game
+
+# Checks that an AI player never returns the recapture simple ko forbids
+# in _ko_game, whatever its seed.
+def _check_player_respects_ko(make_player):
+    game = _ko_game()
+    for seed in range(5):
+        player = make_player(seed)
+        try:
+            move = ask_move(player, game.get_board(player.board_format), game.get_prior_state(player.board_format))
+        finally:
+            if hasattr(player, "close"):
+                player.close()
+        assert move != (2, 1), f"{type(player).__name__} retook the ko with seed {seed}"
+
+def test_ai_player_respects_ko():
+    _check_player_respects_ko(lambda seed: AIPlayer(playouts=300, seed=seed))
+
+def test_mcts_player_respects_ko():
+    _check_player_respects_ko(lambda seed: MCTSPlayer(playouts=300, seed=seed))
+    # The root-parallel workers search the position too
+    _check_player_respects_ko(lambda seed: MCTSPlayer(playouts=300, workers=2, seed=seed))
+
+# BatchScheduler passes each game's prior state on with its request.
+def test_batch_scheduler_respects_ko():
+    game = _ko_game()
+    for seed in range(5):
+        with BatchScheduler(AIPlayer(playouts=300, seed=seed)) as scheduler:
+            move = scheduler.request_game(game).result()
+        assert move != (2, 1), f"BatchScheduler retook the ko with seed {seed}"
+
+# Out of the book, BookPlayer hands the prior state on to the wrapped player.
+def test_book_player_respects_ko():
+    fd, path = tempfile.mkstemp(suffix=".book")
+    with os.fdopen(fd, "wb") as f:
+        f.write(HEADER.pack(BOOK_MAGIC, 5, 0))
+    try:
+        _check_player_respects_ko(lambda seed: BookPlayer(AIPlayer(playouts=300, seed=seed), path, seed))
+    finally:
+        os.remove(path)
+
+# Plays random playouts on playout.PlayoutBoard move by move, mirroring
+# each move in the engine, and checks that they agree on the stones, on
+# which points are legal, and on the counts of empty neighbors kept.
+def test_playout_board_matches_engine():
+    for size in SIZES:
+        rng = random.Random(size)
+        for _ in range(3):
+            board = PlayoutBoard(size)
+            game = Game(None, size)
+            for _ in range(size * size * 3):
+                if board.passes >= 2:
+                    break
+                mask = game.legal_moves()
+                for i, status in enumerate(mask):
+                    p = board.index(*divmod(i, size))
+                    if board.cells[p] == EMPTY:
+                        assert board.is_legal(p) == (status == MoveStatus.LEGAL), f"{size}x{size} point {i}"
+                        assert board.empty_neighbors[p] == sum(board.cells[n] == EMPTY for n in board.neighbors[p])
+                    else:
+                        assert board.cells[p] == decode_board(game.get_board())[2][i // size][i % size]
+                before = board.empties[:]
+                board.play_random(rng, 1)
+                placed = [p for p in before if board.cells[p] < EMPTY and p not in board.empties]
+                if placed:
+                    assert game.try_place(*board.coords(placed[0]))
+                else:
+                    game.pass_turn()
+
+def test_random_games():
+    for ko_rule in KoRule:
+        for size in SIZES:
+            for backend in Backend:
+                compare_with_reference(2, size, ko_rule, backend, seed=size)
+
+if __name__ == "__main__":
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for size in SIZES:
+        for ko_rule in KoRule:
+            for backend in Backend:
+                moves = compare_with_reference(games, size, ko_rule, backend)
+                print(f"{size}x{size} {ko_rule.name} {backend.name}: agrees with the reference over "
+                      f"{games} games, {moves} moves")
@@ -0,0 +1,72 @@
+# test_sgf.py
+# ----------------
+# Checks the streaming SGF reader: that games are split out of a collection
+# the same way whatever the chunks it is read in, with property values,
+# escapes and brackets falling across chunk boundaries. Run with pytest.
+# Author: Porter Zach
+
+import io
+from sgf import GameRecord, iter_game_texts, parse_game, format_game
+from game import Stone
+
+# Three games as written by other programs: values holding brackets,
+# parentheses and backslashes, whitespace and stray text between games, and
+# a variation.
+_GAMES = [
+    rb"(;GM[1]FF[4]SZ[9]C[a comment with \] and ( and ) inside]PB[Black \\];B[ee];W[ce])",
+    rb"(;SZ[9]C[(not a game) [not a value\]];B[ee](;W[cc];B[gg])(;W[gg]))",
+    rb"(;SZ[9]PW[\\\\\]\\];B[];W[aa])",
+]
+_COLLECTION = b"\n".join(_GAMES[:2]) + b" \n stray text \n" + _GAMES[2] + b"\n"
+
+# The game texts found in data read chunk_size bytes at a time.
+def _split(data: bytes, chunk_size: int) -> list:
+    return list(iter_game_texts(io.BytesIO(data), chunk_size))
+
+# Every chunk size, so every value, escape and bracket falls across a
+# boundary at some point.
+def test_collection_any_chunk_size():
+    for chunk_size in range(1, len(_COLLECTION) + 2):
+        assert _split(_COLLECTION, chunk_size) == _GAMES, f"chunk size {chunk_size}"
+
+def test_games_parse():
+    first, second, third = (parse_game(text) for text in _GAMES)
+    assert first.info == {"C": "a comment with ] and ( and ) inside", "PB": "Black \\"}
+    assert first.moves == [(Stone.BLACK, (4, 4)), (Stone.WHITE, (2, 4))]
+    assert second.info == {"C": "(not a game) [not a value]"}
+    # The main line follows the first variation
+    assert second.moves == [(Stone.BLACK, (4, 4)), (Stone.WHITE, (2, 2)), (Stone.BLACK, (6, 6))]
+    assert third.info == {"PW": "\\\\]\\"}
+    assert third.moves == [(Stone.BLACK, None), (Stone.WHITE, (0, 0))]
+
+# A backslash ending one chunk escapes the bracket starting the next, so
+# the value, and the game, go on.
+def test_escape_split_at_boundary():
+    game = rb"(;SZ[9]C[x\])]B[aa])"
+    chunk_size = game.index(rb"\]") + 1
+    assert game[chunk_size - 1:chunk_size + 1] == rb"\]"
+    assert _split(game + game, chunk_size) == [game, game]
+    assert parse_game(_split(game, chunk_size)[0]).info == {"C": "x])"}
+
+    # An escaped backslash ending a chunk doesn't escape the bracket after it
+    game = rb"(;SZ[9]C[x\\]B[aa])"
+    chunk_size = game.index(rb"\\]") + 2
+    assert game[chunk_size:chunk_size + 1] == b"]"
+    assert _split(game, chunk_size) == [game]
+    assert parse_game(game).moves == [(Stone.BLACK, (0, 0))]
+
+# Values much longer than a chunk, holding everything the splitter looks at.
+def test_values_longer_than_chunks():
+    comment = "])(\\[" * 50
+    records = [GameRecord(size=9, info={"C": comment[i:] + "x" * i}, moves=[(Stone.BLACK, (i, i))])
+               for i in range(5)]
+    data = "".join(format_game(record) for record in records).encode()
+    for chunk_size in (7, 16, 64, 100):
+        texts = _split(data, chunk_size)
+        assert [parse_game(text) for text in texts] == records, f"chunk size {chunk_size}"
+
+# An unfinished game at the end of the data is not returned.
+def test_unfinished_game():
+    data = _GAMES[0] + b"\n(;SZ[9];B[aa]"
+    for chunk_size in (1, 5, 1 << 20):
+        assert _split(data, chunk_size) == [_GAMES[0]]
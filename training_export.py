@@ -0,0 +1,304 @@
+# training_export.py
+# ----------------
+# Export of game histories as NumPy feature planes for training position
+# evaluation networks. Requires NumPy, unlike the rest of the game.
+# Author: Porter Zach
+
+import os
+import argparse
+from enum import IntEnum
+import numpy as np
+from numpy.lib.format import open_memmap
+from game import Game, Stone, KoRule
+from batch_scoring import EMPTY_POINT, BLACK_POINT, WHITE_POINT, decode_packed
+from sgf import SGFError, IllegalMoveError, open_collection, iter_game_texts, parse_game, replay, map_batches
+
+# Positions written to each shard.
+SHARD_SIZE = 1 << 16
+
+# The feature planes of a position, each a size x size array of 0s and 1s
+# indexed [x, y]. The LIBERTIES planes mark the stones of chains with 1, 2,
+# or 3 or more liberties; KO marks the point the player to move may not
+# take back under simple ko; BLACK_TO_PLAY is all 1s when Black is to move.
+class Plane(IntEnum):
+    BLACK = 0
+    WHITE = 1
+    EMPTY = 2
+    LIBERTIES_1 = 3
+    LIBERTIES_2 = 4
+    LIBERTIES_3_PLUS = 5
+    KO = 6
+    BLACK_TO_PLAY = 7
+
+# Marks the padding around decoded boards, after the point values of
+# batch_scoring.
+_BORDER_POINT = 3
+
+# Stored as the target of a position whose next action was a pass: one past
+# the last point.
+def pass_target(size: int) -> int:
+    return size * size
+
+# Decodes packed board state encodings of one size all at once (see
+# batch_scoring.decode_packed).
+def decode_states(states: list) -> (np.ndarray, np.ndarray):
+    return decode_packed(states)
+
+# Computes the feature planes of N positions from their decoded boards, the
+# players to move and the flat index (x * size + y) of each position's ko
+# point, or -1 where there is none.
+# Returns an (N, len(Plane), size, size) array of uint8.
+def feature_planes(boards: np.ndarray, to_play: np.ndarray, ko_points: np.ndarray) -> np.ndarray:
+    n, size = boards.shape[0], boards.shape[1]
+    planes = np.zeros((n, len(Plane), size, size), dtype=np.uint8)
+    planes[:, Plane.BLACK] = boards == BLACK_POINT
+    planes[:, Plane.WHITE] = boards == WHITE_POINT
+    planes[:, Plane.EMPTY] = boards == EMPTY_POINT
+
+    liberties = _liberties(boards)
+    planes[:, Plane.LIBERTIES_1] = liberties == 1
+    planes[:, Plane.LIBERTIES_2] = liberties == 2
+    planes[:, Plane.LIBERTIES_3_PLUS] = liberties >= 3
+
+    has_ko = np.flatnonzero(ko_points >= 0)
+    planes[has_ko, Plane.KO, ko_points[has_ko] // size, ko_points[has_ko] % size] = 1
+    planes[to_play == Stone.BLACK, Plane.BLACK_TO_PLAY] = 1
+    return planes
+
+# Turns the positions of a game and the actions made from them into
+# training examples: the feature planes of every position but the last, and
+# the flat index of the move made from each (pass_target for a pass).
+# states are the packed encodings of positions 0 to len(moves), and moves
+# the x, y coordinates of each move or None for a pass, as Game.get_states
+# and Game.get_moves.
+def game_examples(states: list, moves: list) -> (np.ndarray, np.ndarray):
+    size = states[0][0]
+    boards, to_play = decode_states(states)
+    targets = np.array([pass_target(size) if move is None else move[0] * size + move[1] for move in moves],
+                       dtype=np.int16)
+    ko_points = _ko_points(boards, to_play, targets)
+    return feature_planes(boards[:-1], to_play[:-1], ko_points[:-1]), targets
+
+# The training examples of a game played so far (see game_examples).
+def examples_from_game(game: Game) -> (np.ndarray, np.ndarray):
+    return game_examples(game.get_states(), game.get_moves())
+
+# Writes training examples of one board size to numbered shards in a
+# directory, each a pair of .npy files: {prefix}-{n}-planes.npy of shape
+# (positions, len(Plane), size, size) and {prefix}-{n}-targets.npy of shape
+# (positions,). Each shard is filled through a memory map as examples come,
+# so memory use doesn't grow with the number of examples; every shard but
+# the last holds shard_size positions. Call close() to finish the last.
+class ShardWriter:
+    def __init__(self, directory: str, size: int, shard_size: int = SHARD_SIZE, prefix: str = "shard"):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.size = size
+        self.shard_size = shard_size
+        self.prefix = prefix
+        # (planes path, targets path) of each shard finished
+        self.shards = []
+        self.positions = 0
+
+        self._planes = None
+        self._targets = None
+        self._filled = 0
+
+    def __enter__(self) -> "ShardWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, planes: np.ndarray, targets: np.ndarray):
+        i = 0
+        while i < len(planes):
+            if self._planes is None:
+                self._open()
+            n = min(len(planes) - i, self.shard_size - self._filled)
+            self._planes[self._filled:self._filled + n] = planes[i:i + n]
+            self._targets[self._filled:self._filled + n] = targets[i:i + n]
+            self._filled += n
+            self.positions += n
+            i += n
+            if self._filled == self.shard_size:
+                self._finish()
+
+    def close(self):
+        if self._planes is not None:
+            self._finish()
+
+    def _paths(self) -> (str, str):
+        name = os.path.join(self.directory, f"{self.prefix}-{len(self.shards):05d}")
+        return name + "-planes.npy", name + "-targets.npy"
+
+    def _open(self):
+        planes_path, targets_path = self._paths()
+        self._planes = open_memmap(planes_path, mode="w+", dtype=np.uint8,
+                                   shape=(self.shard_size, len(Plane), self.size, self.size))
+        self._targets = open_memmap(targets_path, mode="w+", dtype=np.int16, shape=(self.shard_size,))
+        self._filled = 0
+
+    def _finish(self):
+        paths = self._paths()
+        if self._filled < self.shard_size:
+            # Rewrite a partly filled shard at its real length
+            planes, targets = np.array(self._planes[:self._filled]), np.array(self._targets[:self._filled])
+            self._planes = self._targets = None
+            np.save(paths[0], planes)
+            np.save(paths[1], targets)
+        else:
+            self._planes.flush()
+            self._targets.flush()
+        self._planes = self._targets = None
+        self.shards.append(paths)
+
+# Exports the training examples of every game of one board size in an SGF
+# collection to shards in directory (see ShardWriter), replaying each game
+# through game.Game. Games are turned into examples in batches across worker
+# processes (in this process if workers is 0), with a few batches in flight
+# per worker, so memory use doesn't grow with the collection.
+# Returns the number of games exported and skipped (other sizes, unreadable
+# or with illegal moves), and the shards written.
+def export_collection(sgf_path: str, directory: str, size: int = 19, shard_size: int = SHARD_SIZE,
+                      workers: int | None = None, batch_size: int = 64,
+                      ko_rule: KoRule = KoRule.SIMPLE) -> (int, int, list):
+    games = [0, 0]
+    with ShardWriter(directory, size, shard_size) as writer:
+        def add_batch(result: tuple):
+            exported, skipped, planes, targets = result
+            games[0] += exported
+            games[1] += skipped
+            writer.add(planes, targets)
+
+        with open_collection(sgf_path) as stream:
+            # map_batches yields in collection order, so the shards are the
+            # same for any number of workers
+            for result in map_batches(_export_batch, iter_game_texts(stream), batch_size, size, ko_rule,
+                                      workers=workers):
+                add_batch(result)
+    return games[0], games[1], writer.shards
+
+# Replays the game texts of one batch into training examples.
+# Returns the number of games exported and skipped, and the examples of all
+# of them.
+def _export_batch(texts: list, size: int, ko_rule: KoRule) -> (int, int, np.ndarray, np.ndarray):
+    planes = []
+    targets = []
+    exported = skipped = 0
+    for text in texts:
+        try:
+            record = parse_game(text)
+            if record.size != size or len(record.moves) == 0:
+                skipped += 1
+                continue
+            game = replay(record, ko_rule)
+        except (SGFError, IllegalMoveError):
+            skipped += 1
+            continue
+        game_planes, game_targets = examples_from_game(game)
+        planes.append(game_planes)
+        targets.append(game_targets)
+        exported += 1
+    if not planes:
+        return exported, skipped, np.zeros((0, len(Plane), size, size), dtype=np.uint8), np.zeros(0, dtype=np.int16)
+    return exported, skipped, np.concatenate(planes), np.concatenate(targets)
+
+# The number of liberties of the chain each stone belongs to, for a stack of
+# (N, size, size) boards, with 0 at empty points. Chains are labeled by
+# spreading the least flat index through connected stones of one color, then
+# the distinct empty points next to each label are counted.
+def _liberties(boards: np.ndarray) -> np.ndarray:
+    n, size = boards.shape[0], boards.shape[1]
+    padded = np.full((n, size + 2, size + 2), _BORDER_POINT, dtype=np.uint8)
+    padded[:, 1:-1, 1:-1] = boards
+    cells = padded.ravel()
+    stride = size + 2
+    offsets = (stride, -stride, 1, -1)
+    stones = np.flatnonzero((cells == BLACK_POINT) | (cells == WHITE_POINT))
+    empties = np.flatnonzero(cells == EMPTY_POINT)
+
+    # Same-colored neighbor pairs of stones; the border keeps neighbors
+    # within a board
+    pairs = []
+    for offset in offsets:
+        neighbors = stones + offset
+        same = cells[neighbors] == cells[stones]
+        pairs.append((stones[same], neighbors[same]))
+    sources = np.concatenate([source for source, _ in pairs])
+    targets = np.concatenate([target for _, target in pairs])
+
+    labels = np.arange(len(cells))
+    while True:
+        spread = labels.copy()
+        np.minimum.at(spread, sources, labels[targets])
+        # Jump to the label's own label to cross long chains faster
+        spread = spread[spread]
+        if np.array_equal(spread, labels):
+            break
+        labels = spread
+
+    # Distinct (chain, empty point) pairs
+    chains = []
+    points = []
+    for offset in offsets:
+        neighbors = empties + offset
+        is_stone = (cells[neighbors] == BLACK_POINT) | (cells[neighbors] == WHITE_POINT)
+        chains.append(labels[neighbors[is_stone]])
+        points.append(empties[is_stone])
+    keys = np.unique(np.concatenate(chains) * len(cells) + np.concatenate(points))
+    counts = np.bincount(keys // len(cells), minlength=len(cells))
+
+    liberties = np.zeros(len(cells), dtype=np.int32)
+    liberties[stones] = counts[labels[stones]]
+    return liberties.reshape(n, size + 2, size + 2)[:, 1:-1, 1:-1]
+
+# The simple ko point of each position (flat index x * size + y, or -1):
+# the point of the single stone just captured by a stone that is then a
+# chain of one with that point as its only liberty. targets[i] is the
+# action leading from position i to position i + 1.
+def _ko_points(boards: np.ndarray, to_play: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    n, size = boards.shape[0], boards.shape[1]
+    flat = boards.reshape(n, -1)
+    ko_points = np.full(n, -1, dtype=np.int32)
+    if n < 2:
+        return ko_points
+
+    # Stones of the opponent of the player making each action that are gone
+    # after it
+    opponent = np.where(to_play[:-1] == Stone.BLACK, WHITE_POINT, BLACK_POINT)
+    removed = (flat[:-1] == opponent[:, None]) & (flat[1:] == EMPTY_POINT)
+    moves = np.flatnonzero((targets < size * size) & (removed.sum(axis=1) == 1))
+    if len(moves) == 0:
+        return ko_points
+
+    after = boards[moves + 1]
+    placed = targets[moves].astype(np.int64)
+    x, y = placed // size, placed % size
+    liberties = _liberties(after)[np.arange(len(moves)), x, y]
+    # A chain of one: no neighbor of the placed stone has its color
+    color = after[np.arange(len(moves)), x, y]
+    padded = np.full((len(moves), size + 2, size + 2), _BORDER_POINT, dtype=np.uint8)
+    padded[:, 1:-1, 1:-1] = after
+    alone = np.ones(len(moves), dtype=bool)
+    for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+        alone &= padded[np.arange(len(moves)), x + 1 + dx, y + 1 + dy] != color
+
+    ko = (liberties == 1) & alone
+    ko_points[moves[ko] + 1] = removed[moves[ko]].argmax(axis=1)
+    return ko_points
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the games of an SGF collection as training tensors.")
+    parser.add_argument("sgf", help="SGF collection, optionally gzip-compressed (.gz)")
+    parser.add_argument("directory", help="directory to write the .npy shards to")
+    parser.add_argument("-s", "--size", type=int, default=19)
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE, help="positions per shard")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="worker processes (default: one per CPU, 0: export in this process)")
+    parser.add_argument("-b", "--batch-size", type=int, default=64, help="games sent to a worker at a time")
+    args = parser.parse_args()
+
+    exported, skipped, shards = export_collection(args.sgf, args.directory, args.size, args.shard_size,
+                                                  args.workers, args.batch_size)
+    print(f"Exported {exported} games to {len(shards)} shards ({skipped} skipped)")